@@ -34,18 +34,7 @@ const assets = {
         messageInitial: 'message-initial'
     },
     scoreboard: {
-        width: 25,
-        base: 'number',
-        number0: 'number0',
-        number1: 'number1',
-        number2: 'number2',
-        number3: 'number3',
-        number4: 'number4',
-        number5: 'number5',
-        number6: 'number6',
-        number7: 'number7',
-        number8: 'number8',
-        number9: 'number9'
+        font: 'number-font'
     },
     animation: {
         bird: {
@@ -171,10 +160,10 @@ let nextPipes
 let currentPipe
 // score variables
 /**
- * Scoreboard group component.
+ * Scoreboard text (bitmap font built from number0~9.png).
  * @type {object}
  */
-let scoreboardGroup
+let scoreboardText
 /**
  * Score counter.
  * @type {number}
@@ -224,22 +213,12 @@ function preload() {
         frameWidth: 34,
         frameHeight: 24
     })
-    this.load.spritesheet(assets.bird.avatar, 'assets/avatar_walk_motion_sprite.png', {
-        frameWidth: 31,
-        frameHeight: 48
-    })
+    // tools/atlas_packer.py 由 walk.gif 前 42 帧生成，帧名 "0"~"41"
+    this.load.atlas(assets.bird.avatar, 'assets/walk_atlas.png', 'assets/walk_atlas.json')
 
     // Numbers
-    this.load.image(assets.scoreboard.number0, 'assets/number0.png')
-    this.load.image(assets.scoreboard.number1, 'assets/number1.png')
-    this.load.image(assets.scoreboard.number2, 'assets/number2.png')
-    this.load.image(assets.scoreboard.number3, 'assets/number3.png')
-    this.load.image(assets.scoreboard.number4, 'assets/number4.png')
-    this.load.image(assets.scoreboard.number5, 'assets/number5.png')
-    this.load.image(assets.scoreboard.number6, 'assets/number6.png')
-    this.load.image(assets.scoreboard.number7, 'assets/number7.png')
-    this.load.image(assets.scoreboard.number8, 'assets/number8.png')
-    this.load.image(assets.scoreboard.number9, 'assets/number9.png')
+    // tools/make_bitmap_font.py 由 number0~9.png 生成，等宽 25 像素
+    this.load.bitmapFont(assets.scoreboard.font, 'assets/number_font.png', 'assets/number_font.xml')
 }
 
 /**
@@ -254,7 +233,10 @@ function create() {
 
     gapsGroup = this.physics.add.group()
     pipesGroup = this.physics.add.group()
-    scoreboardGroup = this.physics.add.staticGroup()
+    scoreboardText = this.add.bitmapText(assets.scene.width, 30, assets.scoreboard.font, '0')
+    scoreboardText.setOrigin(0.5)
+    scoreboardText.setDepth(10)
+    scoreboardText.visible = false
 
     ground = this.physics.add.sprite(assets.scene.width, 458, assets.scene.ground)
     ground.setCollideWorldBounds(true)
@@ -534,26 +516,14 @@ function getAnimationBird(birdColor) {
  * Update the game scoreboard.
  */
 function updateScoreboard() {
-    scoreboardGroup.clear(true, true)
-
-    const scoreAsString = score.toString()
-    if (scoreAsString.length == 1)
-        scoreboardGroup.create(assets.scene.width, 30, assets.scoreboard.base + score).setDepth(10)
-    else {
-        let initialPosition = assets.scene.width - ((score.toString().length * assets.scoreboard.width) / 2)
-
-        for (let i = 0; i < scoreAsString.length; i++) {
-            scoreboardGroup.create(initialPosition, 30, assets.scoreboard.base + scoreAsString[i]).setDepth(10)
-            initialPosition += assets.scoreboard.width
-        }
-    }
+    scoreboardText.setText(score.toString())
 }
 
 function backToMain(){
     pipesGroup.clear(true, true)
     pipesGroup.clear(true, true)
     gapsGroup.clear(true, true)
-    scoreboardGroup.clear(true, true)
+    scoreboardText.visible = false
     player.destroy()
     gameOverBanner.visible = false
     restartButton.visible = false
@@ -570,7 +540,7 @@ function restartGame() {
     pipesGroup.clear(true, true)
     pipesGroup.clear(true, true)
     gapsGroup.clear(true, true)
-    scoreboardGroup.clear(true, true)
+    scoreboardText.visible = false
     player.destroy()
     gameOverBanner.visible = false
     restartButton.visible = false
@@ -671,8 +641,8 @@ function startGame(scene) {
     gameStarted = true
     messageInitial.visible = false
 
-    const score0 = scoreboardGroup.create(assets.scene.width, 30, assets.scoreboard.number0)
-    score0.setDepth(20)
+    updateScoreboard()
+    scoreboardText.visible = true
 
     makePipes(scene)
 }
\ No newline at end of file
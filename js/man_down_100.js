@@ -79,6 +79,8 @@ class ManDownGame extends BaseGame {
         // assets 将在 preload 中从 manifest 构建
         this.assets = null
         this.manifestLoaded = false
+        this.deferredAssets = []
+        this.textureScale = 1   // 主档位纹理尺寸 / 当前档位纹理尺寸，见 _selectTierManifest
 
         // 专属状态
         this.platforms = null
@@ -113,7 +115,7 @@ class ManDownGame extends BaseGame {
             xhr.send(null)
             
             if (xhr.status === 200) {
-                const manifest = JSON.parse(xhr.responseText)
+                const manifest = this._selectTierManifest(JSON.parse(xhr.responseText))
                 this._loadAssetsFromManifest(scene, manifest)
             } else {
                 throw new Error(`HTTP ${xhr.status}: ${xhr.statusText}`)
@@ -127,7 +129,47 @@ class ManDownGame extends BaseGame {
     }
     
     /**
-     * 根据 manifest 加载所有资源
+     * 按设备选择分辨率档位的 manifest（tools/build_manifest.py --tiers 生成）
+     * 画布按 FIT 缩放到屏幕，实际显示像素 = 适配比例 x devicePixelRatio x RESOLUTION_SCALE，
+     * 取不低于该值的最小档位；没有分档或加载失败时使用主 manifest
+     * @param {object} manifest 主 manifest
+     * @returns {object}
+     */
+    _selectTierManifest(manifest) {
+        this.textureScale = 1
+        if (!manifest.tiers)
+            return manifest
+
+        const dpr = window.devicePixelRatio || 1
+        const fit = Math.min(
+            window.innerWidth * dpr / this.configurations.width,
+            window.innerHeight * dpr / this.configurations.height
+        )
+        const needed = fit * this.resolutionScale
+        const tiers = Object.keys(manifest.tiers).map(Number).sort((a, b) => a - b)
+        const tier = tiers.find(t => t >= needed) || tiers[tiers.length - 1]
+        console.log("[_selectTierManifest] needed = ", needed.toFixed(2), " tier = ", tier);
+
+        let selected = manifest
+        if (manifest.tiers[tier] !== MAN_DOWN_MANIFEST_PATH) {
+            try {
+                const xhr = new XMLHttpRequest()
+                xhr.open('GET', manifest.tiers[tier], false)
+                xhr.send(null)
+                if (xhr.status === 200)
+                    selected = JSON.parse(xhr.responseText)
+            } catch (error) {
+                console.warn('Failed to load tier manifest, using full resolution:', error)
+            }
+        }
+        // 低档位纹理更小，依赖纹理原始尺寸的缩放要乘上这个系数
+        this.textureScale = (selected.baseScale || this.resolutionScale) / (selected.scale || this.resolutionScale)
+        return selected
+    }
+
+    /**
+     * 根据 manifest 加载资源：boot 分组在 preload 中加载，deferred 分组留到 create 之后后台加载
+     * （manifest 由 tools/build_manifest.py 生成）
      * @param {Phaser.Scene} scene
      * @param {object} manifest
      */
@@ -136,21 +178,66 @@ class ManDownGame extends BaseGame {
         manDownAssets = this._buildAssetsFromManifest(manifest.assets)
         this.assets = manDownAssets
         this.manifestLoaded = true
-        
-        // 根据 manifest 配置加载资源
-        manifest.assets.forEach(asset => {
-            const assetKey = this._getAssetKey(asset.id)
-            
-            if (asset.type === 'sprite') {
-                console.log("[_loadAssetsFromManifest] spritesheet: assetKey = ", assetKey, " asset.path = ", asset.path);
-                scene.load.spritesheet(assetKey, asset.path, {
-                    frameWidth: asset.frameWidth,
-                    frameHeight: asset.frameHeight
-                })
-            } else if (asset.type === 'image') {
-                console.log("[_loadAssetsFromManifest] image: assetKey = ", assetKey, " asset.path = ", asset.path);
-                scene.load.image(assetKey, asset.path)
-            }
+
+        this.deferredAssets = manifest.assets.filter(asset => asset.group === 'deferred')
+        manifest.assets
+            .filter(asset => asset.group !== 'deferred')
+            .forEach(asset => this._loadManifestAsset(scene, asset))
+    }
+
+    /**
+     * 按类型把一条 manifest 资源加入加载队列
+     * @param {Phaser.Scene} scene
+     * @param {object} asset
+     */
+    _loadManifestAsset(scene, asset) {
+        const assetKey = this._getAssetKey(asset.id)
+
+        if (asset.type === 'sprite') {
+            console.log("[_loadAssetsFromManifest] spritesheet: assetKey = ", assetKey, " asset.path = ", asset.path);
+            scene.load.spritesheet(assetKey, asset.path, {
+                frameWidth: asset.frameWidth,
+                frameHeight: asset.frameHeight
+            })
+        } else if (asset.type === 'atlas') {
+            // tools/atlas_packer.py 生成的单页图集，帧名为 "0"、"1"...，可直接用 generateFrameNumbers
+            console.log("[_loadAssetsFromManifest] atlas: assetKey = ", assetKey, " asset.path = ", asset.path);
+            scene.load.atlas(assetKey, asset.path, asset.atlasPath)
+        } else if (asset.type === 'multiatlas') {
+            // 多页图集：path 为各页图片所在目录
+            console.log("[_loadAssetsFromManifest] multiatlas: assetKey = ", assetKey, " asset.atlasPath = ", asset.atlasPath);
+            scene.load.multiatlas(assetKey, asset.atlasPath, asset.path)
+        } else if (asset.type === 'image') {
+            console.log("[_loadAssetsFromManifest] image: assetKey = ", assetKey, " asset.path = ", asset.path);
+            scene.load.image(assetKey, asset.path)
+        }
+    }
+
+    /**
+     * 场景创建完成后在后台加载 deferred 分组，加载完再创建依赖这些资源的动画
+     * @param {Phaser.Scene} scene
+     */
+    _loadDeferredAssets(scene) {
+        const deferred = this.deferredAssets || []
+        this.deferredAssets = []
+        deferred.forEach(asset => this._loadManifestAsset(scene, asset))
+        // 队列为空时 start() 会立即触发 complete
+        scene.load.once('complete', () => this._onDeferredAssetsLoaded(scene))
+        scene.load.start()
+    }
+
+    /**
+     * deferred 分组加载完成
+     * @param {Phaser.Scene} scene
+     */
+    _onDeferredAssetsLoaded(scene) {
+        if (!scene.textures.exists(this.assets.ui.gameOverAnim) || scene.anims.exists('gameOverAnim'))
+            return
+        scene.anims.create({
+            key: 'gameOverAnim',
+            frames: scene.anims.generateFrameNumbers(this.assets.ui.gameOverAnim, { start: 0, end: 64 }),
+            frameRate: 50,
+            repeat: 0
         })
     }
     
@@ -196,6 +283,9 @@ class ManDownGame extends BaseGame {
         // 构建基础的 assets 对象
         this.assets = {
             background: {
+                night0: 'background.night0',
+                night1: 'background.night1',
+                night2: 'background.night2',
                 stone: 'background.stone',
                 road: 'background.road',
                 sea: 'background.sea',
@@ -209,30 +299,29 @@ class ManDownGame extends BaseGame {
             },
             ui: {
                 gameOver: 'ui.gameOver',
+                gameOverAnim: 'ui.gameOverAnim',
                 restart: 'ui.restart',
                 quit: 'ui.quit'
             }
         }
         
-        // 硬编码加载资源
+        // 硬编码加载资源（与 manifest_man_down_100.src.json 使用相同的文件）
+        scene.load.image('background.night0', 'assets/bg_night0.png')
+        scene.load.image('background.night1', 'assets/bg_night1.png')
+        scene.load.image('background.night2', 'assets/bg_night2.png')
         scene.load.image('background.stone', 'assets/bg_stone.png')
         scene.load.image('background.sea', 'assets/bg_sea.png')
         scene.load.image('background.road', 'assets/bg_road.png')
-        scene.load.image('background.default', 'assets/sky_cloud.png')
-        scene.load.image('platform', 'assets/platform.png')
-        scene.load.image('topBarrier', 'assets/top.png')
-        scene.load.spritesheet('player.walk', 'assets/avatar_walk_sprite.png', {
-            frameWidth: 198,
-            frameHeight: 341
-        })
-        scene.load.spritesheet('player.jump', 'assets/avatar_jump3_sprite.png', {
-            frameWidth: 198,
-            frameHeight: 341
-        })
+        scene.load.image('background.default', 'assets/sky_cloud2.png')
+        scene.load.image('platform', 'assets/Image_out.png')
+        scene.load.image('topBarrier', 'assets/top_gray.png')
+        scene.load.atlas('player.walk', 'assets/avatar_walk_atlas.png', 'assets/avatar_walk_atlas.json')
+        scene.load.atlas('player.jump', 'assets/avatar_jump3_atlas.png', 'assets/avatar_jump3_atlas.json')
         
         scene.load.image('ui.gameOver', 'assets/gameover.png')
-        scene.load.image('ui.restart', 'assets/restart-button.png')
-        scene.load.image('ui.quit', 'assets/back-button.png')
+        scene.load.multiatlas('ui.gameOverAnim', 'assets/avatar_gameover_atlas.json', 'assets/')
+        scene.load.image('ui.restart', 'assets/btn_restart.png')
+        scene.load.image('ui.quit', 'assets/btn_back.png')
     }
 
     /**
@@ -301,8 +390,9 @@ class ManDownGame extends BaseGame {
         this.player.setBounce(0)
 
         // 计算缩放与原始帧大小的关系（Arcade Body 的尺寸以原始帧像素为单位）
-        const frameWidth = this.player.frame.width
-        const frameHeight = this.player.frame.height
+        // 图集帧裁掉了透明边，realWidth/realHeight 才是裁剪前的原始帧尺寸
+        const frameWidth = this.player.frame.realWidth
+        const frameHeight = this.player.frame.realHeight
         const scaleX = displayWidth / frameWidth
         const scaleY = displayHeight / frameHeight
 
@@ -378,13 +468,7 @@ class ManDownGame extends BaseGame {
         this.levelText.setDepth(20)
         this._updateLevelText()
 
-        // 结算 UI
-        scene.anims.create({
-            key: 'gameOverAnim',
-            frames: scene.anims.generateFrameNumbers(this.assets.ui.gameOverAnim, { start: 0, end: 64 }),
-            frameRate: 50,
-            repeat: 0
-        })
+        // 结算 UI（结算动画的图集在 deferred 分组，见 _onDeferredAssetsLoaded）
         const bannerHeight = this.scaleValue(42)
         const bannerWidth = this.scaleValue(200)
         this.gameOverBanner = scene.add.image(width / 2, height / 2 - bannerHeight / 2-20, this.assets.ui.gameOver)
@@ -422,6 +506,8 @@ class ManDownGame extends BaseGame {
         this.lives = MAN_MAX_LIVES
         this.startTime = scene.time.now
         this._updateInfoText()
+
+        this._loadDeferredAssets(scene)
     }
 
     /**
@@ -727,7 +813,7 @@ class ManDownGame extends BaseGame {
      */
     _createSinglePlatform(scene, x, y, platformWidth) {
         const platform = this.platforms.create(x, y, this.assets.platform)
-        platform.setScale(platformWidth / platform.width, 0.32)
+        platform.setScale(platformWidth / platform.width, 0.32 * this.textureScale)
         
         // 随机决定平台类型（60%普通，25%易碎，15%弹性）
         const rand = Phaser.Math.Between(1, 100)
@@ -0,0 +1,372 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from tool_errors import ToolError
+from build_cache import find_duplicate_files
+from build_manifest import _atlas_pages, js_asset_paths
+from profiling import parse_profile_flags
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# 常见移动端 GPU 保证支持的最大纹理边长（WebGL MAX_TEXTURE_SIZE）
+DEFAULT_MAX_TEXTURE = 4096
+# 与基线比较时，总量增长超过此百分比算回退
+DEFAULT_TOLERANCE = 5.0
+# 感知哈希（16x16 dHash，256 位）汉明距离不超过此值的图片作为相似候选
+PERCEPTUAL_DISTANCE = 12
+# 候选图片缩成 32x32 后逐像素平均色差（0-255）不超过此值才算相似，排除只是轮廓相近的换色图
+PERCEPTUAL_MAX_DIFF = 3.0
+# 宽高比相差超过此比例的图片不做相似比较
+ASPECT_TOLERANCE = 0.02
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+
+
+def _flatten(img):
+    """透明像素合成到黑底上，避免透明区域里残留的 RGB 影响比较结果"""
+    img = img.convert("RGBA")
+    background = Image.new("RGBA", img.size, (0, 0, 0, 255))
+    return Image.alpha_composite(background, img).convert("RGB")
+
+
+def dhash(img, size=16):
+    """差分哈希：缩成 (size+1)xsize 灰度图，比较左右相邻像素，返回 size*size 位整数"""
+    gray = np.asarray(_flatten(img).convert("L").resize((size + 1, size), Image.BILINEAR), dtype=np.int16)
+    bits = 0
+    for bit in (gray[:, :-1] > gray[:, 1:]).ravel():
+        bits = (bits << 1) | int(bit)
+    return bits
+
+
+def _thumbnail(path, size=32):
+    with Image.open(path) as img:
+        return np.asarray(_flatten(img).resize((size, size), Image.BILINEAR), dtype=np.int16)
+
+
+def inspect_asset(path, root):
+    """
+    单个资源的开销：压缩后字节数；图片还包括尺寸、帧数、解码后纹理字节数（宽 x 高 x 4 x 帧数）和感知哈希
+    """
+    info = {
+        "path": path.relative_to(root).as_posix(),
+        "bytes": path.stat().st_size,
+    }
+    if path.suffix.lower() not in IMAGE_SUFFIXES:
+        return info
+
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            frames = getattr(img, "n_frames", 1)
+            img.seek(0)
+            first = next(ImageSequence.Iterator(img)).copy()
+    except (OSError, SyntaxError) as e:
+        raise ToolError(f"无法识别的图片 {path}: {e}") from e
+
+    info.update(
+        width=width,
+        height=height,
+        frames=frames,
+        decoded_bytes=width * height * 4 * frames,
+        dhash=f"{dhash(first):064x}",
+    )
+    return info
+
+
+def collect_references(root, manifests, js_paths):
+    """
+    收集被引用的资源路径（相对 root）：manifest 条目（生成的 manifest 会追溯到它的源文件）、
+    JS 中硬编码的 assets/ 路径，以及被引用的图集 JSON 指向的页面图片
+
+    返回 ({路径: [引用来源, ...]}, {路径: 加载分组})
+    """
+    refs = {}
+    groups = {}
+
+    def add(path, origin):
+        refs.setdefault(Path(path).as_posix(), []).append(origin)
+
+    for manifest_path in manifests:
+        manifest_path = Path(manifest_path)
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        entries = manifest["assets"]
+        if manifest.get("hashed") and manifest.get("source"):
+            # 带哈希的 manifest 指向 assets/dist 下的副本，按源文件统计原始资源
+            with open(root / manifest["source"], encoding="utf-8") as f:
+                source = {a["id"]: a for a in json.load(f)["assets"]}
+            entries = [dict(source[e["id"]], group=e.get("group")) for e in entries]
+        for entry in entries:
+            paths = [entry["atlasPath"]] if entry.get("atlasPath") else [entry["path"]]
+            for p in paths:
+                add(p, manifest_path.name)
+                if entry.get("group"):
+                    groups[Path(p).as_posix()] = entry["group"]
+
+    for js_path in js_paths:
+        for p in js_asset_paths(js_path):
+            add(p, Path(js_path).name)
+
+    # 图集 JSON 引用的页面图片随 JSON 一起加载
+    for p in list(refs):
+        if p.endswith(".json") and (root / p).is_file():
+            try:
+                _, pages = _atlas_pages(root / p)
+            except (ToolError, KeyError, ValueError):
+                continue
+            for page in pages:
+                page_rel = page["path"].resolve().relative_to(root.resolve()).as_posix()
+                refs.setdefault(page_rel, []).extend(refs[p])
+                if p in groups:
+                    groups[page_rel] = groups[p]
+    return refs, groups
+
+
+def find_similar(assets, exact_groups, root):
+    """
+    查找感知相似的图片对（排除完全相同的文件），返回 [[路径 A, 路径 B, 平均色差], ...]
+
+    宽高比相近且 dHash 距离小的候选对，再比较缩略图的平均色差
+    """
+    exact = {frozenset(g) for g in exact_groups}
+    images = [a for a in assets if "dhash" in a]
+    thumbnails = {}
+    pairs = []
+    for i, a in enumerate(images):
+        for b in images[i + 1:]:
+            ratio_a = a["width"] / a["height"]
+            ratio_b = b["width"] / b["height"]
+            if abs(ratio_a - ratio_b) > ASPECT_TOLERANCE * max(ratio_a, ratio_b):
+                continue
+            if any({a["path"], b["path"]} <= group for group in exact):
+                continue
+            distance = bin(int(a["dhash"], 16) ^ int(b["dhash"], 16)).count("1")
+            if distance > PERCEPTUAL_DISTANCE:
+                continue
+            for item in (a, b):
+                if item["path"] not in thumbnails:
+                    thumbnails[item["path"]] = _thumbnail(root / item["path"])
+            diff = float(np.abs(thumbnails[a["path"]] - thumbnails[b["path"]]).mean())
+            if diff <= PERCEPTUAL_MAX_DIFF:
+                pairs.append([a["path"], b["path"], round(diff, 2)])
+    return pairs
+
+
+def analyze(assets_dir, manifests, js_paths, max_texture=DEFAULT_MAX_TEXTURE, root=PROJECT_ROOT):
+    """
+    统计 assets_dir 下每个资源的运行时开销，返回报告 dict
+
+    报告包含每个资源的字节数/尺寸/解码字节数/引用来源，以及超出最大纹理尺寸的图片、
+    完全相同和感知相似的文件、没有任何引用的文件和各项合计
+    """
+    root = Path(root)
+    assets_dir = Path(assets_dir)
+    if not assets_dir.is_dir():
+        raise ToolError(f"资源目录不存在: {assets_dir}")
+
+    # assets/dist 和 assets/@<n>x 是 build_manifest.py --hash / --tiers 生成的副本，不重复统计；
+    # 忽略 .DS_Store 等隐藏文件
+    files = sorted(p for p in assets_dir.rglob("*")
+                   if p.is_file() and not p.name.startswith(".")
+                   and not any(d == "dist" or d.startswith("@") for d in p.relative_to(assets_dir).parts[:-1]))
+    refs, groups = collect_references(root, manifests, js_paths)
+
+    assets = []
+    for path in files:
+        info = inspect_asset(path, root)
+        info["referenced_by"] = sorted(set(refs.get(info["path"], [])))
+        if info["path"] in groups:
+            info["group"] = groups[info["path"]]
+        assets.append(info)
+
+    exact = [sorted(p.relative_to(root).as_posix() for p in group) for group in find_duplicate_files(files)]
+    similar = find_similar(assets, [set(g) for g in exact], root)
+    violations = [a["path"] for a in assets if max(a.get("width", 0), a.get("height", 0)) > max_texture]
+    dead = [a["path"] for a in assets if not a["referenced_by"]]
+    missing = sorted(p for p in refs if not (root / p).is_file())
+
+    referenced = [a for a in assets if a["referenced_by"]]
+    totals = {
+        "files": len(assets),
+        "bytes": sum(a["bytes"] for a in assets),
+        "decoded_bytes": sum(a.get("decoded_bytes", 0) for a in assets),
+        "referenced_bytes": sum(a["bytes"] for a in referenced),
+        "referenced_decoded_bytes": sum(a.get("decoded_bytes", 0) for a in referenced),
+        "boot_decoded_bytes": sum(a.get("decoded_bytes", 0) for a in referenced if a.get("group") == "boot"),
+        "dead_bytes": sum(a["bytes"] for a in assets if not a["referenced_by"]),
+        "duplicate_bytes": sum((root / g[0]).stat().st_size * (len(g) - 1) for g in exact),
+    }
+
+    return {
+        "max_texture": max_texture,
+        "totals": totals,
+        "violations": violations,
+        "duplicates": exact,
+        "similar": similar,
+        "dead": dead,
+        "missing": missing,
+        "assets": assets,
+    }
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    与基线报告比较，返回回退说明列表（为空表示没有回退）
+
+    回退包括：合计字节数/解码字节数增长超过 tolerance%，被引用资源的解码字节数增长超过 tolerance%，
+    新出现的超尺寸纹理、重复文件、无引用文件和缺失引用
+    """
+    regressions = []
+    limit = 1 + tolerance / 100
+
+    for key in ("referenced_bytes", "referenced_decoded_bytes", "boot_decoded_bytes"):
+        old, new = baseline["totals"].get(key, 0), report["totals"][key]
+        if old and new > old * limit:
+            regressions.append(f"{key}: {old:,} -> {new:,} (+{(new - old) / old:.1%})")
+
+    old_assets = {a["path"]: a for a in baseline["assets"]}
+    for a in report["assets"]:
+        old = old_assets.get(a["path"])
+        if a["referenced_by"] and old and old.get("decoded_bytes") and \
+                a.get("decoded_bytes", 0) > old["decoded_bytes"] * limit:
+            regressions.append(f"{a['path']} 解码字节数: {old['decoded_bytes']:,} -> {a['decoded_bytes']:,}")
+
+    for key, label in (("violations", "超出最大纹理尺寸"), ("dead", "无引用文件"), ("missing", "引用的文件不存在")):
+        for path in sorted(set(report[key]) - set(baseline.get(key, []))):
+            regressions.append(f"新增{label}: {path}")
+
+    old_dupes = {p for group in baseline.get("duplicates", []) for p in group}
+    for group in report["duplicates"]:
+        if not set(group) <= old_dupes:
+            regressions.append(f"新增重复文件: {', '.join(group)}")
+    return regressions
+
+
+def print_report(report):
+    mb = 1024 * 1024
+    totals = report["totals"]
+    print(f"资源文件: {totals['files']} 个, {totals['bytes']:,} bytes")
+    print(f"  被引用: {totals['referenced_bytes']:,} bytes, 解码后 {totals['referenced_decoded_bytes'] / mb:.1f}MB"
+          f"（启动分组 {totals['boot_decoded_bytes'] / mb:.1f}MB）")
+    print(f"  无引用: {len(report['dead'])} 个, {totals['dead_bytes']:,} bytes")
+    print(f"  完全重复: {len(report['duplicates'])} 组, 多余 {totals['duplicate_bytes']:,} bytes")
+
+    print("\n解码后最大的资源:")
+    largest = sorted((a for a in report["assets"] if "decoded_bytes" in a), key=lambda a: -a["decoded_bytes"])[:10]
+    for a in largest:
+        frames = f" x{a['frames']}帧" if a["frames"] > 1 else ""
+        state = "" if a["referenced_by"] else "  [无引用]"
+        print(f"  {a['path']:40} {a['width']}x{a['height']}{frames:8} {a['bytes']:>10,} -> "
+              f"{a['decoded_bytes'] / mb:6.1f}MB{state}")
+
+    if report["violations"]:
+        print(f"\n超出最大纹理尺寸 {report['max_texture']}:")
+        for path in report["violations"]:
+            print(f"  {path}")
+    if report["duplicates"]:
+        print("\n完全相同的文件:")
+        for group in report["duplicates"]:
+            print(f"  {' = '.join(group)}")
+    if report["similar"]:
+        print("\n感知相似的图片（缩略图平均色差）:")
+        for a, b, diff in report["similar"]:
+            print(f"  {a} ~ {b} ({diff})")
+    if report["dead"]:
+        print("\n没有被 manifest 或 js/*.js 引用的文件:")
+        for path in report["dead"]:
+            print(f"  {path}")
+    if report["missing"]:
+        print("\n引用了但不存在的文件:")
+        for path in report["missing"]:
+            print(f"  {path}")
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(sys.argv[1:])
+
+    args = []
+    manifests = []
+    js_paths = []
+    max_texture = DEFAULT_MAX_TEXTURE
+    json_path = None
+    baseline_path = None
+    tolerance = DEFAULT_TOLERANCE
+
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ["--manifest", "--js", "--max-texture", "--json", "--baseline", "--tolerance"]:
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            value = sys.argv[i + 1]
+            if arg == "--manifest":
+                manifests.append(value)
+            elif arg == "--js":
+                js_paths.append(value)
+            elif arg == "--max-texture":
+                max_texture = int(value)
+            elif arg == "--json":
+                json_path = value
+            elif arg == "--baseline":
+                baseline_path = value
+            else:
+                tolerance = float(value)
+            i += 2
+        elif arg in ["--help", "-h"]:
+            print("用法: python asset_budget.py [资源目录] [选项]")
+            print("\n选项:")
+            print("  --manifest <json>     引用资源的 manifest（可多次指定，默认项目根目录下的 manifest_*.json）")
+            print("  --js <js>             引用资源的场景代码（可多次指定，默认 js/*.js）")
+            print(f"  --max-texture <n>     最大纹理边长（默认 {DEFAULT_MAX_TEXTURE}）")
+            print("  --json <路径>         写出机器可读的报告")
+            print("  --baseline <路径>     与之前的报告比较，有回退时以非零状态退出")
+            print(f"  --tolerance <百分比>  合计和单个资源允许的增长（默认 {DEFAULT_TOLERANCE}）")
+            print("\n示例:")
+            print("  python tools/asset_budget.py --json asset_budget.json")
+            print("  python tools/asset_budget.py --baseline asset_budget.json")
+            sys.exit(0)
+        else:
+            args.append(arg)
+            i += 1
+
+    assets_dir = args[0] if args else PROJECT_ROOT / "assets"
+    if not manifests:
+        manifests = sorted(p for p in PROJECT_ROOT.glob("manifest_*.json") if not p.name.endswith(".src.json"))
+    if not js_paths:
+        js_paths = sorted(PROJECT_ROOT.glob("js/*.js"))
+
+    try:
+        report = analyze(assets_dir, manifests, js_paths, max_texture)
+        baseline = None
+        if baseline_path:
+            if not Path(baseline_path).is_file():
+                raise ToolError(f"基线报告不存在: {baseline_path}")
+            with open(baseline_path, encoding="utf-8") as f:
+                baseline = json.load(f)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+
+    print_report(report)
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+        print(f"\n✓ 报告已保存到: {Path(json_path).resolve()}")
+
+    # 被引用的资源超出最大纹理尺寸时无论有无基线都算失败
+    failures = [f"超出最大纹理尺寸: {a['path']}" for a in report["assets"]
+                if a["referenced_by"] and a["path"] in report["violations"]]
+    if baseline is not None:
+        failures += [r for r in compare(report, baseline, tolerance) if r not in failures]
+    if failures:
+        print("\n✗ 资源预算回退:")
+        for line in failures:
+            print(f"  {line}")
+        sys.exit(1)
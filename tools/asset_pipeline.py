@@ -0,0 +1,228 @@
+from PIL import Image
+import sys
+from pathlib import Path
+
+from tool_errors import ToolError
+from trim_gif import get_bounding_box, merge_bbox, pad_bbox
+from resize_gif import compute_target_size
+from black_to_transparent import apply_black_to_transparent, apply_glow
+from gif_to_sprite import build_sheet, save_png
+import gif_index
+import profiling
+from profiling import parse_profile_flags
+
+
+def decode_frames(input_path, max_frames=40, start_frame=0):
+    """
+    一次性解码 GIF（或静态图片）指定段落的帧
+
+    返回 (RGBA 帧列表, 每帧持续时间列表)，每一帧只解码一次
+    """
+    info = gif_index.gif_info(input_path)
+    total_frames = info["n_frames"]
+
+    if start_frame < 0 or start_frame >= total_frames:
+        raise ToolError(f"start_frame ({start_frame}) 超出范围，总帧数为 {total_frames}")
+
+    count = min(max_frames, total_frames - start_frame)
+
+    frames = []
+    durations = []
+    # 借助帧索引直接跳到起始帧所在段落
+    for frame, duration in gif_index.iter_frames(input_path, start_frame, count):
+        frames.append(frame)
+        durations.append(duration)
+
+    print(f"输入文件: {input_path}")
+    print(f"总帧数: {total_frames}，从第 {start_frame} 帧开始解码 {count} 帧")
+    return frames, durations
+
+
+def trim_stage(padding=0):
+    """裁剪阶段：按所有帧的全局非透明边界框裁剪（语义同 trim_gif）"""
+    def run(frames):
+        global_bbox = None
+        for frame in frames:
+            global_bbox = merge_bbox(global_bbox, get_bounding_box(frame))
+
+        if global_bbox is None:
+            print("  [trim] 警告：所有帧都是完全透明的，跳过裁剪")
+            return frames
+
+        crop_bbox = pad_bbox(global_bbox, frames[0].size, padding)
+        if crop_bbox == (0, 0) + frames[0].size:
+            print("  [trim] 已经是最小尺寸，无需裁剪")
+            return frames
+
+        print(f"  [trim] 裁剪区域: {crop_bbox}")
+        return [frame.crop(crop_bbox) for frame in frames]
+    return run
+
+
+def resize_stage(width=None, height=None, scale=None):
+    """缩放阶段：等比 LANCZOS 缩放（尺寸计算同 resize_gif）"""
+    def run(frames):
+        orig_w, orig_h = frames[0].size
+        try:
+            scale_factor, new_w, new_h = compute_target_size(orig_w, orig_h, width, height, scale)
+        except ValueError as e:
+            raise ToolError(str(e)) from e
+
+        if (new_w, new_h) == (orig_w, orig_h):
+            print("  [resize] 尺寸已经是目标尺寸，无需缩放")
+            return frames
+
+        print(f"  [resize] {orig_w}x{orig_h} -> {new_w}x{new_h} ({scale_factor:.2%})")
+        return [frame.resize((new_w, new_h), Image.LANCZOS) for frame in frames]
+    return run
+
+
+def key_stage(threshold=0, glow=False, feather=0):
+    """抠图阶段：黑色变透明，或光晕模式（语义同 black_to_transparent）"""
+    def run(frames):
+        keyed = []
+        changed = 0
+        for frame in frames:
+            if glow:
+                frame, n = apply_glow(frame, feather)
+            else:
+                frame, n = apply_black_to_transparent(frame, threshold)
+            keyed.append(frame)
+            changed += n
+        mode = f"光晕 (feather={feather})" if glow else f"黑色透明 (threshold={threshold})"
+        print(f"  [key] {mode}，处理像素: {changed:,}")
+        return keyed
+    return run
+
+
+def run_pipeline(input_path, output_path, stages, max_frames=40, frames_per_row=None, start_frame=0):
+    """
+    解码一次，依次执行各阶段，最后拼接成雪碧图
+
+    帧在各阶段之间始终保存在内存里（RGBA），不会经过中间 GIF 的重新量化。
+
+    参数:
+        input_path: 输入 GIF/图片路径
+        output_path: 输出 PNG 雪碧图路径
+        stages: 阶段列表，每个阶段是 frames -> frames 的函数（见 *_stage）
+        max_frames / frames_per_row / start_frame: 同 gif_to_sprite
+    返回每帧持续时间列表（毫秒），可用于 Phaser 动画配置
+    """
+    frames, durations = decode_frames(input_path, max_frames, start_frame)
+
+    for stage in stages:
+        # --profile 中按阶段工厂命名：trim_stage -> trim
+        with profiling.stage(stage.__qualname__.split("_stage")[0],
+                             pixels=len(frames) * frames[0].width * frames[0].height):
+            frames = stage(frames)
+
+    sheet, frames_per_row, rows = build_sheet(frames, frames_per_row)
+
+    out_path = Path(output_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    save_png(sheet, out_path)
+
+    frame_w, frame_h = frames[0].size
+    print(f"\n✓ 雪碧图已保存到: {out_path.resolve()}")
+    print(f"  单帧尺寸: {frame_w}x{frame_h}")
+    print(f"  总帧数: {len(frames)}")
+    print(f"  布局: {frames_per_row} 帧/行 × {rows} 行")
+    print(f"  总尺寸: {sheet.size[0]}x{sheet.size[1]}")
+    return durations
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(sys.argv[1:])
+
+    if len(sys.argv) < 3:
+        print("用法: python asset_pipeline.py <输入GIF> <输出PNG> [选项]")
+        print("\n阶段（按 trim → resize → key → sheet 顺序执行，未指定的阶段跳过）:")
+        print("  --trim [padding]          按全局边界框裁剪透明边缘")
+        print("  --width <宽> | --height <高> | --scale <缩放因子>   等比缩放")
+        print("  --threshold, -t <0-255>   黑色变透明")
+        print("  --glow, -g                光晕模式抠图")
+        print("  --feather, -f <像素>      光晕模式边缘羽化")
+        print("\n雪碧图选项:")
+        print("  --max-frames <n>          最大帧数（默认 40）")
+        print("  --frames-per-row <n>      每行帧数（默认自动计算）")
+        print("  --start-frame <n>         起始帧（默认 0）")
+        print("\n示例:")
+        print("  python asset_pipeline.py walk.gif walk_sprite.png --trim --height 341")
+        print("  python asset_pipeline.py glow.gif glow_sprite.png --scale 0.5 --glow --feather 10")
+        sys.exit(1)
+
+    input_path = sys.argv[1]
+    output_path = sys.argv[2]
+
+    trim = False
+    padding = 0
+    width = None
+    height = None
+    scale = None
+    threshold = None
+    glow = False
+    feather = 0
+    max_frames = 40
+    frames_per_row = None
+    start_frame = 0
+
+    i = 3
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        value = sys.argv[i + 1] if i + 1 < len(sys.argv) else None
+
+        if arg == '--trim':
+            trim = True
+            # padding 可选
+            if value is not None and value.isdigit():
+                padding = int(value)
+                i += 2
+            else:
+                i += 1
+            continue
+        if arg in ['--glow', '-g']:
+            glow = True
+            i += 1
+            continue
+
+        if value is None:
+            print(f"错误：{arg} 需要一个值")
+            sys.exit(1)
+
+        if arg in ['--width', '-w']:
+            width = int(value)
+        elif arg in ['--height', '-h']:
+            height = int(value)
+        elif arg in ['--scale', '-s']:
+            scale = float(value)
+        elif arg in ['--threshold', '-t']:
+            threshold = int(value)
+            if threshold < 0 or threshold > 255:
+                print("错误：threshold 必须在 0-255 之间")
+                sys.exit(1)
+        elif arg in ['--feather', '-f']:
+            feather = int(value)
+        elif arg == '--max-frames':
+            max_frames = int(value)
+        elif arg == '--frames-per-row':
+            frames_per_row = int(value)
+        elif arg == '--start-frame':
+            start_frame = int(value)
+        else:
+            print(f"错误：无法识别的参数: {arg}")
+            sys.exit(1)
+        i += 2
+
+    stages = []
+    if trim:
+        stages.append(trim_stage(padding))
+    if width or height or scale:
+        stages.append(resize_stage(width, height, scale))
+    if glow or threshold is not None:
+        stages.append(key_stage(threshold or 0, glow, feather))
+
+    try:
+        run_pipeline(input_path, output_path, stages, max_frames, frames_per_row, start_frame)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
@@ -0,0 +1,177 @@
+from PIL import Image
+import json
+import shutil
+import sys
+from pathlib import Path
+
+from tool_errors import ToolError
+from resize_gif import compute_target_size
+from atlas_packer import pack_atlas
+from profiling import parse_profile_flags
+
+
+def tier_dir(root, tier):
+    """某一档分辨率变体的输出目录：assets/@<tier>x"""
+    return Path(root) / "assets" / f"@{tier}x"
+
+
+def scale_size(width, height, factor):
+    """按 resize_gif 的等比缩放规则计算缩放后的尺寸（取整，至少 1 像素）"""
+    _, new_w, new_h = compute_target_size(width, height, scale=factor)
+    return new_w, new_h
+
+
+def scale_image(src, dst, factor):
+    """整张图片 LANCZOS 等比缩放，返回新尺寸"""
+    with Image.open(src) as img:
+        size = scale_size(img.width, img.height, factor)
+        img.resize(size, Image.LANCZOS).save(dst, format="PNG")
+    return size
+
+
+def scale_sprite(src, dst, frame_w, frame_h, factor):
+    """
+    雪碧图逐格缩放：每一帧单独 LANCZOS 缩放后重新拼成网格，帧之间不会互相渗色，
+    新帧尺寸按同样的取整规则计算，保证 frameWidth/frameHeight 仍能整除图片尺寸。
+    返回 (新帧宽, 新帧高)
+    """
+    with Image.open(src) as img:
+        sheet = img.convert("RGBA")
+    cols = sheet.width // frame_w
+    rows = sheet.height // frame_h
+    new_w, new_h = scale_size(frame_w, frame_h, factor)
+
+    out = Image.new("RGBA", (cols * new_w, rows * new_h), (0, 0, 0, 0))
+    for row in range(rows):
+        for col in range(cols):
+            cell = sheet.crop((col * frame_w, row * frame_h, (col + 1) * frame_w, (row + 1) * frame_h))
+            out.paste(cell.resize((new_w, new_h), Image.LANCZOS), (col * new_w, row * new_h))
+    out.save(dst, format="PNG")
+    return new_w, new_h
+
+
+def _atlas_frames(json_path):
+    """
+    读取图集（单页或多页），把每帧还原成裁剪前的完整帧
+
+    返回 [(动画名, [帧名, ...], [RGBA 帧, ...]), ...]；JSON 的 meta.animations 记录了动画和帧名时按它分组，
+    否则所有帧归为一个动画
+    """
+    json_path = Path(json_path)
+    with open(json_path, encoding="utf-8") as f:
+        atlas = json.load(f)
+
+    if "textures" in atlas:
+        textures = [(t["image"], {fr["filename"]: fr for fr in t["frames"]}) for t in atlas["textures"]]
+    else:
+        frames = atlas["frames"]
+        if isinstance(frames, list):
+            frames = {fr["filename"]: fr for fr in frames}
+        textures = [(atlas["meta"]["image"], frames)]
+
+    full = {}
+    for image, frames in textures:
+        with Image.open(json_path.parent / image) as page:
+            page = page.convert("RGBA")
+        for name, fr in frames.items():
+            rect = fr["frame"]
+            piece = page.crop((rect["x"], rect["y"], rect["x"] + rect["w"], rect["y"] + rect["h"]))
+            source = fr.get("sourceSize", {"w": rect["w"], "h": rect["h"]})
+            offset = fr.get("spriteSourceSize", {"x": 0, "y": 0})
+            frame = Image.new("RGBA", (source["w"], source["h"]), (0, 0, 0, 0))
+            frame.paste(piece, (offset["x"], offset["y"]))
+            full[name] = frame
+
+    animations = atlas.get("meta", {}).get("animations")
+    if not animations:
+        animations = {json_path.stem: sorted(full, key=lambda n: (len(n), n))}
+    return [(anim, names, [full[name] for name in names]) for anim, names in animations.items()]
+
+
+def scale_atlas(src_json, dst_json, factor):
+    """
+    图集缩放：还原完整帧 -> 逐帧 LANCZOS 缩放 -> 用 atlas_packer 重新裁边装箱
+
+    缩小后可能一页就放得下，返回的 dict 中 pages 为实际页面路径（1 页时应使用 scene.load.atlas）
+    """
+    animations = _atlas_frames(src_json)
+    scaled = []
+    for anim, _, frames in animations:
+        size = scale_size(frames[0].width, frames[0].height, factor)
+        scaled.append((anim, [frame.resize(size, Image.LANCZOS) for frame in frames]))
+    # 沿用原图集的帧名风格（纯数字或 <动画名>_0000）
+    numeric = all(name.isdigit() for _, names, _ in animations for name in names)
+    return pack_atlas(scaled, dst_json, numeric_names=numeric)
+
+
+def make_variants(assets, root, tier, base_scale):
+    """
+    为清单源文件中的资源生成一档分辨率变体，返回指向变体文件的资源列表（格式与清单源文件相同）
+
+    tier 为目标分辨率倍数，base_scale 为原始资源对应的倍数（Man Down 的 RESOLUTION_SCALE = 3），
+    缩放因子为 tier / base_scale；变体写到 assets/@<tier>x/ 下，文件名与原文件相同
+    """
+    root = Path(root)
+    factor = tier / base_scale
+    out_dir = tier_dir(root, tier)
+    # 目录只存放本工具生成的变体，先清空，避免图集页数变化后留下旧页面
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+
+    def rel(path):
+        return Path(path).resolve().relative_to(root.resolve()).as_posix()
+
+    variants = []
+    for asset in assets:
+        kind = asset["type"]
+        variant = dict(asset)
+        if kind == "image":
+            dst = out_dir / Path(asset["path"]).name
+            scale_image(root / asset["path"], dst, factor)
+            variant["path"] = rel(dst)
+        elif kind == "sprite":
+            dst = out_dir / Path(asset["path"]).name
+            fw, fh = scale_sprite(root / asset["path"], dst, asset["frameWidth"], asset["frameHeight"], factor)
+            variant.update(path=rel(dst), frameWidth=fw, frameHeight=fh)
+        elif kind in ("atlas", "multiatlas"):
+            dst_json = out_dir / Path(asset["atlasPath"]).name
+            result = scale_atlas(root / asset["atlasPath"], dst_json, factor)
+            variant["atlasPath"] = rel(dst_json)
+            if len(result["pages"]) == 1:
+                variant.update(type="atlas", path=rel(result["pages"][0]))
+            else:
+                variant.update(type="multiatlas", path=rel(out_dir) + "/")
+        else:
+            raise ToolError(f"不支持的资源类型: {kind}（{asset['id']}）")
+        variants.append(variant)
+    return variants
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(sys.argv[1:])
+
+    if len(sys.argv) < 3:
+        print("用法: python asset_variants.py <清单源文件> <分辨率倍数,...> [--base-scale <n>]")
+        print("\n为清单中的每个图片、雪碧图和图集生成缩放变体，写到 assets/@<倍数>x/")
+        print("通常不单独使用，而是通过 build_manifest.py --tiers 同时生成变体和各档 manifest")
+        print("\n示例:")
+        print("  python tools/asset_variants.py manifest_man_down_100.src.json 1,2 --base-scale 3")
+        sys.exit(1)
+
+    source_path = Path(sys.argv[1])
+    tiers = [int(t) for t in sys.argv[2].split(",")]
+    base_scale = 3
+    if "--base-scale" in sys.argv[3:]:
+        base_scale = int(sys.argv[sys.argv.index("--base-scale") + 1])
+
+    try:
+        with open(source_path, encoding="utf-8") as f:
+            source = json.load(f)
+        for tier in tiers:
+            if tier != base_scale:
+                make_variants(source["assets"], source_path.parent, tier, base_scale)
+                print(f"✓ @{tier}x 变体已保存到: {tier_dir(source_path.parent, tier).resolve()}")
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
@@ -0,0 +1,382 @@
+from PIL import Image
+import json
+import math
+import re
+import sys
+from pathlib import Path
+
+from tool_errors import ToolError
+from trim_gif import get_bounding_box
+from hitboxes import write_hitboxes, print_hitbox_summary
+from profiling import parse_profile_flags
+
+
+class MaxRectsBin:
+    """
+    MaxRects 矩形装箱（Best Short Side Fit 规则，不旋转）
+
+    维护一组可能互相重叠的最大空闲矩形；放入一个矩形后，把与之相交的空闲矩形
+    切分成最多 4 个新的空闲矩形，再删除被其他空闲矩形完全包含的部分。
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.free_rects = [(0, 0, width, height)]
+        self.used_rects = []
+
+    def insert(self, w, h):
+        """放入 w x h 的矩形，返回左上角坐标 (x, y)；放不下返回 None"""
+        best = None
+        best_short = best_long = math.inf
+        for fx, fy, fw, fh in self.free_rects:
+            if w <= fw and h <= fh:
+                leftover_w = fw - w
+                leftover_h = fh - h
+                short_side = min(leftover_w, leftover_h)
+                long_side = max(leftover_w, leftover_h)
+                if short_side < best_short or (short_side == best_short and long_side < best_long):
+                    best = (fx, fy, w, h)
+                    best_short, best_long = short_side, long_side
+
+        if best is None:
+            return None
+
+        self._place(best)
+        return best[0], best[1]
+
+    def _place(self, rect):
+        x, y, w, h = rect
+        new_free = []
+        for fx, fy, fw, fh in self.free_rects:
+            # 不相交的空闲矩形保持不变
+            if x >= fx + fw or x + w <= fx or y >= fy + fh or y + h <= fy:
+                new_free.append((fx, fy, fw, fh))
+                continue
+            # 相交：切出上、下、左、右四块剩余空间
+            if y > fy:
+                new_free.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                new_free.append((fx, y + h, fw, fy + fh - (y + h)))
+            if x > fx:
+                new_free.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                new_free.append((x + w, fy, fx + fw - (x + w), fh))
+
+        self.free_rects = self._prune(new_free)
+        self.used_rects.append(rect)
+
+    @staticmethod
+    def _prune(rects):
+        """删除被其他空闲矩形完全包含的空闲矩形"""
+        rects = sorted(set(rects), key=lambda r: r[2] * r[3], reverse=True)
+        kept = []
+        for r in rects:
+            contained = any(
+                r[0] >= k[0] and r[1] >= k[1] and
+                r[0] + r[2] <= k[0] + k[2] and r[1] + r[3] <= k[1] + k[3]
+                for k in kept
+            )
+            if not contained:
+                kept.append(r)
+        return kept
+
+    def used_extent(self):
+        """已放置矩形占用的 (宽, 高)"""
+        if not self.used_rects:
+            return 0, 0
+        return (max(x + w for x, y, w, h in self.used_rects),
+                max(y + h for x, y, w, h in self.used_rects))
+
+
+def _next_pot(n):
+    """不小于 n 的最小 2 的幂"""
+    return 1 << max(0, (n - 1).bit_length())
+
+
+def _prev_pot(n):
+    """不大于 n 的最大 2 的幂"""
+    return 1 << (n.bit_length() - 1)
+
+
+def load_frames(path, frame_size=None, start=0, count=None):
+    """
+    读取一个动画的所有帧（RGBA）
+
+    参数:
+        path: GIF 动画、按网格排列的雪碧图，或单张图片
+        frame_size: (帧宽, 帧高)，指定时把图片按网格切成帧（雪碧图）
+        start / count: 只取第 start 帧起的 count 帧（None 表示到末尾）
+    """
+    try:
+        img = Image.open(path)
+    except Exception as e:
+        raise ToolError(f"无法打开图片: {path} ({e})") from e
+
+    frames = []
+    if frame_size is not None:
+        frame_w, frame_h = frame_size
+        sheet = img.convert("RGBA")
+        cols = sheet.size[0] // frame_w
+        rows = sheet.size[1] // frame_h
+        if cols == 0 or rows == 0:
+            raise ToolError(f"{path} 的尺寸 {sheet.size} 小于帧尺寸 {frame_w}x{frame_h}")
+        for i in range(cols * rows):
+            x = (i % cols) * frame_w
+            y = (i // cols) * frame_h
+            frames.append(sheet.crop((x, y, x + frame_w, y + frame_h)))
+        # 去掉末尾完全透明的空格子（网格最后一行通常没有填满）
+        while frames and get_bounding_box(frames[-1]) is None:
+            frames.pop()
+    else:
+        n_frames = getattr(img, 'n_frames', 1)
+        end = n_frames if count is None else min(n_frames, start + count)
+        for i in range(start, end):
+            img.seek(i)
+            frames.append(img.convert("RGBA"))
+        start, count = 0, None
+
+    end = len(frames) if count is None else start + count
+    frames = frames[start:end]
+    if not frames:
+        raise ToolError(f"{path} 中没有可用的帧")
+    return frames
+
+
+def pack_atlas(animations, output_path, max_size=2048, pot=False, padding=2, numeric_names=None, hitboxes=False):
+    """
+    把一个或多个动画的帧裁剪透明边后用 MaxRects 装箱，输出 Phaser 3 图集
+
+    参数:
+        animations: [(动画名, [RGBA 帧, ...]), ...]
+        output_path: 输出 JSON 路径（图片与之同名 .png；多页时为 -0.png、-1.png ...）
+        max_size: 单页纹理最大边长
+        pot: 是否把页面尺寸扩展为 2 的幂
+        padding: 帧之间保留的透明像素
+        numeric_names: 帧名是否直接用 "0"、"1"...（这样 generateFrameNumbers 可以直接使用）；
+                       None 表示只有一个动画时用数字，多个动画时用 "<动画名>_0000"
+        hitboxes: 同时输出每帧的碰撞数据 <输出名>.hitbox.json/.bin（见 hitboxes.write_hitboxes）
+
+    单页输出 Phaser JSON Hash 格式（scene.load.atlas），多页输出 multiatlas 格式
+    （scene.load.multiatlas）。每帧带 spriteSourceSize/sourceSize，裁掉的透明边在渲染时还原。
+    返回包含页面信息和帧数的 dict
+    """
+    if max_size < 1:
+        raise ToolError(f"max_size 必须大于 0: {max_size}")
+    if numeric_names is None:
+        numeric_names = len(animations) == 1
+    if numeric_names and len(animations) > 1:
+        raise ToolError("多个动画打包到同一图集时不能使用纯数字帧名")
+
+    # 每帧裁剪到自己的 alpha 边界框
+    items = []
+    anim_names = {}
+    for anim, frames in animations:
+        anim_names[anim] = []
+        for i, frame in enumerate(frames):
+            name = str(i) if numeric_names else f"{anim}_{i:04d}"
+            bbox = get_bounding_box(frame) or (0, 0, 1, 1)  # 全透明帧保留 1 像素
+            items.append({
+                "name": name,
+                "frame": frame,
+                "image": frame.crop(bbox),
+                "bbox": bbox,
+                "source": frame.size,
+            })
+            anim_names[anim].append(name)
+
+    # 2 的幂模式下页面尺寸会向上取整，按不超过 max_size 的 2 的幂装箱，取整后才不会超出
+    limit = _prev_pot(max_size) if pot else max_size
+    for item in items:
+        w, h = item["image"].size
+        if w > limit or h > limit:
+            raise ToolError(f"帧 {item['name']} 裁剪后尺寸 {w}x{h} 超过最大纹理尺寸 {limit}"
+                            + (f"（--pot 时取不超过 {max_size} 的 2 的幂）" if limit != max_size else ""))
+
+    # 大的先放，装箱效果更好
+    order = sorted(items, key=lambda it: (max(it["image"].size), it["image"].size[0] * it["image"].size[1]),
+                   reverse=True)
+
+    def pack_into(side_w, side_h):
+        """按顺序装箱，返回 [(bin, [(item, x, y), ...]), ...]；有帧连空页面都放不下时返回 None"""
+        pages = []
+        for item in order:
+            w, h = item["image"].size
+            for page_bin, placed in pages:
+                pos = page_bin.insert(w + padding, h + padding)
+                if pos is not None:
+                    placed.append((item, pos[0], pos[1]))
+                    break
+            else:
+                page_bin = MaxRectsBin(side_w + padding, side_h + padding)
+                pos = page_bin.insert(w + padding, h + padding)
+                if pos is None:
+                    return None
+                pages.append((page_bin, [(item, pos[0], pos[1])]))
+        return pages
+
+    # 先尝试能放进单页的最小正方形（至少放得下最大的帧），放不下再加大，到最大尺寸后分页
+    total_area = sum((it["image"].size[0] + padding) * (it["image"].size[1] + padding) for it in items)
+    largest = max(max(it["image"].size) for it in items)
+    side = min(limit, max(largest + padding, int(math.ceil(math.sqrt(total_area)))))
+    while True:
+        pages = pack_into(side, side)
+        if pages is not None and (len(pages) == 1 or side >= limit):
+            break
+        if side >= limit:
+            raise ToolError(f"无法把帧装入 {limit}x{limit} 的页面")
+        side = min(limit, int(side * 1.05) + 1)
+
+    out_path = Path(output_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    stem = out_path.with_suffix("")
+
+    textures = []
+    for page_index, (page_bin, placed) in enumerate(pages):
+        page_w, page_h = page_bin.used_extent()
+        page_w, page_h = page_w - padding, page_h - padding
+        if pot:
+            page_w, page_h = _next_pot(page_w), _next_pot(page_h)
+
+        image_path = Path(f"{stem}.png") if len(pages) == 1 else Path(f"{stem}-{page_index}.png")
+        page = Image.new("RGBA", (page_w, page_h), (0, 0, 0, 0))
+        frames_json = {}
+        for item, x, y in placed:
+            page.paste(item["image"], (x, y))
+            left, top, right, bottom = item["bbox"]
+            source_w, source_h = item["source"]
+            frames_json[item["name"]] = {
+                "frame": {"x": x, "y": y, "w": right - left, "h": bottom - top},
+                "rotated": False,
+                "trimmed": (right - left, bottom - top) != (source_w, source_h),
+                "spriteSourceSize": {"x": left, "y": top, "w": right - left, "h": bottom - top},
+                "sourceSize": {"w": source_w, "h": source_h},
+            }
+        page.save(image_path, format="PNG")
+
+        # 按原始帧顺序输出，便于阅读
+        ordered = {it["name"]: frames_json[it["name"]] for it in items if it["name"] in frames_json}
+        textures.append({
+            "image": image_path.name,
+            "format": "RGBA8888",
+            "size": {"w": page_w, "h": page_h},
+            "scale": 1,
+            "frames": ordered,
+        })
+
+    meta = {"app": "tools/atlas_packer.py", "version": "1", "animations": anim_names}
+    if len(textures) == 1:
+        texture = textures[0]
+        atlas = {
+            "frames": texture["frames"],
+            "meta": dict(meta, image=texture["image"], format=texture["format"],
+                         size=texture["size"], scale="1"),
+        }
+    else:
+        # multiatlas 的 frames 是带 filename 的数组
+        atlas = {
+            "textures": [
+                dict(texture, frames=[dict(frame, filename=name) for name, frame in texture["frames"].items()])
+                for texture in textures
+            ],
+            "meta": meta,
+        }
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(atlas, f, ensure_ascii=False, indent=1)
+
+    total_pixels = sum(t["size"]["w"] * t["size"]["h"] for t in textures)
+    print(f"✓ 图集已保存到: {out_path.resolve()}")
+    print(f"  动画: {', '.join(f'{a}({len(n)} 帧)' for a, n in anim_names.items())}")
+    for t in textures:
+        print(f"  页面: {t['image']} {t['size']['w']}x{t['size']['h']}, {len(t['frames'])} 帧")
+    print(f"  加载方式: scene.load.{'atlas' if len(textures) == 1 else 'multiatlas'}")
+    if hitboxes:
+        json_path, bin_path, solid = write_hitboxes([(it["name"], it["frame"]) for it in items], out_path,
+                                                    out_path.name, items[0]["source"])
+        print_hitbox_summary(json_path, bin_path, len(items), solid)
+
+    return {
+        "output": str(out_path),
+        "pages": [str(out_path.parent / t["image"]) for t in textures],
+        "frames": len(items),
+        "pixels": total_pixels,
+    }
+
+
+_SOURCE_RE = re.compile(
+    r"^(?P<name>[^=]+)=(?P<path>.+?)(?:@(?P<fw>\d+)x(?P<fh>\d+))?(?:\[(?P<start>\d+):(?P<count>\d+)\])?$"
+)
+
+
+def parse_source(spec):
+    """解析 "名称=路径[@帧宽x帧高][[起始:数量]]" 形式的动画来源"""
+    m = _SOURCE_RE.match(spec)
+    if not m:
+        raise ToolError(f"无法解析动画来源: {spec}")
+    frame_size = (int(m["fw"]), int(m["fh"])) if m["fw"] else None
+    start = int(m["start"]) if m["start"] else 0
+    count = int(m["count"]) if m["count"] else None
+    return m["name"], load_frames(m["path"], frame_size, start, count)
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(sys.argv[1:])
+
+    if len(sys.argv) < 3:
+        print("用法: python atlas_packer.py <输出JSON> <名称=来源> [<名称=来源> ...] [选项]")
+        print("\n来源格式:")
+        print("  walk=walk.gif                    GIF 全部帧")
+        print("  walk=walk.gif[60:20]             GIF 从第 60 帧开始的 20 帧")
+        print("  walk=walk_sprite.png@198x341     按 198x341 网格切分的雪碧图")
+        print("  icon=icon.png                    单张图片")
+        print("\n选项:")
+        print("  --max-size <n>     单页最大边长（默认 2048），放不下时自动分页")
+        print("  --pot              页面尺寸扩展为 2 的幂（不超过 --max-size，按其以内最大的 2 的幂装箱）")
+        print("  --padding <n>      帧间距（默认 2）")
+        print("  --prefixed-names   帧名使用 <名称>_0000（默认只有一个动画时用 0、1、2...）")
+        print("  --hitboxes         同时输出每帧碰撞数据 <输出名>.hitbox.json/.bin（边界框、凸包、1 位掩码）")
+        print("\n示例:")
+        print("  python atlas_packer.py assets/avatar_walk_atlas.json walk=assets/avatar_walk_sprite.png@198x341")
+        print("  python atlas_packer.py assets/player.json walk=assets/avatar_walk.gif[0:35] jump=assets/avatar_jump3.gif[0:35]")
+        sys.exit(1)
+
+    output_path = sys.argv[1]
+    specs = []
+    max_size = 2048
+    pot = False
+    padding = 2
+    numeric_names = None
+    hitboxes = False
+
+    i = 2
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ["--max-size", "--padding"]:
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            if arg == "--max-size":
+                max_size = int(sys.argv[i + 1])
+            else:
+                padding = int(sys.argv[i + 1])
+            i += 2
+        elif arg == "--pot":
+            pot = True
+            i += 1
+        elif arg == "--prefixed-names":
+            numeric_names = False
+            i += 1
+        elif arg == "--hitboxes":
+            hitboxes = True
+            i += 1
+        else:
+            specs.append(arg)
+            i += 1
+
+    try:
+        animations = [parse_source(spec) for spec in specs]
+        pack_atlas(animations, output_path, max_size, pot, padding, numeric_names, hitboxes)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
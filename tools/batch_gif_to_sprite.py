@@ -0,0 +1,161 @@
+import contextlib
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from tool_errors import ToolError
+from gif_to_sprite import gif_to_sprite
+import build_cache
+from build_cache import parse_cache_flags
+import profiling
+from profiling import parse_profile_flags
+
+
+def convert_one(gif_path, output_path, max_frames=40, frames_per_row=None, profile=False, cache_settings=None):
+    """
+    在工作进程中转换单个 GIF
+
+    profile 和 cache_settings（build_cache.current_settings()）把主进程的 --profile、--no-cache、
+    --cache-dir 带到工作进程。
+
+    返回 (是否成功, gif_to_sprite 的结果 dict 或错误信息, --profile 的阶段记录)。
+    单文件的详细日志被丢弃以免多进程输出交错；任何异常都在这里捕获，
+    一个坏文件不会影响同一进程池里的其他文件
+    """
+    if profile:
+        profiling.enable()
+    if cache_settings is not None:
+        build_cache.apply_settings(cache_settings)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), profiling.track(gif_path):
+            result = gif_to_sprite(gif_path, output_path, max_frames, frames_per_row)
+        return True, result, profiling.take_records()
+    except ToolError as e:
+        return False, str(e), profiling.take_records()
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}", profiling.take_records()
+
+
+def find_gifs(dir_path):
+    """列出目录下（不递归）所有 GIF 文件，按文件名排序"""
+    return sorted(p for p in Path(dir_path).iterdir()
+                  if p.is_file() and p.suffix.lower() == ".gif")
+
+
+def batch_gif_to_sprite(dir_path, max_frames=40, frames_per_row=None, jobs=None):
+    """
+    批量将目录下的 GIF 转换为雪碧图 sprite_<文件名>.png
+
+    使用进程池并行转换，进程数默认等于 CPU 核数。
+    返回 (成功数, 失败数)
+    """
+    dir_path = Path(dir_path)
+    if not dir_path.is_dir():
+        raise ToolError(f"目录不存在: {dir_path}")
+
+    gif_files = find_gifs(dir_path)
+    jobs = jobs or os.cpu_count() or 1
+
+    print("开始批量转换 GIF 为雪碧图...")
+    print(f"目录: {dir_path}")
+    print(f"最大帧数: {max_frames}")
+    if frames_per_row:
+        print(f"每行帧数: {frames_per_row}")
+    print(f"并行进程数: {jobs}")
+    print("")
+
+    success = 0
+    failed = 0
+    total = len(gif_files)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {}
+        for gif_file in gif_files:
+            output_file = gif_file.parent / f"sprite_{gif_file.stem}.png"
+            future = pool.submit(convert_one, str(gif_file), str(output_file), max_frames, frames_per_row,
+                                 profiling.enabled(), build_cache.current_settings())
+            futures[future] = (gif_file, output_file)
+
+        for done, future in enumerate(as_completed(futures), 1):
+            gif_file, output_file = futures[future]
+            try:
+                ok, result, records = future.result()
+            except BrokenProcessPool:
+                # 某个工作进程被杀（如内存不足），进程池中尚未完成的文件都会以此结束
+                ok, result, records = False, "工作进程异常退出（可能内存不足），未完成转换", []
+            profiling.merge_records(records)
+
+            print(f"[{done}/{total}] 处理: {gif_file.name}")
+            if ok:
+                print(f"     ✓ 成功: {output_file} "
+                      f"({result['frames']} 帧, {result['frame_width']}x{result['frame_height']}, "
+                      f"{result['width']}x{result['height']})")
+                success += 1
+            else:
+                print(f"     ✗ 失败: {result}")
+                failed += 1
+            print("")
+
+    # 输出统计结果
+    print("========================================")
+    print("处理完成！")
+    print(f"总计: {total} 个文件")
+    print(f"成功: {success} 个")
+    print(f"失败: {failed} 个")
+    print("========================================")
+
+    return success, failed
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(parse_cache_flags(sys.argv[1:]))
+
+    # 分离位置参数和 --jobs 选项
+    args = []
+    jobs = None
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ["--jobs", "-j"]:
+            if i + 1 < len(sys.argv):
+                jobs = int(sys.argv[i + 1])
+                i += 2
+            else:
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+        else:
+            args.append(arg)
+            i += 1
+
+    if len(args) < 1:
+        print("用法: python batch_gif_to_sprite.py <目录路径> [最大帧数] [每行帧数] [--jobs <进程数>]")
+        print("")
+        print("参数:")
+        print("  目录路径: 包含 GIF 文件的目录")
+        print("  最大帧数: 提取的最大帧数（可选，默认 40）")
+        print("  每行帧数: 每行放置的帧数（可选，默认自动计算）")
+        print("  --jobs, -j <进程数>: 并行进程数（可选，默认等于 CPU 核数）")
+        print("  --no-cache: 忽略构建缓存，强制重新生成")
+        print("  --profile: 剖析各阶段耗时和内存（另有 --profile-json <路径>、--profile-pstats <路径>）")
+        print("")
+        print("示例:")
+        print("  python batch_gif_to_sprite.py ./assets")
+        print("  python batch_gif_to_sprite.py ./assets 40")
+        print("  python batch_gif_to_sprite.py ./assets 40 10 --jobs 4")
+        sys.exit(1)
+
+    dir_path = args[0]
+    max_frames = int(args[1]) if len(args) > 1 else 40
+    frames_per_row = int(args[2]) if len(args) > 2 and args[2] else None
+
+    try:
+        success, failed = batch_gif_to_sprite(dir_path, max_frames, frames_per_row, jobs)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+
+    if failed > 0:
+        sys.exit(1)
@@ -0,0 +1,368 @@
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+import PIL
+from PIL import Image
+
+from tool_errors import ToolError
+import build_cache
+from build_cache import cache_dir
+from profiling import peak_rss_bytes
+
+
+# 合成 RGBA PNG 的边长
+PNG_SIZES = (64, 256, 1024, 4096)
+# 合成动画 GIF：(帧数, 边长, 处置方式)；处置方式 1 = 保留上一帧，2 = 恢复为背景（透明）
+GIF_SPECS = ((1, 256, 1), (20, 256, 2), (60, 512, 1), (200, 256, 2))
+# --quick 时跳过的大输入：PNG 边长上限和 GIF 帧数上限
+QUICK_MAX_SIZE = 1024
+QUICK_MAX_FRAMES = 60
+DEFAULT_REPEAT = 3
+# 与基线比较时，耗时或峰值内存增长超过此百分比算回退
+DEFAULT_TOLERANCE = 15.0
+# 绝对差值低于这些值时不算回退，避免小输入的计时抖动误报
+MIN_TIME_DELTA = 0.05
+MIN_RSS_DELTA = 8 * 1024 * 1024
+# 合成输入的格式改动时递增，使 .asset_cache/benchmark/ 下已生成的输入失效
+INPUT_VERSION = 1
+
+# 工具名 -> (模块, 函数)
+TOOLS = {
+    "black_to_transparent": ("black_to_transparent", "black_to_transparent"),
+    "remove_black_background_glow": ("black_to_transparent", "remove_black_background_glow"),
+    "trim_gif": ("trim_gif", "trim_gif"),
+    "resize_gif": ("resize_gif", "resize_gif"),
+    "gif_to_sprite": ("gif_to_sprite", "gif_to_sprite"),
+    "make_sprite": ("make_sprite", "make_sprite"),
+}
+
+
+def input_dir():
+    """合成输入的存放目录（位于构建缓存目录下，跨次运行复用）"""
+    return Path(cache_dir()) / "benchmark" / f"v{INPUT_VERSION}"
+
+
+def synthetic_png(size, path):
+    """
+    生成 size x size 的不透明 RGBA PNG：渐变 + 噪声的前景圆盘放在接近黑色的噪声背景上，
+    背景里 1/4 的像素是纯黑，阈值不同时去黑底的结果也不同。内容只由 size 决定
+    """
+    rng = np.random.default_rng(size)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    rgba = np.empty((size, size, 4), dtype=np.uint8)
+    rgba[..., 0] = x * 255
+    rgba[..., 1] = y * 255
+    rgba[..., 2] = rng.integers(0, 256, (size, size), dtype=np.uint8)
+    rgba[..., 3] = 255
+    background = (x - 0.5) ** 2 + (y - 0.5) ** 2 > 0.16
+    dark = rng.integers(0, 40, (size, size, 3), dtype=np.uint8)
+    dark[rng.random((size, size)) < 0.25] = 0
+    rgba[..., :3][background] = dark[background]
+    Image.fromarray(rgba, "RGBA").save(path, format="PNG")
+
+
+def synthetic_gif(frames, size, disposal, path):
+    """
+    生成 frames 帧、size x size 的动画 GIF：0 号为透明色，一个带条纹的圆盘绕中心移动，
+    另有一块静止的纹理方块；四周留出透明边（trim_gif 有东西可裁），帧时长在 40-100ms 间变化
+    """
+    rng = np.random.default_rng(frames * 7919 + size)
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    palette[1:] = rng.integers(0, 256, (255, 3), dtype=np.uint8)
+    y, x = np.mgrid[0:size, 0:size]
+    margin = size // 8
+    block = rng.integers(1, 256, (size // 6, size // 6), dtype=np.uint8)
+    radius = size // 6
+
+    images = []
+    for i in range(frames):
+        angle = 2 * np.pi * i / max(frames, 1)
+        cx = size / 2 + (size / 2 - margin - radius) * np.cos(angle)
+        cy = size / 2 + (size / 2 - margin - radius) * np.sin(angle)
+        index = np.zeros((size, size), dtype=np.uint8)
+        disc = (x - cx) ** 2 + (y - cy) ** 2 < radius ** 2
+        index[disc] = ((x[disc] + y[disc] + i * 3) // 4 % 255 + 1).astype(np.uint8)
+        index[margin:margin + block.shape[0], margin:margin + block.shape[1]] = block
+        img = Image.fromarray(index, "P")
+        img.putpalette(palette.ravel().tolist())
+        images.append(img)
+
+    durations = [40 + 20 * (i % 4) for i in range(frames)]
+    images[0].save(path, format="GIF", save_all=frames > 1, append_images=images[1:],
+                   duration=durations if frames > 1 else durations[0], loop=0,
+                   disposal=disposal, transparency=0, optimize=False)
+
+
+def build_cases(quick=False):
+    """
+    基准用例列表，每个用例为 dict：name、tool、inputs（相对 input_dir 的输入文件名）、
+    output（输出文件名）、params（传给工具函数的关键字参数）、pixels（处理的像素数，用于计算吞吐量）
+    """
+    png_sizes = [s for s in PNG_SIZES if not quick or s <= QUICK_MAX_SIZE]
+    gif_specs = [g for g in GIF_SPECS if not quick or g[0] <= QUICK_MAX_FRAMES]
+    cases = []
+
+    def add(tool, inputs, output, pixels, label, **params):
+        cases.append({"name": f"{tool}/{label}", "tool": tool, "inputs": inputs, "output": output,
+                      "params": params, "pixels": pixels})
+
+    for size in png_sizes:
+        png = f"rgba_{size}.png"
+        for threshold in (0, 30):
+            add("black_to_transparent", [png], "out.png", size * size,
+                f"{size}/threshold={threshold}", threshold=threshold)
+        for feather in (0, 20):
+            add("remove_black_background_glow", [png], "out.png", size * size,
+                f"{size}/feather={feather}", feather=feather)
+        add("make_sprite", [png] * 3, "out.png", 3 * size * size, f"{size}")
+
+    for frames, size, disposal in gif_specs:
+        gif = f"anim_{frames}f_{size}_d{disposal}.gif"
+        label = f"{frames}f_{size}_d{disposal}"
+        pixels = frames * size * size
+        add("trim_gif", [gif], "out.gif", pixels, label)
+        add("trim_gif", [gif], "out.gif", pixels, f"{label}/delta", delta=True)
+        add("resize_gif", [gif], "out.gif", pixels, f"{label}/scale=0.5", scale=0.5)
+        sprite_pixels = min(frames, 40) * size * size
+        add("gif_to_sprite", [gif], "out.png", sprite_pixels, f"{label}/max=40", max_frames=40)
+        add("gif_to_sprite", [gif], "out.png", sprite_pixels, f"{label}/max=40/dedupe",
+            max_frames=40, dedupe=True)
+        add("gif_to_sprite", [gif], "out.png", sprite_pixels, f"{label}/max=40/indexed",
+            max_frames=40, indexed=True)
+    return cases
+
+
+def ensure_inputs(cases):
+    """生成用例用到但还不存在的合成输入，返回输入目录"""
+    root = input_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    for name in sorted({name for case in cases for name in case["inputs"]}):
+        path = root / name
+        if path.exists():
+            continue
+        print(f"生成合成输入: {name}")
+        # 先写临时文件再改名，中断时不会留下残缺的输入
+        tmp = path.with_name(path.name + ".tmp")
+        if name.startswith("rgba_"):
+            synthetic_png(int(path.stem.split("_")[1]), tmp)
+        else:
+            frames, size, disposal = path.stem.split("_")[1:]
+            synthetic_gif(int(frames[:-1]), int(size), int(disposal[1:]), tmp)
+        os.replace(tmp, path)
+    return root
+
+
+def run_case(case, inputs_root, out_dir):
+    """
+    在工作进程中运行一次用例，返回 {"wall": 秒, "cpu": 秒, "peak_rss": 字节, "rss_growth": 字节}
+
+    每次运行都在新进程里进行，峰值内存互不影响；rss_growth 为运行期间峰值内存比导入模块后增长的部分。
+    不使用构建缓存，gif_index 的帧索引也写到这次运行专用的临时目录（每次重复都从冷启动解码），
+    工具自身的输出被丢弃
+    """
+    module, name = TOOLS[case["tool"]]
+    func = getattr(importlib.import_module(module), name)
+    inputs = [str(Path(inputs_root) / p) for p in case["inputs"]]
+    output = str(Path(out_dir) / case["output"])
+    if case["tool"] == "make_sprite":
+        args = (output, *inputs)
+    else:
+        args = (inputs[0], output)
+
+    before = peak_rss_bytes()
+    with tempfile.TemporaryDirectory(prefix="benchmark_cache_") as tmp_cache, \
+            contextlib.redirect_stdout(io.StringIO()):
+        build_cache.apply_settings({"cache_dir": tmp_cache})
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        func(*args, use_cache=False, **case["params"])
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+    peak = peak_rss_bytes()
+    return {"wall": wall, "cpu": cpu, "peak_rss": peak, "rss_growth": peak - before}
+
+
+def run_benchmarks(cases, repeat=DEFAULT_REPEAT):
+    """
+    依次运行所有用例，每个用例重复 repeat 次（每次一个新进程，不并行，避免互相抢占 CPU 和内存）
+
+    耗时取最小值（最不受干扰的一次），峰值内存取最大值。返回 {用例名: 结果 dict}
+    """
+    # Linux 上 exec 之后峰值内存沿用 fork 时父进程的值，输入也在子进程里生成，父进程保持精简
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        inputs_root = pool.submit(ensure_inputs, cases).result()
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as out_dir:
+        for n, case in enumerate(cases, 1):
+            runs = []
+            for _ in range(repeat):
+                # spawn 出的进程不继承父进程的内存，峰值内存只反映这一次运行
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    try:
+                        runs.append(pool.submit(run_case, case, str(inputs_root), out_dir).result())
+                    except ToolError as e:
+                        raise ToolError(f"{case['name']} 运行失败: {e}") from e
+            wall = min(r["wall"] for r in runs)
+            results[case["name"]] = {
+                "tool": case["tool"],
+                "params": case["params"],
+                "pixels": case["pixels"],
+                "wall": round(wall, 4),
+                "cpu": round(min(r["cpu"] for r in runs), 4),
+                "mpx_per_s": round(case["pixels"] / 1e6 / wall, 2) if wall else None,
+                "peak_rss": max(r["peak_rss"] for r in runs),
+                "rss_growth": max(r["rss_growth"] for r in runs),
+            }
+            r = results[case["name"]]
+            print(f"[{n}/{len(cases)}] {case['name']:58} {r['wall']:8.3f}s {r['mpx_per_s'] or 0:9.1f} Mpx/s "
+                  f"{r['peak_rss'] / 1024 / 1024:8.1f} MB (+{r['rss_growth'] / 1024 / 1024:.1f})")
+    return results
+
+
+def environment():
+    """记录在报告里的运行环境，不同机器的基线不能直接比较"""
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    与基线报告比较，返回 (回退说明列表, 变快的用例说明列表)
+
+    只比较两边都有的用例；耗时（wall）或峰值内存增长超过 tolerance%，
+    且绝对差值超过 MIN_TIME_DELTA / MIN_RSS_DELTA 时算回退
+    """
+    regressions = []
+    improvements = []
+    limit = 1 + tolerance / 100
+    for name, new in report["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        if new["wall"] > old["wall"] * limit and new["wall"] - old["wall"] > MIN_TIME_DELTA:
+            regressions.append(f"{name} 耗时: {old['wall']:.3f}s -> {new['wall']:.3f}s "
+                               f"(+{(new['wall'] - old['wall']) / old['wall']:.1%})")
+        elif old["wall"] > new["wall"] * limit and old["wall"] - new["wall"] > MIN_TIME_DELTA:
+            improvements.append(f"{name} 耗时: {old['wall']:.3f}s -> {new['wall']:.3f}s "
+                                f"(-{(old['wall'] - new['wall']) / old['wall']:.1%})")
+        if new["peak_rss"] > old["peak_rss"] * limit and new["peak_rss"] - old["peak_rss"] > MIN_RSS_DELTA:
+            regressions.append(f"{name} 峰值内存: {old['peak_rss'] / 1024 / 1024:.1f}MB -> "
+                               f"{new['peak_rss'] / 1024 / 1024:.1f}MB")
+    return regressions, improvements
+
+
+if __name__ == "__main__":
+    quick = False
+    filters = []
+    repeat = DEFAULT_REPEAT
+    json_path = None
+    baseline_path = None
+    tolerance = DEFAULT_TOLERANCE
+    list_only = False
+
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ["--filter", "--repeat", "--json", "--baseline", "--tolerance"]:
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            value = sys.argv[i + 1]
+            if arg == "--filter":
+                filters.append(value)
+            elif arg == "--repeat":
+                repeat = int(value)
+            elif arg == "--json":
+                json_path = value
+            elif arg == "--baseline":
+                baseline_path = value
+            else:
+                tolerance = float(value)
+            i += 2
+        elif arg == "--quick":
+            quick = True
+            i += 1
+        elif arg == "--list":
+            list_only = True
+            i += 1
+        else:
+            print("用法: python benchmark.py [选项]")
+            print("\n用确定性的合成输入测量 tools/ 中各图片工具的耗时、吞吐量和峰值内存")
+            print("\n选项:")
+            print(f"  --quick               跳过大于 {QUICK_MAX_SIZE}px 的 PNG 和超过 {QUICK_MAX_FRAMES} 帧的 GIF")
+            print("  --filter <子串>       只运行名称包含该子串的用例（可多次指定）")
+            print(f"  --repeat <n>          每个用例重复次数，取最快的一次（默认 {DEFAULT_REPEAT}）")
+            print("  --json <路径>         写出结果，作为以后比较的基线")
+            print("  --baseline <路径>     与之前的结果比较，有回退时以非零状态退出")
+            print(f"  --tolerance <百分比>  允许的耗时/峰值内存增长（默认 {DEFAULT_TOLERANCE}）")
+            print("  --list                只列出用例")
+            print("\n示例:")
+            print("  python tools/benchmark.py --quick --json bench_baseline.json")
+            print("  python tools/benchmark.py --quick --baseline bench_baseline.json")
+            sys.exit(0 if arg in ["--help", "-h"] else 1)
+
+    cases = [c for c in build_cases(quick) if not filters or any(f in c["name"] for f in filters)]
+    if list_only:
+        for case in cases:
+            print(case["name"])
+        sys.exit(0)
+    if not cases:
+        print("错误：没有匹配的用例")
+        sys.exit(1)
+
+    try:
+        baseline = None
+        if baseline_path:
+            if not Path(baseline_path).is_file():
+                raise ToolError(f"基线报告不存在: {baseline_path}")
+            with open(baseline_path, encoding="utf-8") as f:
+                baseline = json.load(f)
+        print(f"运行 {len(cases)} 个用例，每个重复 {repeat} 次\n")
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": environment(),
+            "quick": quick,
+            "repeat": repeat,
+            "results": run_benchmarks(cases, repeat),
+        }
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+        print(f"\n✓ 结果已保存到: {Path(json_path).resolve()}")
+
+    if baseline is not None:
+        if baseline.get("environment") != report["environment"]:
+            print("\n⚠ 基线来自不同的运行环境，比较结果仅供参考")
+        regressions, improvements = compare(report, baseline, tolerance)
+        if improvements:
+            print("\n变快的用例:")
+            for line in improvements:
+                print(f"  {line}")
+        if regressions:
+            print("\n✗ 性能回退:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\n✓ 没有超过 {tolerance}% 的回退")
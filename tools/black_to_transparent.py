@@ -1,7 +1,22 @@
 from PIL import Image
+import numpy as np
+import os
+import struct
 import sys
+import zlib
 from pathlib import Path
 
+from tool_errors import ToolError
+from build_cache import cached_tool, parse_cache_flags
+from png_stream import PngStreamReader, PngStreamWriter
+from profiling import parse_profile_flags, peak_rss_bytes, stage
+
+
+# 解码后（RGBA）超过这个大小的图片自动按行带流式处理
+STRIP_THRESHOLD_BYTES = 64 * 1024 * 1024
+# 流式处理时每个行带（RGBA）的内存预算，行带高度 = 预算 / (宽 x 4)，峰值内存与图片高度无关
+BAND_BYTES = 2 * 1024 * 1024
+
 
 def _clean_path(p):
     """去掉路径前可能带的 @ 前缀"""
@@ -10,7 +25,153 @@ def _clean_path(p):
     return p
 
 
-def black_to_transparent(input_path, output_path=None, threshold=0):
+def apply_black_to_transparent(img, threshold=0):
+    """对 RGBA 图像做"黑色变透明"处理（整数组运算，不逐像素循环）。
+
+    判定规则与 black_to_transparent() 一致：R、G、B 都 <= threshold 且 alpha>0 的像素 alpha 置 0。
+
+    返回 (新图像, 被透明化的像素数)
+    """
+    arr = np.array(img.convert("RGBA"))
+    changed = _black_kernel(arr, threshold)
+    return Image.fromarray(arr, "RGBA"), changed
+
+
+def _black_kernel(arr, threshold=0):
+    """在 RGBA 数组 arr（整图或行带）上原地执行黑色变透明，返回被透明化的像素数"""
+    alpha = arr[..., 3]
+    mask = (arr[..., :3].max(axis=2) <= threshold) & (alpha > 0)
+    alpha[mask] = 0
+    return int(np.count_nonzero(mask))
+
+
+def _edge_distance(w, h, top=0, rows=None):
+    """
+    每个像素到图像四边的最近距离 min(x, y, w-1-x, h-1-y)
+
+    top/rows 指定只计算第 top 行起的 rows 行（行带），y 仍是在整张 w x h 图像中的行号，
+    因此分带计算的结果与整图计算逐行相同
+    """
+    if rows is None:
+        rows = h - top
+    xs = np.arange(w, dtype=np.int64)
+    ys = np.arange(top, top + rows, dtype=np.int64)
+    dx = np.minimum(xs, w - 1 - xs)
+    dy = np.minimum(ys, h - 1 - ys)
+    return np.minimum(dy[:, None], dx[None, :])
+
+
+def apply_glow(img, feather=0):
+    """对 RGBA 图像做光晕提取（算法见 remove_black_background_glow()，整数组运算）。
+
+    返回 (新图像, 处理过的像素数)
+    """
+    arr = np.array(img.convert("RGBA"))
+    h, w = arr.shape[:2]
+    _glow_kernel(arr, w, h, feather)
+    return Image.fromarray(arr, "RGBA"), w * h
+
+
+def _glow_kernel(arr, w, h, feather=0, top=0):
+    """在 w x h 图像的 RGBA 数组 arr 上原地执行光晕变换。
+
+    与旧版逐像素实现逐字节一致：颜色按 255.0/max 浮点放大后截断取整，
+    alpha = max(r, g, b)，羽化时 alpha = int(alpha * dist / feather)。
+    arr 也可以是从第 top 行开始的行带，羽化距离仍按整张图像的四边计算。
+    """
+    rgb = arr[..., :3]
+    max_val = rgb.max(axis=2)
+    black = max_val == 0
+
+    # 纯黑像素用 1 代替除数，最后再整体置 (0, 0, 0, 0)
+    scale = 255.0 / np.where(black, 1, max_val)
+    scaled = np.minimum(255, (rgb * scale[..., None]).astype(np.int64))
+    arr[..., :3] = scaled
+
+    new_alpha = max_val.astype(np.int64)
+    if feather > 0:
+        dist = _edge_distance(w, h, top, arr.shape[0])
+        edge = dist < feather
+        factor = dist[edge] / feather
+        new_alpha[edge] = (new_alpha[edge] * factor).astype(np.int64)
+    arr[..., 3] = new_alpha
+
+    arr[black] = 0
+    return arr
+
+
+def process_strips(input_path, output_path, transform, band_bytes=BAND_BYTES):
+    """
+    按行带流式处理：解码一个行带 -> transform(行带 RGBA 数组, 起始行) 原地修改并返回计数 -> 写出，
+    内存中同时只有一个行带（见 png_stream.PngStreamReader / PngStreamWriter）
+
+    8 位不交错的 PNG 逐行带解码；其他输入（JPEG、16 位或交错 PNG 等）只能整图解码，
+    但仍按源格式保存，逐行带转成 RGBA，不再额外占用一份整图 RGBA 和输出图像。
+    返回 (宽, 高, 计数之和)
+    """
+    try:
+        reader = PngStreamReader(input_path)
+        width, height = reader.width, reader.height
+        band_rows = max(1, band_bytes // (width * 4))
+        bands = reader.bands(band_rows)
+    except ValueError:
+        try:
+            img = Image.open(input_path)
+            with stage("decode", pixels=img.width * img.height):
+                img.load()
+        except Exception as e:
+            raise ToolError(f"无法打开图片: {input_path} ({e})") from e
+        width, height = img.size
+        band_rows = max(1, band_bytes // (width * 4))
+        bands = ((top, np.array(img.crop((0, top, width, min(height, top + band_rows))).convert("RGBA")))
+                 for top in range(0, height, band_rows))
+    except OSError as e:
+        raise ToolError(f"无法打开图片: {input_path} ({e})") from e
+
+    # 先写到同目录的临时文件，全部写完再替换：输出路径与输入相同时，边读边写会截断源文件
+    output_path = Path(output_path)
+    tmp = output_path.with_name(output_path.name + ".tmp")
+    total = 0
+    try:
+        with PngStreamWriter(tmp, width, height, "RGBA") as writer:
+            for top, band in bands:
+                with stage("transform", pixels=band.shape[0] * width):
+                    total += transform(band, top)
+                writer.write_rows(band)
+        os.replace(tmp, output_path)
+    except (ValueError, struct.error, zlib.error) as e:
+        raise ToolError(f"无法解码图片: {input_path} ({e})") from e
+    finally:
+        tmp.unlink(missing_ok=True)
+    return width, height, total
+
+
+def _open_rgba(input_path):
+    """整图解码并转成 RGBA（分别计入 --profile 的 decode 和 convert 阶段）"""
+    try:
+        img = Image.open(input_path)
+        with stage("decode", pixels=img.width * img.height, nbytes=Path(input_path).stat().st_size):
+            img.load()
+    except Exception as e:
+        raise ToolError(f"无法打开图片: {input_path} ({e})") from e
+    with stage("convert", pixels=img.width * img.height):
+        return img.convert("RGBA")
+
+
+def _use_strips(input_path, strips):
+    """strips 为 None 时按解码后的大小自动决定是否分带处理（只读文件头，不解码）"""
+    if strips is not None:
+        return strips
+    try:
+        with Image.open(input_path) as img:
+            w, h = img.size
+    except Exception as e:
+        raise ToolError(f"无法打开图片: {input_path} ({e})") from e
+    return w * h * 4 > STRIP_THRESHOLD_BYTES
+
+
+@cached_tool("black_to_transparent", version=1, inputs=("input_path",), outputs=("output_path",))
+def black_to_transparent(input_path, output_path=None, threshold=0, strips=None):
     """把 PNG 里"黑色/近黑色"像素改成透明像素。
 
     判定规则：当 (R<=threshold 且 G<=threshold 且 B<=threshold) 且 alpha>0 时，将 alpha 置为 0。
@@ -19,6 +180,9 @@ def black_to_transparent(input_path, output_path=None, threshold=0):
         input_path: 输入图片路径
         output_path: 输出图片路径（None 则默认在同目录生成 *_transparent.png）
         threshold: 近黑阈值（0 表示仅纯黑）
+        strips: 是否按行带流式处理（见 process_strips），None 表示按图片大小自动选择
+
+    返回包含输出路径和处理像素数的 dict；出错时抛出 ToolError
     """
     input_path = Path(_clean_path(input_path))
     if output_path is None:
@@ -26,39 +190,37 @@ def black_to_transparent(input_path, output_path=None, threshold=0):
     else:
         output_path = Path(_clean_path(output_path))
 
-    # 打开并转 RGBA
-    try:
-        img = Image.open(input_path).convert("RGBA")
-    except Exception as e:
-        print(f"错误：无法打开图片: {input_path} ({e})")
-        sys.exit(1)
-
-    w, h = img.size
-    pixels = img.load()
-
-    changed = 0
-    total = w * h
+    strips = _use_strips(input_path, strips)
+    if strips:
+        w, h, changed = process_strips(input_path, output_path, lambda band, top: _black_kernel(band, threshold))
+        total = w * h
+    else:
+        # 打开并转 RGBA
+        img = _open_rgba(input_path)
 
-    for y in range(h):
-        for x in range(w):
-            r, g, b, a = pixels[x, y]
-            if a == 0:
-                continue
-            if r <= threshold and g <= threshold and b <= threshold:
-                pixels[x, y] = (r, g, b, 0)
-                changed += 1
+        w, h = img.size
+        total = w * h
+        with stage("transform", pixels=total):
+            img, changed = apply_black_to_transparent(img, threshold)
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    img.save(output_path, format="PNG")
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with stage("encode", pixels=total) as s:
+            img.save(output_path, format="PNG")
+            s.add(nbytes=output_path.stat().st_size)
 
     ratio = (changed / total) * 100 if total else 0
     print(f"输入: {input_path}")
     print(f"输出: {output_path.resolve()}")
     print(f"阈值: {threshold}")
     print(f"已透明化像素: {changed:,} / {total:,} ({ratio:.2f}%)")
+    if strips:
+        print(f"按行带流式处理，峰值内存(RSS): {peak_rss_bytes() / 1024 / 1024:.1f} MB")
 
+    return {"output": str(output_path), "changed": changed, "total": total}
 
-def remove_black_background_glow(input_path, output_path=None, feather=0):
+
+@cached_tool("remove_black_background_glow", version=1, inputs=("input_path",), outputs=("output_path",))
+def remove_black_background_glow(input_path, output_path=None, feather=0, strips=None):
     """
     移除黑色背景并保留光晕效果（适用于在任意背景上叠加）。
 
@@ -78,6 +240,9 @@ def remove_black_background_glow(input_path, output_path=None, feather=0):
         input_path: 输入图片路径
         output_path: 输出图片路径
         feather: 边缘羽化像素数，让图片边缘平滑过渡到透明（默认 0）
+        strips: 是否按行带流式处理（见 process_strips），None 表示按图片大小自动选择
+
+    返回包含输出路径和处理像素数的 dict；出错时抛出 ToolError
     """
     input_path = Path(_clean_path(input_path))
     if output_path is None:
@@ -85,53 +250,30 @@ def remove_black_background_glow(input_path, output_path=None, feather=0):
     else:
         output_path = Path(_clean_path(output_path))
 
-    try:
-        img = Image.open(input_path).convert("RGBA")
-    except Exception as e:
-        print(f"错误：无法打开图片: {input_path} ({e})")
-        sys.exit(1)
+    strips = _use_strips(input_path, strips)
+    if strips:
+        # 先取得宽高：羽化距离按整张图像计算
+        with Image.open(input_path) as img:
+            w, h = img.size
 
-    w, h = img.size
-    pixels = img.load()
+        def transform(band, top):
+            _glow_kernel(band, w, h, feather, top)
+            return band.shape[0] * w
 
-    changed = 0
-    total = w * h
+        w, h, changed = process_strips(input_path, output_path, transform)
+        total = w * h
+    else:
+        img = _open_rgba(input_path)
 
-    for y in range(h):
-        for x in range(w):
-            r, g, b, a = pixels[x, y]
+        w, h = img.size
+        total = w * h
+        with stage("transform", pixels=total):
+            img, changed = apply_glow(img, feather)
 
-            # 用 RGB 最大值作为亮度/alpha
-            max_val = max(r, g, b)
-            
-            if max_val == 0:
-                # 纯黑 -> 完全透明
-                pixels[x, y] = (0, 0, 0, 0)
-                changed += 1
-            else:
-                # 关键：把颜色"提亮"到最大亮度
-                # 这样 (20, 30, 15) 会变成 (170, 255, 127)
-                # 原始的"暗"会体现在 alpha 上，而不是颜色上
-                scale = 255.0 / max_val
-                new_r = min(255, int(r * scale))
-                new_g = min(255, int(g * scale))
-                new_b = min(255, int(b * scale))
-                
-                # alpha = 原始亮度
-                new_alpha = max_val
-                
-                # 如果启用了边缘羽化
-                if feather > 0:
-                    dist_to_edge = min(x, y, w - 1 - x, h - 1 - y)
-                    if dist_to_edge < feather:
-                        edge_factor = dist_to_edge / feather
-                        new_alpha = int(new_alpha * edge_factor)
-                
-                pixels[x, y] = (new_r, new_g, new_b, new_alpha)
-                changed += 1
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    img.save(output_path, format="PNG")
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with stage("encode", pixels=total) as s:
+            img.save(output_path, format="PNG")
+            s.add(nbytes=output_path.stat().st_size)
 
     ratio = (changed / total) * 100 if total else 0
     print(f"输入: {input_path}")
@@ -140,15 +282,24 @@ def remove_black_background_glow(input_path, output_path=None, feather=0):
     if feather > 0:
         print(f"边缘羽化: {feather}px")
     print(f"已处理像素: {changed:,} / {total:,} ({ratio:.2f}%)")
+    if strips:
+        print(f"按行带流式处理，峰值内存(RSS): {peak_rss_bytes() / 1024 / 1024:.1f} MB")
+
+    return {"output": str(output_path), "changed": changed, "total": total}
 
 
 if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(parse_cache_flags(sys.argv[1:]))
+
     if len(sys.argv) < 2:
         print("用法: python3 black_to_transparent.py <输入PNG> [输出PNG] [选项]")
         print("\n选项:")
         print("  --threshold, -t <0-255>  近黑阈值（默认 0，仅纯黑）[默认模式]")
         print("  --glow, -g               光晕模式：移除黑底并保留半透明光晕效果")
         print("  --feather, -f <像素>     边缘羽化：让图片边缘平滑过渡到透明（配合 --glow 使用）")
+        print("  --strips                 按行带流式处理，峰值内存与图片高度无关（解码后超过 64MB 时自动启用）")
+        print("  --no-cache               忽略构建缓存，强制重新生成")
+        print("  --profile                剖析各阶段耗时和内存（另有 --profile-json <路径>、--profile-pstats <路径>）")
         print("\n说明:")
         print("  默认模式：把纯黑/近黑像素直接变透明（适合有明确边界的图）")
         print("  光晕模式：适用于「黑底 + 光晕」的图片")
@@ -167,6 +318,7 @@ if __name__ == "__main__":
     threshold = 0
     glow_mode = False
     feather = 0
+    strips = None
 
     i = 2
     while i < len(sys.argv):
@@ -191,6 +343,9 @@ if __name__ == "__main__":
             else:
                 print(f"错误：{arg} 需要一个值")
                 sys.exit(1)
+        elif arg == "--strips":
+            strips = True
+            i += 1
         elif arg in ["--glow", "-g"]:
             glow_mode = True
             i += 1
@@ -208,7 +363,11 @@ if __name__ == "__main__":
                 sys.exit(1)
             i += 1
 
-    if glow_mode:
-        remove_black_background_glow(input_path, output_path, feather)
-    else:
-        black_to_transparent(input_path, output_path, threshold)
+    try:
+        if glow_mode:
+            remove_black_background_glow(input_path, output_path, feather, strips)
+        else:
+            black_to_transparent(input_path, output_path, threshold, strips)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
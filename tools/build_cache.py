@@ -0,0 +1,373 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为不加锁
+    fcntl = None
+
+
+# 默认缓存目录：项目根目录下的 .asset_cache/
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / ".asset_cache"
+# 默认缓存容量上限（产物副本总字节数），超过后按最近使用时间淘汰旧条目
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# 命令行 --no-cache / --cache-dir 以及环境变量 ASSET_CACHE=0、ASSET_CACHE_DIR 控制的全局设置
+_settings = {
+    "enabled": os.environ.get("ASSET_CACHE", "1") != "0",
+    "cache_dir": os.environ.get("ASSET_CACHE_DIR") or DEFAULT_CACHE_DIR,
+    "max_bytes": int(os.environ.get("ASSET_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+}
+
+
+def cache_dir():
+    """当前生效的缓存目录（受 --cache-dir 和 ASSET_CACHE_DIR 影响）"""
+    return Path(_settings["cache_dir"])
+
+
+def file_hash(path):
+    """计算文件内容的 sha256（分块读取，不一次性载入大文件）"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class BuildCache:
+    """
+    资源构建缓存
+
+    以「工具名 + 工具版本 + 输入文件内容哈希 + 参数」为键，记录产物的内容哈希，
+    并在 cache_dir/blobs/ 下按内容哈希保存一份产物副本：
+    - 输入和参数都没变、产物也还在：直接跳过
+    - 产物被删掉或要输出到另一个路径：从副本恢复，不重新计算
+    - 不同路径产出了完全相同的内容：打印重复产物警告
+    副本总大小超过 max_bytes 时，按最近使用时间淘汰最旧的条目。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = Path(cache_dir or _settings["cache_dir"])
+        self.max_bytes = max_bytes if max_bytes is not None else _settings["max_bytes"]
+        self.index_path = self.cache_dir / "index.json"
+        self.blob_dir = self.cache_dir / "blobs"
+
+    # ---- 索引读写 ----
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"entries": {}}
+
+    def _save(self, index):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.index_path)
+
+    def _locked(self):
+        """索引文件锁，多个进程（批量转换的进程池）同时读写索引时串行化"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        lock = open(self.cache_dir / "index.lock", "w")
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _blob_path(self, digest):
+        return self.blob_dir / digest[:2] / digest
+
+    # ---- 键 ----
+
+    @staticmethod
+    def make_key(tool, version, input_paths, params):
+        """由工具名、版本、输入内容哈希和参数生成缓存键"""
+        payload = {
+            "tool": tool,
+            "version": version,
+            "inputs": [file_hash(p) for p in input_paths],
+            "params": params,
+        }
+        text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    # ---- 查询 / 恢复 / 记录 ----
+
+    def restore(self, key, output_paths):
+        """
+        命中时确保所有产物就位（缺失或内容不对的从副本恢复），返回记录的结果；
+        未命中返回 None
+        """
+        with self._locked():
+            index = self._load()
+            entry = index["entries"].get(key)
+            if entry is None or len(entry["outputs"]) != len(output_paths):
+                return None
+
+            for digest, out in zip(entry["outputs"], output_paths):
+                out = Path(out)
+                if out.exists() and file_hash(out) == digest:
+                    continue
+                blob = self._blob_path(digest)
+                if not blob.exists():
+                    return None
+                out.parent.mkdir(parents=True, exist_ok=True)
+                tmp = out.with_name(out.name + ".tmp")
+                shutil.copyfile(blob, tmp)
+                os.replace(tmp, out)
+
+            self._note_paths(index, entry, output_paths)
+            entry["last_used"] = time.time()
+            self._save(index)
+            return entry.get("result")
+
+    def store(self, key, tool, output_paths, result=None):
+        """构建完成后记录产物（保存副本），并检查重复产物、执行容量淘汰"""
+        digests = []
+        for out in output_paths:
+            digest = file_hash(out)
+            blob = self._blob_path(digest)
+            if not blob.exists():
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                tmp = blob.with_name(blob.name + ".tmp")
+                shutil.copyfile(out, tmp)
+                os.replace(tmp, blob)
+            digests.append(digest)
+
+        with self._locked():
+            index = self._load()
+            entry = index["entries"].get(key) or {"tool": tool, "paths": []}
+            entry["outputs"] = digests
+            entry["result"] = result
+            entry["last_used"] = time.time()
+            index["entries"][key] = entry
+            self._note_paths(index, entry, output_paths)
+            self._evict(index)
+            self._save(index)
+
+    @staticmethod
+    def _note_paths(index, entry, output_paths):
+        """记录产物路径；同一内容出现在多个路径时打印重复产物警告"""
+        paths = [str(Path(p).resolve()) for p in output_paths]
+        for digest, path in zip(entry["outputs"], paths):
+            others = sorted({
+                other_path
+                for other in index["entries"].values()
+                for other_digest, other_path in zip(other["outputs"], other.get("paths", []))
+                if other_digest == digest and other_path != path and os.path.exists(other_path)
+            })
+            if others:
+                print(f"警告：重复产物 {path} 与 {', '.join(others)} 内容完全相同")
+        entry["paths"] = paths
+
+    def _evict(self, index):
+        """按最近使用时间淘汰条目，直到副本总大小不超过 max_bytes"""
+        def referenced():
+            return {d for e in index["entries"].values() for d in e["outputs"]}
+
+        def blob_size(digest):
+            blob = self._blob_path(digest)
+            return blob.stat().st_size if blob.exists() else 0
+
+        live = referenced()
+        total = sum(blob_size(d) for d in live)
+        for key, entry in sorted(index["entries"].items(), key=lambda kv: kv[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            del index["entries"][key]
+            still_used = referenced()
+            for digest in set(entry["outputs"]) - still_used:
+                total -= blob_size(digest)
+                self._blob_path(digest).unlink(missing_ok=True)
+
+    def stats(self):
+        """返回 (条目数, 副本数, 副本总字节数)"""
+        index = self._load()
+        digests = {d for e in index["entries"].values() for d in e["outputs"]}
+        size = sum(self._blob_path(d).stat().st_size for d in digests if self._blob_path(d).exists())
+        return len(index["entries"]), len(digests), size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def cached_tool(tool, version, inputs, outputs, ignore=()):
+    """
+    给工具函数加上构建缓存的装饰器
+
+    参数:
+        tool: 工具名（缓存键的一部分）
+        version: 工具版本，改动了会影响产物的逻辑时递增，使旧缓存失效
+        inputs: 输入文件参数名元组（参数值可以是路径或路径列表）
+        outputs: 输出文件参数名元组；元素也可以是 arguments -> 路径 的函数，
+                 用于随参数附带生成的文件（返回 None 表示本次不生成）
+        ignore: 不影响产物内容、不计入缓存键的参数名元组（如并行线程数）
+
+    其余参数（max_frames、threshold 等）全部计入缓存键。输出路径参数为 None
+    （覆盖原文件或自动命名）时不使用缓存。被装饰函数额外接受 use_cache 关键字参数。
+    """
+    named_output_args = [name for name in outputs if not callable(name)]
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, use_cache=None, **kwargs):
+            if use_cache is None:
+                use_cache = _settings["enabled"]
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+
+            if not use_cache or any(arguments[name] is None for name in named_output_args):
+                return func(*args, **kwargs)
+            output_paths = [name(arguments) if callable(name) else arguments[name] for name in outputs]
+            output_paths = [p for p in output_paths if p is not None]
+
+            input_paths = []
+            for name in inputs:
+                value = arguments[name]
+                input_paths.extend(value if isinstance(value, (list, tuple)) else [value])
+            params = {k: v for k, v in arguments.items()
+                      if k not in inputs and k not in named_output_args and k not in ignore}
+
+            try:
+                key = BuildCache.make_key(tool, version, input_paths, params)
+            except OSError:
+                # 输入文件不存在等情况交给工具函数自己报错
+                return func(*args, **kwargs)
+
+            cache = BuildCache()
+            result = cache.restore(key, output_paths)
+            if result is not None:
+                if isinstance(result, dict) and "output" in result:
+                    result["output"] = str(output_paths[0])
+                print(f"✓ 缓存命中，跳过构建: {', '.join(str(p) for p in output_paths)}")
+                return result
+
+            result = func(*args, **kwargs)
+            if result is not None and all(Path(p).exists() for p in output_paths):
+                cache.store(key, tool, output_paths, result)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def parse_cache_flags(argv):
+    """
+    从命令行参数中取出缓存相关选项并应用到全局设置，返回剩余参数
+
+    支持 --no-cache（强制重新构建）和 --cache-dir <目录>
+    """
+    rest = []
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "--no-cache":
+            _settings["enabled"] = False
+        elif arg == "--cache-dir" and i + 1 < len(argv):
+            _settings["cache_dir"] = argv[i + 1]
+            i += 1
+        else:
+            rest.append(arg)
+        i += 1
+    return rest
+
+
+def current_settings():
+    """主进程当前的缓存设置，传给工作进程后用 apply_settings 应用"""
+    return dict(_settings)
+
+
+def apply_settings(settings):
+    """
+    在工作进程中应用主进程的缓存设置
+
+    spawn 方式（macOS/Windows 默认）启动的工作进程重新导入本模块，只会从环境变量读到默认设置，
+    命令行的 --no-cache / --cache-dir 需要显式传过去
+    """
+    _settings.update(settings)
+
+
+def find_duplicate_files(paths):
+    """按内容哈希查找完全相同的文件，返回 [[路径, ...], ...]（每组至少 2 个）"""
+    by_size = {}
+    for p in paths:
+        by_size.setdefault(p.stat().st_size, []).append(p)
+
+    groups = []
+    for same_size in by_size.values():
+        if len(same_size) < 2:
+            continue
+        by_hash = {}
+        for p in same_size:
+            by_hash.setdefault(file_hash(p), []).append(p)
+        groups.extend(g for g in by_hash.values() if len(g) > 1)
+    return groups
+
+
+if __name__ == "__main__":
+    argv = parse_cache_flags(sys.argv[1:])
+    if not argv:
+        print("用法: python build_cache.py <命令> [参数] [--cache-dir <目录>]")
+        print("\n命令:")
+        print("  stats              查看缓存条目数和占用空间")
+        print("  clear              清空缓存")
+        print("  prune <字节数>     把缓存淘汰到指定大小以内")
+        print("  duplicates <目录>  查找目录下内容完全相同的文件")
+        print("\n环境变量:")
+        print("  ASSET_CACHE=0            禁用缓存（等同于各工具的 --no-cache）")
+        print("  ASSET_CACHE_DIR          缓存目录（默认项目根目录下 .asset_cache/）")
+        print("  ASSET_CACHE_MAX_BYTES    缓存容量上限（默认 512MB）")
+        sys.exit(1)
+
+    command = argv[0]
+    cache = BuildCache()
+
+    if command == "stats":
+        entries, blobs, size = cache.stats()
+        print(f"缓存目录: {cache.cache_dir}")
+        print(f"条目数: {entries}")
+        print(f"产物副本: {blobs} 个, {size:,} bytes / 上限 {cache.max_bytes:,} bytes")
+    elif command == "clear":
+        cache.clear()
+        print(f"已清空缓存: {cache.cache_dir}")
+    elif command == "prune":
+        if len(argv) < 2:
+            print("错误：prune 需要一个字节数")
+            sys.exit(1)
+        cache.max_bytes = int(argv[1])
+        with cache._locked():
+            index = cache._load()
+            cache._evict(index)
+            cache._save(index)
+        entries, blobs, size = cache.stats()
+        print(f"淘汰后: {entries} 个条目, {size:,} bytes")
+    elif command == "duplicates":
+        if len(argv) < 2:
+            print("错误：duplicates 需要一个目录")
+            sys.exit(1)
+        files = sorted(p for p in Path(argv[1]).rglob("*") if p.is_file())
+        groups = find_duplicate_files(files)
+        for group in groups:
+            size = group[0].stat().st_size
+            print(f"重复文件 ({size:,} bytes × {len(group)}):")
+            for p in group:
+                print(f"  {p}")
+        if not groups:
+            print("没有发现重复文件")
+        sys.exit(1 if groups else 0)
+    else:
+        print(f"错误：未知命令: {command}")
+        sys.exit(1)
@@ -0,0 +1,446 @@
+import json
+import re
+import shutil
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+from tool_errors import ToolError
+from build_cache import file_hash
+from asset_variants import make_variants
+from profiling import parse_profile_flags
+
+
+# 带哈希文件名中保留的 sha256 前缀长度
+HASH_LENGTH = 10
+# 首次使用不在启动阶段、且大于此字节数的资源放进 deferred 分组；
+# 更小的资源多发一次请求的开销比字节本身更大，仍随启动分组加载
+DEFER_MIN_BYTES = 32 * 1024
+# 原始资源对应的分辨率倍数（js/man_down_100.js 的 RESOLUTION_SCALE）
+DEFAULT_BASE_SCALE = 3
+# 场景类中在这些方法里首次用到的资源属于启动分组
+BOOT_METHODS = ("preload", "create")
+
+# 场景类的方法定义（四个空格缩进的 "name(args) {"）
+_METHOD_RE = re.compile(r"^    (\w+)\s*\([^)]*\)\s*\{\s*$")
+# 场景代码里对资源 id 的引用：this.assets.background.default
+_ASSET_REF_RE = re.compile(r"this\.assets\.([\w.]+)")
+# 方法内对其它方法的直接调用：this._createPlatformRow(
+_CALL_RE = re.compile(r"this\.(\w+)\s*\(")
+# JS 中硬编码的资源路径字符串：'assets/xxx.png'
+_ASSET_PATH_RE = re.compile(r"""['"`](assets/[^'"`$]+\.\w+)['"`]""")
+
+
+def hashed_name(path, digest):
+    """walk.png + 哈希 -> walk.<哈希前缀>.png"""
+    path = Path(path)
+    return f"{path.stem}.{digest[:HASH_LENGTH]}{path.suffix}"
+
+
+def image_info(path):
+    """读取图片尺寸（只读文件头，不解码像素），文件不存在或无法识别时抛出 ToolError"""
+    path = Path(path)
+    if not path.is_file():
+        raise ToolError(f"资源文件不存在: {path}")
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except (OSError, SyntaxError) as e:
+        raise ToolError(f"无法识别的图片 {path}: {e}") from e
+
+
+def _check_frames(frames, page_size, json_path):
+    """检查图集帧都落在页面范围内，返回帧数"""
+    page_w, page_h = page_size
+    for name, frame in frames:
+        rect = frame["frame"]
+        if rect["x"] < 0 or rect["y"] < 0 or rect["x"] + rect["w"] > page_w or rect["y"] + rect["h"] > page_h:
+            raise ToolError(f"{json_path} 中的帧 {name} 超出页面 {page_w}x{page_h}")
+    return len(frames)
+
+
+def _atlas_pages(json_path):
+    """
+    读取图集 JSON，返回 (atlas dict, 页面列表)
+
+    单页图集（scene.load.atlas）的图片名在 meta.image，多页图集（multiatlas）在 textures[].image；
+    每页返回 {"image", "path", "size", "frames"}，并校验页面尺寸和帧范围
+    """
+    json_path = Path(json_path)
+    if not json_path.is_file():
+        raise ToolError(f"图集文件不存在: {json_path}")
+    with open(json_path, encoding="utf-8") as f:
+        atlas = json.load(f)
+
+    if "textures" in atlas:
+        textures = [(t["image"], t.get("size"), [(fr.get("filename"), fr) for fr in t["frames"]])
+                    for t in atlas["textures"]]
+    else:
+        meta = atlas.get("meta", {})
+        frames = atlas["frames"]
+        frames = list(frames.items()) if isinstance(frames, dict) else [(fr.get("filename"), fr) for fr in frames]
+        textures = [(meta.get("image"), meta.get("size"), frames)]
+
+    pages = []
+    for image, declared, frames in textures:
+        if not image:
+            raise ToolError(f"{json_path} 没有记录图片文件名")
+        page_path = json_path.parent / image
+        size = image_info(page_path)
+        if declared and (declared["w"], declared["h"]) != size:
+            raise ToolError(f"{json_path} 记录的页面尺寸 {declared['w']}x{declared['h']} "
+                            f"与 {page_path.name} 实际尺寸 {size[0]}x{size[1]} 不一致")
+        pages.append({"image": image, "path": page_path, "size": size,
+                      "frames": _check_frames(frames, size, json_path)})
+    return atlas, pages
+
+
+def _copy_hashed(path, out_dir, written):
+    """把文件复制为带哈希的文件名，返回新路径"""
+    target = out_dir / hashed_name(path, file_hash(path))
+    if not target.exists():
+        shutil.copyfile(path, target)
+    written.add(target.name)
+    return target
+
+
+def _write_hashed_json(data, name, out_dir, written):
+    """把改写后的图集 JSON 以内容哈希命名写出，返回新路径"""
+    text = json.dumps(data, ensure_ascii=False, indent=1)
+    tmp = out_dir / f".{name}.tmp"
+    tmp.write_text(text, encoding="utf-8")
+    target = out_dir / hashed_name(name, file_hash(tmp))
+    tmp.replace(target)
+    written.add(target.name)
+    return target
+
+
+def first_use(scene_js):
+    """
+    扫描场景代码，返回 {资源 id: 首次引用所在的方法名}
+
+    启动方法（BOOT_METHODS）直接或间接调用的方法里的引用都记为该启动方法；箭头函数里的调用是
+    事件回调，不算启动阶段。只识别 this.assets.<id> 引用、this.<方法>() 调用和类方法定义
+    （四个空格缩进），足以覆盖 js/ 下的场景写法
+    """
+    refs = {}
+    calls = {}
+    order = []
+    method = None
+    with open(scene_js, encoding="utf-8") as f:
+        for line in f:
+            m = _METHOD_RE.match(line)
+            if m:
+                method = m.group(1)
+                order.append(method)
+                refs.setdefault(method, [])
+                calls.setdefault(method, [])
+                continue
+            if method is None:
+                continue
+            refs[method].extend(_ASSET_REF_RE.findall(line))
+            calls[method].extend(_CALL_RE.findall(line.split("=>")[0]))
+
+    # 每个方法归属到最先能到达它的启动方法
+    owner = {}
+    for boot in BOOT_METHODS:
+        stack = [boot]
+        while stack:
+            name = stack.pop()
+            if name in owner or name not in calls:
+                continue
+            owner[name] = boot
+            stack.extend(calls[name])
+
+    # 先记启动阶段的引用，其余方法按出现顺序
+    uses = {}
+    for name in sorted(order, key=lambda name: name not in owner):
+        for ref in refs[name]:
+            uses.setdefault(ref, owner.get(name, name))
+    return uses
+
+
+def js_asset_paths(js_path):
+    """JS 中硬编码的 assets/ 资源路径集合"""
+    with open(js_path, encoding="utf-8") as f:
+        return set(_ASSET_PATH_RE.findall(f.read()))
+
+
+def missing_references(js_paths, root):
+    """返回 JS 中硬编码但实际不存在的资源路径 [(js 文件, 路径), ...]"""
+    missing = []
+    for js_path in js_paths:
+        for ref in sorted(js_asset_paths(js_path)):
+            if not (Path(root) / ref).is_file():
+                missing.append((str(js_path), ref))
+    return missing
+
+
+def _manifest_entries(assets, root, hashed, out_dir, written, uses, scene_js, defer_min_bytes):
+    """校验清单源文件中的每条资源，返回 manifest 条目列表（见 build_manifest）"""
+
+    def rel(path):
+        return Path(path).resolve().relative_to(root.resolve()).as_posix()
+
+    entries = []
+    seen_ids = set()
+    for asset in assets:
+        asset_id = asset["id"]
+        if asset_id in seen_ids:
+            raise ToolError(f"资源 id 重复: {asset_id}")
+        seen_ids.add(asset_id)
+
+        kind = asset["type"]
+        entry = {"id": asset_id, "type": kind}
+
+        if kind in ("image", "sprite"):
+            path = root / asset["path"]
+            width, height = image_info(path)
+            if kind == "sprite":
+                fw, fh = asset.get("frameWidth"), asset.get("frameHeight")
+                if not fw or not fh:
+                    raise ToolError(f"雪碧图 {asset_id} 缺少 frameWidth/frameHeight")
+                if width % fw or height % fh:
+                    raise ToolError(f"雪碧图 {asset_id} 的帧尺寸 {fw}x{fh} 不能整除图片尺寸 {width}x{height}"
+                                    f"（{asset['path']} 可能已用其它参数重新生成）")
+                entry.update(frameWidth=fw, frameHeight=fh, frames=(width // fw) * (height // fh))
+            digest = file_hash(path)
+            entry["path"] = rel(_copy_hashed(path, out_dir, written)) if hashed else asset["path"]
+            entry.update(width=width, height=height, bytes=path.stat().st_size, hash=digest)
+            files = [path]
+
+        elif kind in ("atlas", "multiatlas"):
+            json_path = root / asset["atlasPath"]
+            atlas, pages = _atlas_pages(json_path)
+            if kind == "atlas" and len(pages) != 1:
+                raise ToolError(f"{asset_id} 是多页图集，type 应为 multiatlas")
+            if kind == "atlas" and (root / asset["path"]).resolve() != pages[0]["path"].resolve():
+                raise ToolError(f"{asset_id} 的 path {asset['path']} 与图集记录的图片 {pages[0]['image']} 不一致")
+
+            if hashed:
+                # 页面先复制为带哈希的名字，再改写 JSON 里的图片名，JSON 本身按改写后的内容命名
+                names = [_copy_hashed(page["path"], out_dir, written).name for page in pages]
+                if "textures" in atlas:
+                    for texture, name in zip(atlas["textures"], names):
+                        texture["image"] = name
+                else:
+                    atlas["meta"]["image"] = names[0]
+                new_json = _write_hashed_json(atlas, json_path.name, out_dir, written)
+                entry["atlasPath"] = rel(new_json)
+                entry["path"] = rel(out_dir / names[0]) if kind == "atlas" else rel(out_dir) + "/"
+            else:
+                entry["atlasPath"] = asset["atlasPath"]
+                entry["path"] = asset["path"]
+
+            files = [json_path] + [page["path"] for page in pages]
+            entry["frames"] = sum(page["frames"] for page in pages)
+            entry["pages"] = [{"image": page["image"], "width": page["size"][0], "height": page["size"][1],
+                               "bytes": page["path"].stat().st_size} for page in pages]
+            entry["bytes"] = sum(p.stat().st_size for p in files)
+            entry["hash"] = file_hash(json_path)
+        else:
+            raise ToolError(f"不支持的资源类型: {kind}（{asset_id}）")
+
+        # 加载分组：显式指定 > 首次使用位置 + 大小
+        used_in = uses.get(asset_id)
+        if "group" in asset:
+            group = asset["group"]
+        elif scene_js and used_in not in BOOT_METHODS and entry["bytes"] > defer_min_bytes:
+            group = "deferred"
+        else:
+            group = "boot"
+        if group not in ("boot", "deferred"):
+            raise ToolError(f"{asset_id} 的 group 只能是 boot 或 deferred")
+        entry["group"] = group
+        if scene_js:
+            entry["firstUse"] = used_in
+        entries.append(entry)
+    return entries
+
+
+def tier_manifest_path(output_path, tier):
+    """manifest_man_down_100.json -> manifest_man_down_100@2x.json"""
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}@{tier}x{output_path.suffix}")
+
+
+def _write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def build_manifest(source_path, output_path, scene_js=None, hashed=False, out_dir=None,
+                   defer_min_bytes=DEFER_MIN_BYTES, tiers=None, base_scale=DEFAULT_BASE_SCALE):
+    """
+    根据资源清单源文件生成游戏加载用的 manifest
+
+    参数:
+        source_path: 清单源文件（与 manifest 相同的 {"assets": [...]} 格式，手工维护 id/type/路径，
+                     可选 "group": "boot" | "deferred" 强制指定分组）
+        output_path: 输出 manifest 路径；资源路径都相对于它所在目录（项目根目录）
+        scene_js: 场景代码路径，用于按首次使用位置划分加载分组；None 表示除显式指定外都放进 boot
+        hashed: 是否把资源复制为带内容哈希的文件名（可配合长期 immutable 缓存），manifest 指向副本
+        out_dir: 哈希副本目录（默认 <根目录>/assets/dist），目录中本次未写出的旧副本会被删除
+        defer_min_bytes: 首次使用不在启动阶段的资源超过此大小才延后加载
+        tiers: 分辨率档位列表（如 [1, 2, 3]）；指定时为 base_scale 以外的每一档用 asset_variants
+               生成缩放变体（assets/@<n>x/）和单独的 manifest（<输出名>@<n>x.json），
+               主 manifest 的 "tiers" 记录各档 manifest 文件，游戏按设备选择其中一档
+        base_scale: 原始资源对应的分辨率倍数（js/man_down_100.js 的 RESOLUTION_SCALE）
+
+    每条资源校验文件存在、图片尺寸、雪碧图帧尺寸整除、图集页面尺寸和帧范围，并记录字节数和 sha256。
+    返回 {"output", "assets", "boot_bytes", "deferred_bytes", "tiers"}，校验失败时抛出 ToolError
+    """
+    source_path = Path(source_path)
+    output_path = Path(output_path)
+    root = output_path.parent
+
+    with open(source_path, encoding="utf-8") as f:
+        source = json.load(f)
+
+    if hashed:
+        out_dir = Path(out_dir) if out_dir else root / "assets" / "dist"
+        out_dir.mkdir(parents=True, exist_ok=True)
+    written = set()
+    uses = first_use(scene_js) if scene_js else {}
+
+    def rel(path):
+        return Path(path).resolve().relative_to(root.resolve()).as_posix()
+
+    entries = _manifest_entries(source["assets"], root, hashed, out_dir, written, uses, scene_js, defer_min_bytes)
+    manifest = {
+        "generator": "tools/build_manifest.py",
+        "source": rel(source_path),
+        "hashed": hashed,
+        "scale": base_scale,
+        "baseScale": base_scale,
+        "assets": entries,
+    }
+
+    tier_totals = {}
+    if tiers:
+        manifest["tiers"] = {}
+        for tier in sorted(set(tiers)):
+            if tier == base_scale:
+                manifest["tiers"][str(tier)] = output_path.name
+                tier_totals[tier] = sum(e["bytes"] for e in entries)
+                continue
+            variants = make_variants(source["assets"], root, tier, base_scale)
+            tier_entries = _manifest_entries(variants, root, hashed, out_dir, written, uses, scene_js,
+                                             defer_min_bytes)
+            tier_path = tier_manifest_path(output_path, tier)
+            _write_json(tier_path, dict(manifest, scale=tier, assets=tier_entries))
+            manifest["tiers"][str(tier)] = tier_path.name
+            tier_totals[tier] = sum(e["bytes"] for e in tier_entries)
+
+    _write_json(output_path, manifest)
+
+    removed = 0
+    if hashed:
+        # 删除上一次生成、这次已不再引用的哈希副本
+        for stale in out_dir.iterdir():
+            if stale.is_file() and stale.name not in written:
+                stale.unlink()
+                removed += 1
+
+    boot_bytes = sum(e["bytes"] for e in entries if e["group"] == "boot")
+    deferred_bytes = sum(e["bytes"] for e in entries if e["group"] == "deferred")
+
+    print(f"✓ manifest 已保存到: {output_path.resolve()}")
+    for e in entries:
+        size = f"{e['width']}x{e['height']}" if "width" in e else ", ".join(
+            f"{p['width']}x{p['height']}" for p in e["pages"])
+        note = ""
+        if scene_js:
+            note = f"  首次使用: {e['firstUse']}" if e["firstUse"] else "  场景中未引用"
+        print(f"  [{e['group']:8}] {e['id']:22} {e['type']:10} {size:20} {e['bytes']:>10,} bytes{note}")
+    print(f"  启动分组: {sum(e['group'] == 'boot' for e in entries)} 个, {boot_bytes:,} bytes")
+    print(f"  延后分组: {sum(e['group'] == 'deferred' for e in entries)} 个, {deferred_bytes:,} bytes")
+    for tier, total in tier_totals.items():
+        print(f"  @{tier}x: {manifest['tiers'][str(tier)]}, {total:,} bytes")
+    if hashed:
+        print(f"  哈希副本目录: {out_dir.resolve()}（删除旧副本 {removed} 个）")
+
+    return {
+        "output": str(output_path),
+        "assets": len(entries),
+        "boot_bytes": boot_bytes,
+        "deferred_bytes": deferred_bytes,
+        "tiers": tier_totals,
+    }
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(sys.argv[1:])
+
+    if len(sys.argv) < 3:
+        print("用法: python build_manifest.py <清单源文件> <输出manifest> [选项]")
+        print("\n选项:")
+        print("  --scene <js>         场景代码，按资源首次使用的方法划分 boot/deferred 加载分组")
+        print("  --hash               把资源复制为带内容哈希的文件名，manifest 指向副本（发布时使用）")
+        print("  --out-dir <目录>     哈希副本目录（默认 assets/dist）")
+        print(f"  --defer-min <字节>   小于此大小的资源不延后加载（默认 {DEFER_MIN_BYTES}）")
+        print("  --check <js>         检查 JS 中硬编码的 assets/ 路径是否存在（可多次指定）")
+        print("  --tiers <n,n,...>    生成各档分辨率变体（assets/@<n>x/）和对应的 manifest，如 1,2,3")
+        print(f"  --base-scale <n>     原始资源对应的分辨率倍数（默认 {DEFAULT_BASE_SCALE}，即 RESOLUTION_SCALE）")
+        print("\n示例:")
+        print("  python tools/build_manifest.py manifest_man_down_100.src.json manifest_man_down_100.json "
+              "--scene js/man_down_100.js --check js/bird_game.js")
+        print("  python tools/build_manifest.py manifest_man_down_100.src.json manifest_man_down_100.json "
+              "--scene js/man_down_100.js --hash")
+        print("  python tools/build_manifest.py manifest_man_down_100.src.json manifest_man_down_100.json "
+              "--scene js/man_down_100.js --tiers 1,2,3 --hash")
+        sys.exit(1)
+
+    source_path = sys.argv[1]
+    output_path = sys.argv[2]
+    scene_js = None
+    hashed = False
+    out_dir = None
+    defer_min_bytes = DEFER_MIN_BYTES
+    check_paths = []
+    tiers = None
+    base_scale = DEFAULT_BASE_SCALE
+
+    i = 3
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ["--scene", "--out-dir", "--defer-min", "--check", "--tiers", "--base-scale"]:
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            value = sys.argv[i + 1]
+            if arg == "--scene":
+                scene_js = value
+                check_paths.append(value)
+            elif arg == "--out-dir":
+                out_dir = value
+            elif arg == "--defer-min":
+                defer_min_bytes = int(value)
+            elif arg == "--tiers":
+                tiers = [int(t) for t in value.split(",")]
+            elif arg == "--base-scale":
+                base_scale = int(value)
+            else:
+                check_paths.append(value)
+            i += 2
+        elif arg == "--hash":
+            hashed = True
+            i += 1
+        else:
+            print(f"错误：未知参数 {arg}")
+            sys.exit(1)
+
+    try:
+        build_manifest(source_path, output_path, scene_js, hashed, out_dir, defer_min_bytes, tiers, base_scale)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+
+    missing = missing_references(check_paths, Path(output_path).parent)
+    for js_path, ref in missing:
+        print(f"警告：{js_path} 引用的资源不存在: {ref}")
+    if missing:
+        sys.exit(1)
@@ -0,0 +1,466 @@
+from PIL import Image
+import numpy as np
+import io
+import json
+import os
+import struct
+import sys
+from pathlib import Path
+
+from tool_errors import ToolError
+from build_cache import cache_dir, file_hash
+from profiling import parse_profile_flags, stage, track
+
+
+# 索引格式版本，改动索引内容或合成逻辑时递增，使旧索引失效
+INDEX_VERSION = 1
+# 每隔多少帧保存一张关键帧快照：跳到任意帧最多多解码 KEYFRAME_INTERVAL - 1 帧
+KEYFRAME_INTERVAL = 16
+# 没有图形控制扩展（GCE）的帧，工具统一按 100 毫秒处理
+DEFAULT_DURATION = 100
+
+# 绝对路径 -> ((修改时间 ns, 大小), 内容哈希)
+_digests = {}
+
+
+def index_dir():
+    """索引保存位置：构建缓存目录下的 gif_index/，以 GIF 内容哈希命名"""
+    return cache_dir() / "gif_index"
+
+
+def _sub_blocks_end(data, pos):
+    """跳过从 pos 开始的数据子块序列，返回结束符之后的位置"""
+    while True:
+        size = data[pos]
+        pos += 1
+        if size == 0:
+            return pos
+        pos += size
+
+
+def _is_gray_ramp(palette):
+    # Pillow 把恰好是灰度渐变的调色板当作"无调色板"（L 模式），这种文件交给 Pillow 处理
+    n = len(palette) // 3
+    return palette == bytes(v for i in range(n) for v in (i, i, i))
+
+
+def scan_gif(data):
+    """
+    只扫描 GIF 的块结构（不做 LZW 解码），返回帧表
+
+    每帧记录图像数据的字节偏移、区域、调色板位置、持续时间、透明色和处置方式，
+    处置方式、持续时间的取值规则与 Pillow 的 GifImagePlugin 一致（未指定处置方式时沿用上一帧的）。
+    返回 dict；文件不是 GIF 时返回 None，结构损坏时抛出 ToolError
+    """
+    if data[:6] not in (b"GIF87a", b"GIF89a"):
+        return None
+
+    try:
+        width, height, flags, background = struct.unpack_from("<HHBB", data, 6)
+        pos = 13
+        global_palette = None
+        if flags & 0x80:
+            size = 3 << ((flags & 7) + 1)
+            global_palette = [pos, size]
+            pos += size
+
+        frames = []
+        loop = None
+        supported = not (global_palette and _is_gray_ramp(data[pos - global_palette[1]:pos]))
+        disposal = 0
+        gce = None
+
+        while pos < len(data):
+            block = data[pos]
+            if block == 0x3B:  # 文件结束
+                break
+            if block == 0x21:  # 扩展块
+                label = data[pos + 1]
+                pos += 2
+                if label == 0xF9 and data[pos] >= 4:
+                    packed = data[pos + 1]
+                    gce = {
+                        "duration": struct.unpack_from("<H", data, pos + 2)[0] * 10,
+                        "transparency": data[pos + 4] if packed & 1 else None,
+                        "disposal": (packed >> 2) & 7,
+                    }
+                elif label == 0xFF and not frames and data[pos + 1:pos + 12] == b"NETSCAPE2.0":
+                    sub = pos + 1 + data[pos]
+                    if data[sub] >= 3 and data[sub + 1] == 1:
+                        loop = struct.unpack_from("<H", data, sub + 2)[0]
+                pos = _sub_blocks_end(data, pos)
+            elif block == 0x2C:  # 图像描述符
+                x, y, w, h, img_flags = struct.unpack_from("<HHHHB", data, pos + 1)
+                pos += 10
+                local_palette = None
+                if img_flags & 0x80:
+                    size = 3 << ((img_flags & 7) + 1)
+                    local_palette = [pos, size]
+                    if _is_gray_ramp(data[pos:pos + size]):
+                        supported = False
+                    pos += size
+                if (local_palette or global_palette) is None:
+                    # 没有调色板的帧按灰度（L 模式）解码，交给 Pillow 处理
+                    supported = False
+                if x + w > width or y + h > height:
+                    # 帧超出逻辑屏幕时 Pillow 会扩大画布，这种少见情况交给 Pillow 处理
+                    supported = False
+
+                if gce and gce["disposal"]:
+                    disposal = gce["disposal"]
+                if not frames:
+                    disposal = gce["disposal"] if gce else 0
+
+                data_start = pos
+                pos = _sub_blocks_end(data, pos + 1)
+                frames.append({
+                    "rect": [x, y, w, h],
+                    "interlace": bool(img_flags & 0x40),
+                    "palette": local_palette or global_palette,
+                    "data": [data_start, pos],
+                    "duration": gce["duration"] if gce else None,
+                    "transparency": gce["transparency"] if gce else None,
+                    "disposal": disposal,
+                })
+                gce = None
+            else:
+                raise ToolError(f"GIF 结构损坏：偏移 {pos} 处遇到未知块 0x{block:02x}")
+    except (IndexError, struct.error) as e:
+        raise ToolError("GIF 文件不完整") from e
+
+    if not frames:
+        raise ToolError("GIF 中没有图像帧")
+
+    return {
+        "version": INDEX_VERSION,
+        "width": width,
+        "height": height,
+        "background": background if global_palette else 0,
+        "loop": loop,
+        "frames": frames,
+        "supported": supported,
+        "keyframe_interval": KEYFRAME_INTERVAL,
+        "snapshots": None,
+    }
+
+
+def _paths(digest):
+    base = index_dir() / digest
+    return base.with_suffix(".json"), base.with_suffix(".npz")
+
+
+def _save_json(path, index):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+
+
+def _file_digest(path):
+    """文件内容哈希；修改时间和大小都没变时用上次的结果（gif_info、iter_frames 各读一次索引，不必重复哈希）"""
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    cached = _digests.get(key)
+    if cached is not None and cached[0] == (st.st_mtime_ns, st.st_size):
+        return cached[1]
+    digest = file_hash(path)
+    _digests[key] = ((st.st_mtime_ns, st.st_size), digest)
+    return digest
+
+
+def read_index(path):
+    """
+    读取 GIF 的帧索引（不存在或内容已变化时重新扫描并保存）
+
+    索引以文件内容哈希命名，文件被修改后自动失效。只扫描块结构，不解码任何帧。
+    返回索引 dict（含 "hash"）；不是 GIF 时返回 None
+    """
+    try:
+        digest = _file_digest(path)
+    except OSError as e:
+        raise ToolError(f"无法打开文件: {e}") from e
+
+    json_path, _ = _paths(digest)
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION:
+            return index
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    index = scan_gif(Path(path).read_bytes())
+    if index is None:
+        return None
+    index["hash"] = digest
+    try:
+        _save_json(json_path, index)
+    except OSError:
+        pass  # 索引只是加速手段，写不进去也不影响结果
+    return index
+
+
+def frame_durations(index):
+    """每帧持续时间（毫秒），无 GCE 的帧按 DEFAULT_DURATION"""
+    return [DEFAULT_DURATION if f["duration"] is None else f["duration"] for f in index["frames"]]
+
+
+def gif_info(path):
+    """
+    不解码帧，返回 {"size", "n_frames", "durations", "loop"}
+
+    非 GIF 文件（静态 PNG 等）交给 Pillow 读取
+    """
+    index = read_index(path)
+    if index is not None:
+        return {
+            "size": (index["width"], index["height"]),
+            "n_frames": len(index["frames"]),
+            "durations": frame_durations(index),
+            "loop": index["loop"],
+        }
+
+    try:
+        img = Image.open(path)
+    except Exception as e:
+        raise ToolError(f"无法打开文件: {e}") from e
+    n_frames = getattr(img, 'n_frames', 1)
+    durations = []
+    for i in range(n_frames):
+        img.seek(i)
+        durations.append(img.info.get('duration', DEFAULT_DURATION))
+    return {"size": img.size, "n_frames": n_frames, "durations": durations, "loop": img.info.get('loop')}
+
+
+# ---- 逐帧合成（与 Pillow 的 GIF 合成结果逐像素一致，建索引时会逐帧校验） ----
+
+def _palette(data, frame):
+    """帧调色板的原始字节（local 或 global）"""
+    start, size = frame["palette"]
+    return data[start:start + size]
+
+
+def _decode_frame(data, frame, canvas_size=None):
+    """
+    单独解码一帧：把这一帧的调色板、透明色和图像数据包装成单帧 GIF 交给 Pillow，返回 RGBA 图像
+
+    canvas_size 为 None 时只解码帧区域；否则按整张画布解码（用于第一帧，区域外填透明色）
+    """
+    x, y, w, h = frame["rect"]
+    start, end = frame["data"]
+    palette = _palette(data, frame)
+    t = frame["transparency"]
+    palette_len = len(palette) // 3
+    table_bits = palette_len.bit_length() - 2
+
+    screen_w, screen_h = canvas_size or (w, h)
+    pos = (x, y) if canvas_size else (0, 0)
+    gce = b"!\xf9\x04" + struct.pack("<BHBB", 1 if t is not None else 0, 0, t or 0, 0)
+    flags = 0x80 | table_bits | (0x40 if frame["interlace"] else 0)
+    mini = (b"GIF89a" + struct.pack("<HHBBB", screen_w, screen_h, 0, 0, 0) + gce
+            + b"," + struct.pack("<HHHHB", pos[0], pos[1], w, h, flags) + palette
+            + data[start:end] + b";")
+    with Image.open(io.BytesIO(mini)) as img:
+        return img.convert("RGBA")
+
+
+class _Compositor:
+    """按 Pillow 的规则逐帧合成画布，可从关键帧快照（某帧绘制前的画布）开始"""
+
+    def __init__(self, data, index):
+        self.data = data
+        self.index = index
+        self.frames = index["frames"]
+        # 第一帧没有透明色时 Pillow 的画布是 RGB 模式，之后所有帧都不透明
+        self.opaque = self.frames[0]["transparency"] is None
+        self.canvas = None
+
+    def start(self, frame_number, snapshot=None):
+        self.next = frame_number
+        self.canvas = None if snapshot is None else Image.fromarray(snapshot, "RGBA")
+
+    def step(self):
+        """绘制下一帧，返回绘制后的画布（之后会被原地修改，需要保留时自行复制）"""
+        n = self.next
+        frame = self.frames[n]
+        x, y, w, h = frame["rect"]
+        t = frame["transparency"]
+
+        base = None
+        if n == 0:
+            # 第一帧：画布先填透明色（没有透明色时填 0 号色），再写入帧区域
+            self.canvas = _decode_frame(self.data, frame, (self.index["width"], self.index["height"]))
+        else:
+            if frame["disposal"] == 3:
+                base = self.canvas.crop((x, y, x + w, y + h))
+            rgba = _decode_frame(self.data, frame)
+            self.canvas.paste(rgba, (x, y), rgba if t is not None else None)
+
+        self._pending = (n, base)
+        self.next = n + 1
+        return self.canvas
+
+    def dispose(self):
+        """对刚绘制的帧执行处置，得到下一帧绘制前的画布"""
+        n, base = self._pending
+        frame = self.frames[n]
+        x, y, w, h = frame["rect"]
+        box = (x, y, x + w, y + h)
+        t = frame["transparency"]
+        palette = _palette(self.data, frame)
+
+        if frame["disposal"] == 2:
+            color = t if t is not None else self.index["background"]
+            if n > 0 and color * 3 + 3 > len(palette):
+                color = 0
+            rgb = tuple(palette[color * 3:color * 3 + 3]) or (0, 0, 0)
+            alpha = 0 if t is not None and not self.opaque else 255
+            self.canvas.paste(rgb + (alpha,), box)
+        elif frame["disposal"] == 3:
+            if base is not None:
+                self.canvas.paste(base, box)
+            elif t is not None:
+                self.canvas.paste(tuple(palette[t * 3:t * 3 + 3]) + (0,), box)
+
+
+def _pillow_frames(path, start, count):
+    """按 Pillow 顺序 seek 逐帧解码（从头解到 start）"""
+    try:
+        img = Image.open(path)
+    except Exception as e:
+        raise ToolError(f"无法打开文件: {e}") from e
+    pixels = img.width * img.height
+    for i in range(start, start + count):
+        with stage("decode", pixels=pixels):
+            img.seek(i)
+            img.load()
+        with stage("convert", pixels=pixels):
+            frame = img.convert("RGBA")
+        yield frame, img.info.get('duration', DEFAULT_DURATION)
+
+
+def build_snapshots(path, index=None):
+    """
+    完整合成一遍 GIF，每 KEYFRAME_INTERVAL 帧保存一张"该帧绘制前的画布"快照，
+    并逐帧与 Pillow 的解码结果比对。比对不一致时索引标记为不可用，工具退回 Pillow 顺序解码。
+    返回更新后的索引
+    """
+    index = index or read_index(path)
+    data = Path(path).read_bytes()
+    json_path, npz_path = _paths(index["hash"])
+
+    ok = index["supported"]
+    snapshots = {}
+    if ok:
+        compositor = _Compositor(data, index)
+        compositor.start(0)
+        reference = _pillow_frames(path, 0, len(index["frames"]))
+        for n in range(len(index["frames"])):
+            if n % KEYFRAME_INTERVAL == 0 and n > 0:
+                snapshots[f"f{n}"] = np.asarray(compositor.canvas)
+            canvas = compositor.step()
+            expected, _ = next(reference)
+            if not np.array_equal(np.asarray(canvas), np.asarray(expected)):
+                ok = False
+                break
+            compositor.dispose()
+
+    index["snapshots"] = "ok" if ok else "unsupported"
+    try:
+        if ok:
+            npz_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = npz_path.with_suffix(f".{os.getpid()}.tmp.npz")
+            np.savez_compressed(tmp, **snapshots)
+            os.replace(tmp, npz_path)
+        _save_json(json_path, index)
+    except OSError:
+        pass
+    return index
+
+
+def _load_snapshot(index, keyframe):
+    """读取第 keyframe 帧绘制前的画布快照，读不到时返回 None"""
+    _, npz_path = _paths(index["hash"])
+    try:
+        with np.load(npz_path) as snapshots:
+            return snapshots[f"f{keyframe}"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def iter_frames(path, start=0, count=None):
+    """
+    逐帧产出 (RGBA 帧, 持续时间毫秒)，从第 start 帧开始共 count 帧（None 表示到最后）
+
+    起始帧较靠后时借助索引的关键帧快照直接跳到所在段落，只解码 O(段落长度) 帧；
+    从头开始、非 GIF 文件或索引不可用时按 Pillow 顺序解码
+    """
+    index = read_index(path)
+    total = len(index["frames"]) if index else gif_info(path)["n_frames"]
+    if count is None:
+        count = total - start
+    count = min(count, total - start)
+
+    if index is None or start < KEYFRAME_INTERVAL or not index["supported"]:
+        yield from _pillow_frames(path, start, count)
+        return
+
+    if index["snapshots"] is None:
+        index = build_snapshots(path, index)
+    if index["snapshots"] != "ok":
+        yield from _pillow_frames(path, start, count)
+        return
+
+    keyframe = start // KEYFRAME_INTERVAL * KEYFRAME_INTERVAL
+    snapshot = _load_snapshot(index, keyframe)
+    if snapshot is None:
+        # 快照文件损坏或缺失：重建一次；仍然读不到（如缓存目录不可写）时退回顺序解码
+        index = build_snapshots(path, index)
+        if index["snapshots"] == "ok":
+            snapshot = _load_snapshot(index, keyframe)
+    if snapshot is None:
+        yield from _pillow_frames(path, start, count)
+        return
+
+    data = Path(path).read_bytes()
+    durations = frame_durations(index)
+    compositor = _Compositor(data, index)
+    compositor.start(keyframe, snapshot)
+    pixels = index["width"] * index["height"]
+    for n in range(keyframe, start + count):
+        with stage("decode", pixels=pixels):
+            canvas = compositor.step()
+            frame = canvas.copy() if n >= start else None
+        if frame is not None:
+            yield frame, durations[n]
+        compositor.dispose()
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(sys.argv[1:])
+
+    if len(sys.argv) < 2:
+        print("用法: python gif_index.py <GIF文件> [...]")
+        print("\n为 GIF 建立帧索引（帧偏移、处置方式、关键帧快照），并打印帧数和时长")
+        print(f"索引保存在 {index_dir()}（以内容哈希命名，文件变化后自动重建）")
+        sys.exit(1)
+
+    for gif_path in sys.argv[1:]:
+        try:
+            with track(gif_path):
+                with stage("index"):
+                    index = read_index(gif_path)
+                if index is None:
+                    print(f"{gif_path}: 不是 GIF 文件")
+                    continue
+                if index["snapshots"] is None:
+                    with stage("snapshots"):
+                        index = build_snapshots(gif_path, index)
+        except ToolError as e:
+            print(f"{gif_path}: 错误：{e}")
+            continue
+        durations = frame_durations(index)
+        status = "可随机访问" if index["snapshots"] == "ok" else "不支持，退回顺序解码"
+        print(f"{gif_path}: {index['width']}x{index['height']}, {len(durations)} 帧, "
+              f"总时长 {sum(durations) / 1000:.2f}s, 索引{status}")
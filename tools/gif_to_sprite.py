@@ -1,9 +1,410 @@
 from PIL import Image
+import numpy as np
+import hashlib
+import json
 import sys
 from pathlib import Path
 import math
 
-def gif_to_sprite(gif_path, output_path, max_frames=40, frames_per_row=None, start_frame=0):
+from tool_errors import ToolError
+from build_cache import cached_tool, parse_cache_flags
+from png_stream import PngStreamWriter
+from profiling import parse_profile_flags, peak_rss_bytes, stage
+import gif_index
+from hitboxes import hitbox_paths, sheet_frames, write_hitboxes, print_hitbox_summary
+
+
+# 流式模式下，解码后的整张雪碧图超过该字节数时改为按行带写出 PNG，不再分配整张图
+STRIP_THRESHOLD_BYTES = 256 * 1024 * 1024
+
+
+def compute_layout(frame_count, frames_per_row=None):
+    """
+    计算雪碧图布局，返回 (每行帧数, 行数)
+
+    未指定每行帧数时自动计算，尽量接近正方形
+    """
+    if frames_per_row is None:
+        frames_per_row = int(math.ceil(math.sqrt(frame_count)))
+    rows = math.ceil(frame_count / frames_per_row)
+    return frames_per_row, rows
+
+
+def build_sheet(frames, frames_per_row=None):
+    """
+    把 RGBA 帧按网格拼接成雪碧图，返回 (雪碧图, 每行帧数, 行数)
+
+    以第一帧尺寸为单帧尺寸，尺寸不一致的帧会被缩放到第一帧的尺寸。
+    帧为共用调色板的 P 模式图像（见 indexed_image）时，拼接结果也是 P 模式
+    """
+    base_w, base_h = frames[0].size
+
+    # 如果所有帧尺寸不一致，统一缩放到第一帧的尺寸
+    resized_frames = []
+    for i, frame in enumerate(frames):
+        if frame.size != (base_w, base_h):
+            print(f"警告：第 {i+1} 帧尺寸为 {frame.size}，将缩放至 {base_w}x{base_h}")
+            with stage("resize", pixels=base_w * base_h):
+                frame = frame.resize((base_w, base_h), Image.LANCZOS)
+        resized_frames.append(frame)
+
+    frames_per_row, rows = compute_layout(len(resized_frames), frames_per_row)
+
+    # 创建雪碧图
+    sheet_w = base_w * frames_per_row
+    sheet_h = base_h * rows
+    indexed = resized_frames[0].mode == "P"
+    if indexed:
+        sheet = Image.new("P", (sheet_w, sheet_h), 0)
+        sheet.putpalette(resized_frames[0].getpalette())
+        sheet.info["transparency"] = 0
+    else:
+        sheet = Image.new("RGBA", (sheet_w, sheet_h), (0, 0, 0, 0))
+
+    # 依次粘贴每一帧
+    with stage("paste", pixels=len(resized_frames) * base_w * base_h):
+        for i, frame in enumerate(resized_frames):
+            row = i // frames_per_row
+            col = i % frames_per_row
+            x = col * base_w
+            y = row * base_h
+            if indexed:
+                sheet.paste(frame, (x, y))  # 索引直接复制，0 号即透明
+            else:
+                sheet.paste(frame, (x, y), frame)  # 使用 frame 作为 mask 以支持透明
+
+    return sheet, frames_per_row, rows
+
+
+# 近似去重时，像素任一通道差值超过该值才算"不同"（吸收 GIF 调色板/抖动带来的噪声）
+DIFF_NOISE_LEVEL = 16
+
+
+def _changed_pixels(a, b):
+    """两帧 RGBA（或共用调色板的 P 模式）之间"不同"的像素个数"""
+    if a.mode != "RGBA":
+        a, b = a.convert("RGBA"), b.convert("RGBA")
+    diff = np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).max(axis=2)
+    return int(np.count_nonzero(diff > DIFF_NOISE_LEVEL))
+
+
+def dedupe_frames(frames, durations, tolerance=0):
+    """
+    去除重复帧，每个不同的帧只保留一次
+
+    - 完全相同的帧（按像素内容哈希）无论是否相邻都合并为同一帧
+    - tolerance > 0 时，与当前显示的保留帧相比不同的像素不超过 tolerance 个的帧也视为重复
+      （任一通道差值超过 DIFF_NOISE_LEVEL 的像素才算不同）
+
+    返回 (保留的帧列表, 原始帧 -> 保留帧索引的映射, 合并后的播放序列)，
+    播放序列为 [{"frame": 保留帧索引, "duration": 毫秒}, ...]，相邻的相同帧合并为一项、时长相加
+    """
+    unique = []
+    seen = {}
+    remap = []
+
+    for frame in frames:
+        digest = hashlib.sha1(frame.tobytes()).hexdigest()
+        if digest in seen:
+            index = seen[digest]
+        elif tolerance > 0 and remap and _changed_pixels(frame, unique[remap[-1]]) <= tolerance:
+            # 与当前显示的保留帧几乎一样，沿用它（与保留帧比较，误差不会逐帧累积）
+            index = remap[-1]
+            seen[digest] = index
+        else:
+            index = len(unique)
+            unique.append(frame)
+            seen[digest] = index
+        remap.append(index)
+
+    sequence = []
+    for index, duration in zip(remap, durations):
+        if sequence and sequence[-1]["frame"] == index:
+            sequence[-1]["duration"] += duration
+        else:
+            sequence.append({"frame": index, "duration": duration})
+
+    return unique, remap, sequence
+
+
+# 计算帧间运动量时，帧先缩小到这个宽度（预乘 alpha 后比较）
+MOTION_THUMB_WIDTH = 64
+# 每帧除运动量外再计入平均运动量的这一比例，静止段落也会按时间分到少量关键帧
+MOTION_TIME_WEIGHT = 0.1
+
+
+def motion_thumb(frame):
+    """运动量比较用的缩略图：预乘 alpha（透明像素的 RGB 不影响结果）后缩小，返回 float32 数组"""
+    w, h = frame.size
+    if w > MOTION_THUMB_WIDTH:
+        frame = frame.convert("RGBa").resize((MOTION_THUMB_WIDTH, max(1, round(h * MOTION_THUMB_WIDTH / w))),
+                                             Image.BILINEAR)
+    else:
+        frame = frame.convert("RGBa")
+    return np.asarray(frame, dtype=np.float32)
+
+
+def frame_motion(thumbs, loop=True):
+    """
+    相邻帧之间的运动量（缩略图逐像素平均差，0-255）
+
+    返回长度为 n-1 的数组；loop 为 True 时再加上末帧回到首帧的运动量，长度为 n
+    """
+    pairs = list(zip(thumbs[:-1], thumbs[1:]))
+    if loop:
+        pairs.append((thumbs[-1], thumbs[0]))
+    return np.array([np.abs(a - b).mean() for a, b in pairs], dtype=np.float64)
+
+
+def select_keyframes(motion, count, loop=True):
+    """
+    按运动量选取 count 个关键帧，返回递增的帧序号列表（总是包含第 0 帧）
+
+    把每段帧间运动量（加上 MOTION_TIME_WEIGHT 比例的平均运动量）累加成"运动弧长"，
+    在弧长上等间隔取点：动作快的段落取得密，几乎静止的段落取得疏。
+    loop 为 True 时弧长包含末帧回到首帧的一段，末个关键帧到首帧的跨度与其他间隔相当，循环播放不会在接缝处跳变；
+    否则首尾两帧都保留
+    """
+    n = len(motion) + (0 if loop else 1)
+    if count >= n:
+        return list(range(n))
+    if count <= 1:
+        return [0]
+    step = motion + MOTION_TIME_WEIGHT * (motion.mean() or 1.0)
+    arc = np.concatenate([[0.0], np.cumsum(step)])
+    total = arc[n] if loop else arc[n - 1]
+    targets = total * np.arange(count) / (count if loop else count - 1)
+
+    picks = []
+    for k, target in enumerate(targets):
+        i = int(np.abs(arc[:n] - target).argmin())
+        # 保持严格递增，并给后面的关键帧留出位置
+        i = min(max(i, picks[-1] + 1 if picks else 0), n - (count - k))
+        picks.append(i)
+    return picks
+
+
+def keyframe_durations(durations, keyframes):
+    """
+    只保留关键帧时，每个关键帧的时长为它到下一个关键帧之间所有源帧的时长之和（总时长不变）
+
+    返回 (关键帧时长列表, 每个源帧对应的关键帧序号)
+    """
+    bounds = list(keyframes) + [len(durations)]
+    merged = [sum(durations[bounds[k]:bounds[k + 1]]) for k in range(len(keyframes))]
+    remap = []
+    for k in range(len(keyframes)):
+        remap.extend([k] * (bounds[k + 1] - bounds[k]))
+    return merged, remap
+
+
+# 索引色雪碧图：0 号为透明色，其余最多 255 种不透明色
+INDEXED_COLORS = 255
+# 超出 255 色时，中位切分得到初始调色板后再做几轮加权 k-means 细化
+PALETTE_REFINE_ITERATIONS = 6
+
+
+def _frame_codes(frame):
+    """RGBA 帧 -> (高, 宽) int32 颜色码，不透明像素为 0xRRGGBB，透明像素（alpha < 128）为 -1"""
+    pixels = np.asarray(frame)
+    codes = (pixels[..., 0].astype(np.int32) << 16) | (pixels[..., 1].astype(np.int32) << 8) | pixels[..., 2]
+    codes[pixels[..., 3] < 128] = -1
+    return codes
+
+
+def _nearest(rgb, palette, chunk=4096):
+    """每个颜色在调色板中最近（RGB 欧氏距离）的索引和距离"""
+    index = np.empty(len(rgb), dtype=np.int64)
+    dist = np.empty(len(rgb), dtype=np.float32)
+    for start in range(0, len(rgb), chunk):
+        d = ((rgb[start:start + chunk, None, :] - palette[None, :, :]) ** 2).sum(axis=2)
+        index[start:start + chunk] = d.argmin(axis=1)
+        dist[start:start + chunk] = np.sqrt(d.min(axis=1))
+    return index, dist
+
+
+def build_shared_palette(frames, max_colors=INDEXED_COLORS):
+    """
+    统计所有帧用到的不透明颜色，生成整张雪碧图共用的调色板
+
+    不超过 max_colors 种颜色时原样使用（无损）；否则按像素数加权，用中位切分得到初始调色板，
+    再做 PALETTE_REFINE_ITERATIONS 轮加权 k-means 细化。只在颜色表上计算，不需要保存帧。
+    返回 {"colors": 排序的源颜色码, "lut": 源颜色 -> 雪碧图索引 (1..255),
+          "palette": PLTE 字节（含 0 号透明色）, "source_colors", "exact", "mean_error"}
+    """
+    codes, counts = [], []
+    for frame in frames:
+        with stage("palette", pixels=frame.width * frame.height):
+            frame_codes = _frame_codes(frame)
+            unique, n = np.unique(frame_codes[frame_codes >= 0], return_counts=True)
+        codes.append(unique)
+        counts.append(n)
+    with stage("palette"):
+        return _fit_palette(codes, counts, max_colors)
+
+
+def _fit_palette(codes, counts, max_colors):
+    """按各帧的颜色表和像素数生成共享调色板（见 build_shared_palette）"""
+    colors, inverse = np.unique(np.concatenate(codes), return_inverse=True)
+    weights = np.bincount(inverse, np.concatenate(counts)) if len(colors) else np.zeros(0)
+
+    rgb = np.stack([colors >> 16, (colors >> 8) & 0xFF, colors & 0xFF], axis=1).astype(np.float32)
+    if len(colors) <= max_colors:
+        palette = rgb
+        index = np.arange(len(colors))
+        mean_error = 0.0
+    else:
+        # 按像素数重复每种颜色（总数约 100 万像素），交给 Pillow 做中位切分
+        reps = np.maximum(1, (weights * (1 << 20) // weights.sum()).astype(np.int64))
+        sample = Image.fromarray(np.repeat(rgb.astype(np.uint8), reps, axis=0)[None, :, :], "RGB")
+        palette = np.array(sample.quantize(max_colors, method=Image.Quantize.MEDIANCUT).getpalette()[:max_colors * 3],
+                           dtype=np.float32).reshape(-1, 3)
+        index, dist = _nearest(rgb, palette)
+        for _ in range(PALETTE_REFINE_ITERATIONS):
+            total = np.bincount(index, weights, minlength=len(palette))
+            used = total > 0
+            for channel in range(3):
+                palette[used, channel] = np.bincount(index, weights * rgb[:, channel],
+                                                     minlength=len(palette))[used] / total[used]
+            index, dist = _nearest(rgb, palette)
+        mean_error = float((dist * weights).sum() / weights.sum())
+
+    plte = np.zeros((len(palette) + 1, 3), dtype=np.uint8)
+    plte[1:] = np.clip(np.rint(palette), 0, 255)
+    return {
+        "colors": colors,
+        "lut": (index + 1).astype(np.uint8),
+        "palette": plte.tobytes(),
+        "source_colors": len(colors),
+        "exact": len(colors) <= max_colors,
+        "mean_error": mean_error,
+    }
+
+
+def index_frame(frame, shared):
+    """用 build_shared_palette 的结果把 RGBA 帧映射为 (高, 宽) uint8 索引，透明像素为 0"""
+    with stage("index", pixels=frame.width * frame.height):
+        codes = _frame_codes(frame)
+        out = np.zeros(codes.shape, dtype=np.uint8)
+        opaque = codes >= 0
+        out[opaque] = shared["lut"][np.searchsorted(shared["colors"], codes[opaque])]
+    return out
+
+
+def indexed_image(indices, shared):
+    """索引数组 + 共享调色板 -> P 模式图像（0 号为透明色，保存 PNG 时写出 tRNS）"""
+    img = Image.fromarray(indices, "P")
+    img.putpalette(shared["palette"])
+    img.info["transparency"] = 0
+    return img
+
+
+def iter_frames(gif_path, start_frame, count, size=None):
+    """
+    依次解码从 start_frame 开始的 count 帧，逐帧产出 (RGBA 帧, 持续时间毫秒)
+
+    通过 gif_index 的帧索引跳到起始帧，不必从第 0 帧解码起。
+    size 不为 None 时，尺寸不一致的帧会被缩放到该尺寸
+    """
+    for n, (frame, duration) in enumerate(gif_index.iter_frames(gif_path, start_frame, count)):
+        if size is not None and frame.size != size:
+            print(f"警告：第 {n+1} 帧尺寸为 {frame.size}，将缩放至 {size[0]}x{size[1]}")
+            with stage("resize", pixels=size[0] * size[1]):
+                frame = frame.resize(size, Image.LANCZOS)
+        yield frame, duration
+
+
+def stream_sheet(gif_path, start_frame, count, size, out_path, frames_per_row=None, strips=None, shared=None):
+    """
+    流式拼接雪碧图：先算好布局，每解码一帧就直接贴到预先分配的雪碧图上
+
+    strips 为 True 时不分配整张雪碧图，而是逐行带（一行帧的高度）拼接并流式写出 PNG，
+    内存中同时只有一个行带和一帧；为 None 时按 STRIP_THRESHOLD_BYTES 自动选择。
+    shared 为 build_shared_palette 的结果时，每帧解码后立即映射为索引，雪碧图/行带每像素只占 1 字节，
+    输出 8 位索引色 PNG。像素结果与 build_sheet 相同。返回 (每帧持续时间列表, 每行帧数, 行数, 是否按行带写出)
+    """
+    base_w, base_h = size
+    frames_per_row, rows = compute_layout(count, frames_per_row)
+    sheet_w = base_w * frames_per_row
+    sheet_h = base_h * rows
+    bytes_per_pixel = 1 if shared is not None else 4
+    if strips is None:
+        strips = sheet_w * sheet_h * bytes_per_pixel > STRIP_THRESHOLD_BYTES
+
+    durations = []
+    frames = iter_frames(gif_path, start_frame, count, size)
+    if shared is not None:
+        if not strips:
+            sheet = np.zeros((sheet_h, sheet_w), dtype=np.uint8)
+            for i, (frame, duration) in enumerate(frames):
+                x = (i % frames_per_row) * base_w
+                y = (i // frames_per_row) * base_h
+                sheet[y:y + base_h, x:x + base_w] = index_frame(frame, shared)
+                durations.append(duration)
+            save_png(indexed_image(sheet, shared), out_path)
+            return durations, frames_per_row, rows, False
+
+        with PngStreamWriter(out_path, sheet_w, sheet_h, mode="P",
+                             palette=shared["palette"], transparency=b"\x00") as writer:
+            band = None
+            for i, (frame, duration) in enumerate(frames):
+                col = i % frames_per_row
+                if col == 0:
+                    band = np.zeros((base_h, sheet_w), dtype=np.uint8)
+                indices = index_frame(frame, shared)
+                with stage("paste", pixels=base_w * base_h):
+                    band[:, col * base_w:(col + 1) * base_w] = indices
+                durations.append(duration)
+                if col == frames_per_row - 1 or i == count - 1:
+                    writer.write_rows(band)
+        return durations, frames_per_row, rows, True
+
+    if not strips:
+        sheet = Image.new("RGBA", (sheet_w, sheet_h), (0, 0, 0, 0))
+        for i, (frame, duration) in enumerate(frames):
+            x = (i % frames_per_row) * base_w
+            y = (i // frames_per_row) * base_h
+            with stage("paste", pixels=base_w * base_h):
+                sheet.paste(frame, (x, y), frame)
+            durations.append(duration)
+        save_png(sheet, out_path)
+        return durations, frames_per_row, rows, False
+
+    with PngStreamWriter(out_path, sheet_w, sheet_h) as writer:
+        band = None
+        for i, (frame, duration) in enumerate(frames):
+            col = i % frames_per_row
+            if col == 0:
+                band = Image.new("RGBA", (sheet_w, base_h), (0, 0, 0, 0))
+            with stage("paste", pixels=base_w * base_h):
+                band.paste(frame, (col * base_w, 0), frame)
+            durations.append(duration)
+            if col == frames_per_row - 1 or i == count - 1:
+                writer.write_rows(np.asarray(band))
+    return durations, frames_per_row, rows, True
+
+
+def save_png(image, out_path):
+    """保存 PNG（计入 --profile 的 encode 阶段）"""
+    with stage("encode", pixels=image.width * image.height) as s:
+        image.save(out_path, format="PNG")
+        s.add(nbytes=Path(out_path).stat().st_size)
+
+
+def anim_json_path(output_path):
+    """雪碧图对应的动画描述文件路径：xxx.png -> xxx.anim.json"""
+    out_path = Path(output_path)
+    return out_path.with_name(out_path.stem + ".anim.json")
+
+
+@cached_tool("gif_to_sprite", version=1, inputs=("gif_path",),
+             outputs=("output_path",
+                      lambda a: anim_json_path(a["output_path"]) if a["dedupe"] or a["decimate"] or a["fps"] else None,
+                      lambda a: hitbox_paths(a["output_path"])[0] if a["hitboxes"] else None,
+                      lambda a: hitbox_paths(a["output_path"])[1] if a["hitboxes"] else None))
+def gif_to_sprite(gif_path, output_path, max_frames=40, frames_per_row=None, start_frame=0,
+                  dedupe=False, tolerance=0, stream=False, strips=None, indexed=False, hitboxes=False,
+                  decimate=None, fps=None, loop=True):
     """
     将 GIF 指定段落的帧提取并拼接成雪碧图
     
@@ -13,112 +414,271 @@ def gif_to_sprite(gif_path, output_path, max_frames=40, frames_per_row=None, sta
         max_frames: 提取的最大帧数（默认 40）
         frames_per_row: 每行放置的帧数（None 表示自动计算，尽量接近正方形）
         start_frame: 起始帧索引（默认 0）
+        dedupe: 是否去除重复帧（见 dedupe_frames），同时输出 xxx.anim.json 播放序列
+        tolerance: 近似去重时允许不同的像素数（0 表示只合并完全相同的帧）
+        stream: 流式拼接（见 stream_sheet），峰值内存约为一张雪碧图加一帧；不能与 dedupe 同时使用
+        strips: 流式模式下是否按行带写出 PNG（None 表示按雪碧图大小自动选择）
+        indexed: 输出 8 位索引色 PNG（带 tRNS 透明色）。所有帧共用一张调色板，不超过 255 色时无损，
+                 否则量化到 255 色（见 build_shared_palette）；需要多解码一遍 GIF 统计颜色，
+                 但帧和雪碧图每像素只占 1 字节
+        hitboxes: 同时输出每帧的碰撞数据 xxx.hitbox.json/.bin（见 hitboxes.write_hitboxes），
+                  帧名为雪碧图中的帧序号
+        decimate: 抽帧模式，从 start_frame 起的全部剩余帧中按运动量选出这么多个关键帧（见 select_keyframes），
+                  每个关键帧的时长为它所代表的源帧时长之和，播放速度不变；同时输出 xxx.anim.json
+        fps: 抽帧模式，按目标播放帧率确定关键帧数（总时长 x fps）；两者都给出时取较小值，且不超过 max_frames
+        loop: 抽帧时是否按循环动画处理（末帧回到首帧的跨度也参与均衡）
+
+    返回包含输出路径、单帧尺寸、帧数和布局的 dict；出错时抛出 ToolError
     """
-    # 打开 GIF
-    try:
-        gif = Image.open(gif_path)
-    except Exception as e:
-        print(f"错误：无法打开 GIF 文件: {e}")
-        sys.exit(1)
-    
-    total_frames = getattr(gif, 'n_frames', 1)
-    is_animated = hasattr(gif, 'is_animated') and gif.is_animated
+    # 从帧索引读取帧数和尺寸（不解码）
+    info = gif_index.gif_info(gif_path)
+    total_frames = info["n_frames"]
+    is_animated = total_frames > 1
 
     # 校验起始帧
     if start_frame < 0:
-        print("错误：start_frame 不能为负数")
-        sys.exit(1)
+        raise ToolError("start_frame 不能为负数")
     if not is_animated and start_frame > 0:
-        print("错误：该 GIF 只有一帧，start_frame 必须为 0")
-        sys.exit(1)
+        raise ToolError("该 GIF 只有一帧，start_frame 必须为 0")
     if is_animated and start_frame >= total_frames:
-        print(f"错误：start_frame ({start_frame}) 超出范围，GIF 总帧数为 {total_frames}")
-        sys.exit(1)
+        raise ToolError(f"start_frame ({start_frame}) 超出范围，GIF 总帧数为 {total_frames}")
 
     # 计算要提取的帧数
+    decimating = bool(decimate or fps) and is_animated
     if not is_animated:
         frames_to_extract = 1
+    elif decimating:
+        # 抽帧：解码全部剩余帧，从中选出关键帧
+        frames_to_extract = total_frames - start_frame
     else:
         remaining = total_frames - start_frame
         frames_to_extract = min(max_frames, remaining)
 
     if frames_to_extract <= 0:
-        print("警告：没有可提取的帧，请检查 start_frame 和 max_frames")
-        sys.exit(1)
+        raise ToolError("没有可提取的帧，请检查 start_frame 和 max_frames")
+    if stream and dedupe:
+        raise ToolError("流式模式需要预先确定帧数，不能与去重同时使用")
+    if stream and decimating:
+        raise ToolError("流式模式不能与抽帧同时使用")
+    if fps is not None and fps <= 0:
+        raise ToolError("fps 必须为正数")
     
-    print(f"GIF 总帧数: {total_frames}")
-    if is_animated:
+    print(f"GIF 总帧数: {total_frames}，总时长: {sum(info['durations']) / 1000:.2f}s")
+    if decimating:
+        print(f"将从第 {start_frame} 帧开始的 {frames_to_extract} 帧中按运动量抽取关键帧")
+    elif is_animated:
         print(f"将从第 {start_frame} 帧开始提取 {frames_to_extract} 帧")
     else:
         print("警告：该文件不是动画 GIF，将只提取第一帧")
     
-    # 提取所有帧
-    frames = []
-    for i in range(frames_to_extract):
-        frame_index = start_frame + i if is_animated else 0
-        gif.seek(frame_index)
-        # 转换为 RGBA 模式以支持透明背景
-        frame = gif.convert("RGBA")
-        frames.append(frame.copy())
-    
-    # 获取第一帧的尺寸（假设所有帧尺寸相同）
-    base_w, base_h = frames[0].size
-    print(f"单帧尺寸: {base_w}x{base_h}")
-    
-    # 如果所有帧尺寸不一致，统一缩放到第一帧的尺寸
-    resized_frames = []
-    for i, frame in enumerate(frames):
-        if frame.size != (base_w, base_h):
-            print(f"警告：第 {i+1} 帧尺寸为 {frame.size}，将缩放至 {base_w}x{base_h}")
-            frame = frame.resize((base_w, base_h), Image.LANCZOS)
-        resized_frames.append(frame)
-    
-    # 计算布局：如果未指定每行帧数，自动计算（尽量接近正方形）
-    if frames_per_row is None:
-        # 计算最接近正方形的布局
-        frames_per_row = int(math.ceil(math.sqrt(frames_to_extract)))
-    
-    rows = math.ceil(frames_to_extract / frames_per_row)
-    
-    # 创建雪碧图
-    sheet_w = base_w * frames_per_row
-    sheet_h = base_h * rows
-    sheet = Image.new("RGBA", (sheet_w, sheet_h), (0, 0, 0, 0))
-    
-    # 依次粘贴每一帧
-    for i, frame in enumerate(resized_frames):
-        row = i // frames_per_row
-        col = i % frames_per_row
-        x = col * base_w
-        y = row * base_h
-        sheet.paste(frame, (x, y), frame)  # 使用 frame 作为 mask 以支持透明
-    
-    # 保存
     out_path = Path(output_path)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    sheet.save(out_path, format="PNG")
+
+    keyframes = None
+    if decimating:
+        source_durations = info["durations"][start_frame:]
+        target = min(x for x in (decimate, max_frames,
+                                 fps and math.ceil(sum(source_durations) * fps / 1000)) if x)
+        # 第一遍：只保留缩略图计算运动量
+        thumbs = []
+        for frame, _ in iter_frames(gif_path, start_frame, frames_to_extract):
+            with stage("motion", pixels=frame.width * frame.height):
+                thumbs.append(motion_thumb(frame))
+        with stage("motion"):
+            keyframes = select_keyframes(frame_motion(thumbs, loop), target, loop)
+        del thumbs
+        print(f"抽帧: {frames_to_extract} 帧 -> {len(keyframes)} 个关键帧（按运动量{'，循环' if loop else ''}）")
+    keep = set(keyframes) if keyframes is not None else None
+
+    shared = None
+    if indexed:
+        # 只统计颜色，不保留帧
+        shared = build_shared_palette(frame for n, (frame, _) in enumerate(
+            iter_frames(gif_path, start_frame, frames_to_extract, info["size"])) if keep is None or n in keep)
+        if shared["exact"]:
+            print(f"共享调色板: {shared['source_colors']} 色 + 透明色（无损）")
+        else:
+            print(f"共享调色板: {shared['source_colors']} 色量化为 {INDEXED_COLORS} 色 + 透明色，"
+                  f"平均色差 {shared['mean_error']:.2f}")
+
+    sequence = None
+    if stream:
+        base_w, base_h = info["size"]
+        durations, frames_per_row, rows, strips = stream_sheet(
+            gif_path, start_frame, frames_to_extract, info["size"], out_path, frames_per_row, strips, shared)
+        frame_count = frames_to_extract
+        sheet_w, sheet_h = base_w * frames_per_row, base_h * rows
+        print(f"单帧尺寸: {base_w}x{base_h}")
+        print("流式拼接" + ("（按行带写出 PNG）" if strips else ""))
+    else:
+        # 提取所有帧
+        frames = []
+        durations = []
+        for n, (frame, duration) in enumerate(iter_frames(gif_path, start_frame, frames_to_extract,
+                                                          info["size"] if indexed or decimating else None)):
+            durations.append(duration)
+            if keep is not None and n not in keep:
+                continue
+            if indexed:
+                frame = indexed_image(index_frame(frame, shared), shared)
+            frames.append(frame)
+
+        # 获取第一帧的尺寸（假设所有帧尺寸相同）
+        base_w, base_h = frames[0].size
+        print(f"单帧尺寸: {base_w}x{base_h}")
+
+        if decimating:
+            durations, remap = keyframe_durations(durations, keyframes)
+            sequence = [{"frame": k, "duration": d} for k, d in enumerate(durations)]
+        if dedupe:
+            count = len(frames)
+            with stage("dedupe", pixels=count * base_w * base_h):
+                frames, unique_remap, sequence = dedupe_frames(frames, durations, tolerance)
+            remap = [unique_remap[k] for k in remap] if decimating else unique_remap
+            print(f"去重: {count} 帧 -> {len(frames)} 个不同的帧")
+
+        frame_count = len(frames)
+        sheet, frames_per_row, rows = build_sheet(frames, frames_per_row)
+        sheet_w, sheet_h = sheet.size
+
+        # 保存
+        save_png(sheet, out_path)
     
     print(f"\n✓ 雪碧图已保存到: {out_path.resolve()}")
     print(f"  单帧尺寸: {base_w}x{base_h}")
-    print(f"  总帧数: {frames_to_extract}")
+    print(f"  总帧数: {frame_count}" + (f"（源 {frames_to_extract} 帧）" if frame_count != frames_to_extract else ""))
     print(f"  布局: {frames_per_row} 帧/行 × {rows} 行")
     print(f"  总尺寸: {sheet_w}x{sheet_h}")
+    print(f"  文件大小: {out_path.stat().st_size:,} bytes" + ("（8 位索引色）" if indexed else ""))
+    print(f"  峰值内存(RSS): {peak_rss_bytes() / 1024 / 1024:.1f} MB")
+
+    if sequence is not None:
+        # 动画描述：Phaser 动画帧可写成 {key, frame: f.frame, duration: f.duration}
+        # （注意 Phaser 的 AnimationFrame.duration 是在 msPerFrame 之外额外增加的时长）
+        anim_path = anim_json_path(out_path)
+        with open(anim_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "image": out_path.name,
+                "frameWidth": base_w,
+                "frameHeight": base_h,
+                "frameCount": frame_count,
+                "sourceStartFrame": start_frame,
+                "sourceFrames": remap,
+                **({"keyframes": [start_frame + k for k in keyframes]} if keyframes is not None else {}),
+                "frames": sequence,
+            }, f, ensure_ascii=False, indent=1)
+        print(f"  动画描述: {anim_path}")
+
+    if hitboxes:
+        # 从写出的雪碧图读回各帧，流式/行带模式下也不需要保留帧列表
+        with stage("hitboxes", pixels=frame_count * base_w * base_h):
+            frames = sheet_frames(out_path, base_w, base_h)[:frame_count]
+            json_path, bin_path, solid = write_hitboxes(frames, out_path, out_path.name, (base_w, base_h))
+        print_hitbox_summary(json_path, bin_path, frame_count, solid)
+
+    return {
+        "output": str(out_path),
+        "frame_width": base_w,
+        "frame_height": base_h,
+        "frames": frame_count,
+        "frames_per_row": frames_per_row,
+        "rows": rows,
+        "width": sheet_w,
+        "height": sheet_h,
+        "indexed": indexed,
+        "bytes": out_path.stat().st_size,
+    }
+
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
+    sys.argv[1:] = parse_profile_flags(parse_cache_flags(sys.argv[1:]))
+
+    # 分离位置参数和选项
+    args = []
+    dedupe = False
+    tolerance = 0
+    stream = False
+    strips = None
+    indexed = False
+    hitboxes = False
+    decimate = None
+    fps = None
+    loop = True
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg == "--dedupe":
+            dedupe = True
+            i += 1
+        elif arg == "--stream":
+            stream = True
+            i += 1
+        elif arg == "--hitboxes":
+            hitboxes = True
+            i += 1
+        elif arg == "--indexed":
+            indexed = True
+            i += 1
+        elif arg == "--strips":
+            stream = True
+            strips = True
+            i += 1
+        elif arg == "--no-loop":
+            loop = False
+            i += 1
+        elif arg in ("--decimate", "--fps"):
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            if arg == "--decimate":
+                decimate = int(sys.argv[i + 1])
+            else:
+                fps = float(sys.argv[i + 1])
+            i += 2
+        elif arg == "--tolerance":
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            dedupe = True
+            tolerance = int(sys.argv[i + 1])
+            i += 2
+        else:
+            args.append(arg)
+            i += 1
+
+    if len(args) < 2:
         print("用法: python gif_to_sprite.py <输入GIF文件> <输出PNG文件> [最大帧数] [每行帧数] [起始帧]")
+        print("\n选项:")
+        print("  --dedupe: 去除重复帧，并输出 <输出名>.anim.json（帧映射和合并后的每帧时长）")
+        print("  --tolerance <n>: 近似重复判定，与上一保留帧不同的像素 <= n 个视为重复（隐含 --dedupe）")
+        print("  --stream: 流式拼接，每帧解码后直接贴到雪碧图上，不保留帧列表（不能与 --dedupe 同用）")
+        print("  --strips: 流式拼接并按行带写出 PNG，不分配整张雪碧图（隐含 --stream）")
+        print("  --indexed: 输出 8 位索引色 PNG，所有帧共用一张调色板（超过 255 色时量化），文件更小、内存更省")
+        print("  --hitboxes: 同时输出每帧碰撞数据 <输出名>.hitbox.json/.bin（边界框、凸包、1 位掩码）")
+        print("  --decimate <n>: 从起始帧起的全部剩余帧中按运动量抽取 n 个关键帧，时长合并，播放速度不变（输出 anim.json）")
+        print("  --fps <f>: 按目标播放帧率抽帧（关键帧数 = 总时长 x f，不超过最大帧数）")
+        print("  --no-loop: 抽帧时按非循环动画处理（保留首尾帧）")
+        print("  --no-cache: 忽略构建缓存，强制重新生成")
+        print("  --profile: 剖析各阶段耗时和内存（另有 --profile-json <路径>、--profile-pstats <路径>）")
         print("\n示例:")
         print("  python gif_to_sprite.py input.gif output.png")
         print("  python gif_to_sprite.py input.gif output.png 40")
         print("  python gif_to_sprite.py input.gif output.png 40 10")
         print("  python gif_to_sprite.py input.gif output.png 20 8 60  # 从第60帧开始提取20帧")
+        print("  python gif_to_sprite.py input.gif output.png 40 --dedupe --tolerance 50")
+        print("  python gif_to_sprite.py input.gif output.png 40 --fps 12  # 整段 GIF 按 12fps 抽帧")
         sys.exit(1)
     
-    gif_path = sys.argv[1]
-    output_path = sys.argv[2]
-    max_frames = int(sys.argv[3]) if len(sys.argv) > 3 else 40
-    frames_per_row = int(sys.argv[4]) if len(sys.argv) > 4 else None
-    start_frame = int(sys.argv[5]) if len(sys.argv) > 5 else 0
-    
-    gif_to_sprite(gif_path, output_path, max_frames, frames_per_row, start_frame)
+    gif_path = args[0]
+    output_path = args[1]
+    max_frames = int(args[2]) if len(args) > 2 else 40
+    frames_per_row = int(args[3]) if len(args) > 3 else None
+    start_frame = int(args[4]) if len(args) > 4 else 0
+
+    try:
+        gif_to_sprite(gif_path, output_path, max_frames, frames_per_row, start_frame, dedupe, tolerance,
+                      stream, strips, indexed, hitboxes, decimate, fps, loop)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
 
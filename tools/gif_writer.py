@@ -0,0 +1,299 @@
+from PIL import Image
+import numpy as np
+import io
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from gif_index import scan_gif
+from profiling import stage
+
+
+# 帧颜色编码中表示"透明"的值（不透明像素编码为 0xRRGGBB）
+TRANSPARENT = -1
+
+
+def quantize_frame(frame):
+    """
+    把一帧量化成 GIF 可直接写入的 P 模式（与 Pillow 保存 GIF 时自带的转换完全相同）
+
+    RGB/RGBA 帧自适应量化为 256 色，完全透明的颜色记为透明色；
+    提前量化好的帧保存时不会再被转换，因此可以放到线程池里并行做
+    """
+    if frame.mode in ("1", "L", "P"):
+        return frame
+    if Image.getmodebase(frame.mode) != "RGB":
+        return frame.convert("L")
+
+    with stage("quantize", pixels=frame.width * frame.height):
+        im = frame.convert("P", palette=Image.Palette.ADAPTIVE)
+    if im.palette.mode == "RGBA":
+        for rgba, index in im.palette.colors.items():
+            if rgba[3] == 0:
+                im.info["transparency"] = index
+                break
+    return im
+
+
+def map_frames(func, frames, jobs=None):
+    """
+    对每帧执行 func，按原顺序返回结果列表
+
+    jobs > 1 时用线程池并行：Pillow 的缩放、裁剪、量化都在 C 代码里释放 GIL，
+    线程即可占满多核，也不用在进程间传递图像。jobs 为 1 时串行；为 None 时等于 CPU 核数，
+    但在进程池的工作进程里（batch_gif_to_sprite、watch_assets）为 1，避免进程数 x 线程数超额占用 CPU
+    """
+    if jobs is None:
+        jobs = 1 if multiprocessing.parent_process() is not None else os.cpu_count() or 1
+    if jobs == 1:
+        return [func(frame) for frame in frames]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(func, frames))
+
+
+class _DeltaUnsupported(Exception):
+    """差分写出无法保证显示效果，退回逐帧全尺寸写出"""
+
+
+def _display_codes(frame):
+    """
+    一帧 P 模式图像在查看器里实际显示的颜色，返回 (高, 宽) int32 数组
+
+    不透明像素为 0xRRGGBB，透明色索引为 TRANSPARENT（GIF 只有全透明/不透明两种，
+    RGBA 调色板里的半透明值会被查看器当作不透明显示）
+    """
+    if frame.mode != "P":
+        frame = quantize_frame(frame.convert("RGBA"))
+    palette = np.zeros((256, 3), dtype=np.int32)
+    raw = np.array(frame.getpalette("RGB"), dtype=np.int32).reshape(-1, 3)[:256]
+    palette[:len(raw)] = raw
+    lut = (palette[:, 0] << 16) | (palette[:, 1] << 8) | palette[:, 2]
+    transparency = frame.info.get("transparency")
+    if isinstance(transparency, int):
+        lut[transparency] = TRANSPARENT
+    return lut[np.asarray(frame)]
+
+
+def _bbox(mask):
+    """布尔数组中 True 区域的边界框 (x0, y0, x1, y1)，全为 False 时返回 None"""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def _union(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def _table_bits(n_colors):
+    """容纳 n_colors 种颜色的 GIF 颜色表大小指数：表大小为 2 ** (bits + 1)"""
+    return max(1, (max(n_colors, 2) - 1).bit_length()) - 1
+
+
+def _palette_bytes(colors, bits):
+    """0xRRGGBB 颜色列表 -> 补齐到 2 ** (bits + 1) 色的 RGB 颜色表"""
+    table = np.zeros((2 ** (bits + 1), 3), dtype=np.uint8)
+    colors = np.asarray(colors, dtype=np.int64)
+    table[:len(colors), 0] = colors >> 16
+    table[:len(colors), 1] = (colors >> 8) & 0xFF
+    table[:len(colors), 2] = colors & 0xFF
+    return table.tobytes()
+
+
+def _lzw_data(indices, palette):
+    """借助 Pillow 的 GIF 编码器对一块索引做 LZW 压缩，返回图像数据（最小码长字节 + 数据子块 + 结束块）"""
+    img = Image.fromarray(indices, "P")
+    img.putpalette(palette)
+    buf = io.BytesIO()
+    img.save(buf, format="GIF", optimize=False, interlace=False)
+    data = buf.getvalue()
+    start, end = scan_gif(data)["frames"][0]["data"]
+    return data[start:end]
+
+
+def _plan_frames(codes_list, durations):
+    """
+    计算每帧的变化矩形和处置方式
+
+    对每一帧，与前一帧处置后的画布比较，只保留变化矩形，矩形内未变化的像素标记为透明。
+    前一帧的处置方式延迟到看到下一帧时再决定：没有像素需要从不透明变回透明时用 1（保留），
+    否则用 2（恢复为透明），并把前一帧的矩形扩大到覆盖这些像素。完全相同的帧合并、时长相加。
+    返回 [{"codes": 该帧要绘制的颜色（TRANSPARENT 表示保留画布）, "rect", "disposal", "duration"}, ...]
+    """
+    height, width = codes_list[0].shape
+    plan = []
+    canvas = np.full((height, width), TRANSPARENT, dtype=np.int32)
+
+    for codes, duration in zip(codes_list, durations):
+        if plan:
+            prev = plan[-1]
+            shown = prev["shown"]
+            clear = (shown != TRANSPARENT) & (codes == TRANSPARENT)
+            if clear.any():
+                prev["disposal"] = 2
+                prev["rect"] = _union(prev["rect"], _bbox(clear))
+                x0, y0, x1, y1 = prev["rect"]
+                canvas = shown.copy()
+                canvas[y0:y1, x0:x1] = TRANSPARENT
+            else:
+                prev["disposal"] = 1
+                canvas = shown
+
+        changed = canvas != codes
+        rect = _bbox(changed)
+        if rect is None and plan:
+            # 与前一帧完全相同：合并时长
+            plan[-1]["duration"] += duration
+            continue
+        plan.append({
+            "codes": np.where(changed, codes, TRANSPARENT),
+            "shown": codes,
+            "rect": rect or (0, 0, 1, 1),
+            "disposal": 1,
+            "duration": duration,
+        })
+
+    # 循环播放回到第一帧之前，按同样规则处理最后一帧的处置方式
+    last = plan[-1]
+    clear = (last["shown"] != TRANSPARENT) & (codes_list[0] == TRANSPARENT)
+    if clear.any() and len(plan) > 1:
+        last["disposal"] = 2
+        last["rect"] = _union(last["rect"], _bbox(clear))
+    return plan
+
+
+def write_delta_gif(frames, output_path, durations, loop=0):
+    """
+    以逐帧差分矩形方式写出动画 GIF
+
+    - 每帧只编码相对前一帧画布变化的矩形，矩形内未变化的像素写成透明色（LZW 压缩率更高）
+    - 自动选择处置方式（1 保留 / 2 恢复透明），见 _plan_frames
+    - 所有帧用到的颜色不超过 255 种时使用共享的全局调色板，否则每帧使用只含矩形内颜色的局部调色板
+
+    frames 为 P 模式帧（见 quantize_frame），显示效果与逐帧全尺寸写出完全相同。
+    Pillow 写出的全尺寸帧已经很紧凑，在本仓库的 GIF 上差分写出只小 0.1%–0.2%，
+    因此各工具默认不启用（--delta 开启）。
+    返回统计信息 dict：写出帧数、编码像素数、全尺寸像素数、是否使用全局调色板
+    """
+    codes_list = [_display_codes(frame) for frame in frames]
+    height, width = codes_list[0].shape
+    plan = _plan_frames(codes_list, durations)
+
+    # 所有帧用到的不透明颜色（按调色板统计，不逐像素求并集）
+    all_colors = np.unique(np.concatenate([np.unique(codes) for codes in codes_list]))
+    all_colors = all_colors[all_colors != TRANSPARENT]
+    use_global = len(all_colors) <= 255
+
+    out = bytearray(b"GIF89a")
+    if use_global:
+        global_bits = _table_bits(len(all_colors) + 1)
+        global_palette = _palette_bytes(all_colors, global_bits)
+        global_transparent = len(all_colors)
+        out += struct.pack("<HHBBB", width, height, 0xF0 | global_bits, global_transparent, 0)
+        out += global_palette
+    else:
+        out += struct.pack("<HHBBB", width, height, 0x70, 0, 0)
+    out += b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00"
+
+    pixels_encoded = 0
+    for item in plan:
+        x0, y0, x1, y1 = item["rect"]
+        block = item["codes"][y0:y1, x0:x1]
+        pixels_encoded += block.size
+
+        if use_global:
+            indices = np.searchsorted(all_colors, block).astype(np.uint8)
+            indices[block == TRANSPARENT] = global_transparent
+            transparent = global_transparent
+            palette = global_palette
+            local = b""
+        else:
+            colors, inverse = np.unique(block, return_inverse=True)
+            inverse = inverse.reshape(block.shape)
+            opaque = colors[colors != TRANSPARENT]
+            needs_transparent = len(opaque) < len(colors) or item["disposal"] == 2
+            if len(opaque) + needs_transparent > 256:
+                # 256 种不透明色占满了颜色表，无法再给保留画布的像素或"恢复透明"的处置留出透明色
+                raise _DeltaUnsupported
+            # 透明色排在最后
+            transparent = len(opaque) if needs_transparent else None
+            if len(opaque) < len(colors):
+                lookup = np.where(colors == TRANSPARENT, transparent, np.arange(len(colors)) - 1)
+                indices = lookup[inverse].astype(np.uint8)
+            else:
+                indices = inverse.astype(np.uint8)
+            bits = _table_bits(len(opaque) + (1 if transparent is not None else 0))
+            palette = local = _palette_bytes(opaque, bits)
+
+        packed = (item["disposal"] << 2) | (1 if transparent is not None else 0)
+        out += b"!\xf9\x04" + struct.pack("<BHBB", packed, int(item["duration"] / 10),
+                                          0 if transparent is None else transparent, 0)
+        flags = 0 if use_global else 0x80 | bits
+        out += b"," + struct.pack("<HHHHB", x0, y0, x1 - x0, y1 - y0, flags) + local
+        out += _lzw_data(indices, palette)
+
+    out += b";"
+    with open(output_path, "wb") as f:
+        f.write(out)
+
+    return {
+        "frames": len(plan),
+        "pixels_encoded": pixels_encoded,
+        "pixels_full": width * height * len(codes_list),
+        "global_palette": use_global,
+    }
+
+
+def print_delta_stats(stats, n_frames):
+    """打印 write_delta_gif 的统计信息（跟在各工具的文件大小报告后面）"""
+    if stats is None:
+        print("  写出方式: 逐帧全尺寸")
+        return
+    ratio = stats["pixels_encoded"] / stats["pixels_full"] if stats["pixels_full"] else 0
+    palette = "全局调色板" if stats["global_palette"] else "逐帧局部调色板"
+    print(f"  写出方式: 差分矩形，编码像素 {stats['pixels_encoded']:,} / {stats['pixels_full']:,} ({ratio:.1%})，{palette}")
+    if stats["frames"] < n_frames:
+        print(f"  合并相同帧: {n_frames} -> {stats['frames']} 帧")
+
+
+def save_gif(frames, output_path, durations, loop=0, delta=False):
+    """
+    保存为 GIF：单帧直接保存；多帧默认每帧全尺寸写出（disposal=2 清除前一帧），
+    delta=True 时用 write_delta_gif 写出差分矩形动画（颜色太多无法差分时退回全尺寸写出）
+
+    返回 write_delta_gif 的统计信息，未使用差分写出时返回 None
+    """
+    with stage("encode", pixels=sum(f.width * f.height for f in frames)) as s:
+        stats = _save_gif(frames, output_path, durations, loop, delta)
+        s.add(nbytes=os.path.getsize(output_path))
+    return stats
+
+
+def _save_gif(frames, output_path, durations, loop, delta):
+    if len(frames) == 1:
+        # 单帧图像
+        frames[0].save(output_path, format="GIF")
+    else:
+        if delta:
+            try:
+                return write_delta_gif(frames, output_path, durations, loop)
+            except _DeltaUnsupported:
+                pass
+        # 动画 GIF
+        frames[0].save(
+            output_path,
+            format="GIF",
+            save_all=True,
+            append_images=frames[1:],
+            duration=durations,
+            loop=loop,
+            disposal=2  # 清除前一帧
+        )
+    return None
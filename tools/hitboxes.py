@@ -0,0 +1,227 @@
+import json
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from tool_errors import ToolError
+from gif_writer import _bbox
+from profiling import parse_profile_flags
+
+
+# alpha 不小于此值的像素算作实体（与 gif_to_sprite --indexed 的透明判定一致）
+DEFAULT_THRESHOLD = 128
+# 凸包简化后最多保留的顶点数
+DEFAULT_HULL_POINTS = 12
+
+
+def hitbox_paths(path):
+    """雪碧图/图集对应的碰撞数据文件：xxx.png / xxx.json -> (xxx.hitbox.json, xxx.hitbox.bin)"""
+    path = Path(path)
+    stem = path.with_suffix("")
+    return Path(f"{stem}.hitbox.json"), Path(f"{stem}.hitbox.bin")
+
+
+def convex_hull(mask, max_points=DEFAULT_HULL_POINTS):
+    """
+    实体像素的凸包，顶点为像素角点坐标（整数，顺时针，y 轴向下），全透明时返回 []
+
+    只用每行最左、最右实体像素的四个角点参与计算（凸包不会用到行内部的点）。
+    顶点多于 max_points 时反复删去与相邻两点构成三角形面积最小的顶点，
+    简化后的多边形会略小于真实凸包，但偏差集中在最不显著的拐角处
+    """
+    rows = np.flatnonzero(mask.any(axis=1))
+    if len(rows) == 0:
+        return []
+    left = mask[rows].argmax(axis=1)
+    right = mask.shape[1] - mask[rows, ::-1].argmax(axis=1)
+    points = set()
+    for y, x0, x1 in zip(rows.tolist(), left.tolist(), right.tolist()):
+        points.update(((x0, y), (x0, y + 1), (x1, y), (x1, y + 1)))
+    points = sorted(points)
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    # Andrew 单调链
+    lower, upper = [], []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    hull = lower[:-1] + upper[:-1]
+
+    while len(hull) > max(max_points, 3):
+        n = len(hull)
+        areas = [abs(cross(hull[i - 1], hull[i], hull[(i + 1) % n])) for i in range(n)]
+        del hull[areas.index(min(areas))]
+    return [list(p) for p in hull]
+
+
+def frame_hitbox(frame, threshold=DEFAULT_THRESHOLD, hull_points=DEFAULT_HULL_POINTS):
+    """
+    一帧的碰撞数据，返回 (信息 dict, 打包后的 1 位掩码字节)
+
+    信息包括 bbox（实体像素的边界框，帧内坐标 x/y/w/h，全透明时为 None）和 hull（见 convex_hull，
+    hull_points 为 0 时不计算）。掩码只覆盖 bbox 区域，逐行按位打包（高位在前，每行补齐到整字节）
+    """
+    mask = np.asarray(frame.convert("RGBA"))[..., 3] >= threshold
+    box = _bbox(mask)
+    info = {"bbox": None}
+    if box is None:
+        if hull_points:
+            info["hull"] = []
+        return info, b""
+
+    x0, y0, x1, y1 = box
+    info["bbox"] = {"x": x0, "y": y0, "w": x1 - x0, "h": y1 - y0}
+    if hull_points:
+        info["hull"] = convex_hull(mask, hull_points)
+    return info, np.packbits(mask[y0:y1, x0:x1], axis=1).tobytes()
+
+
+def write_hitboxes(frames, output_path, image_name, frame_size,
+                   threshold=DEFAULT_THRESHOLD, hull_points=DEFAULT_HULL_POINTS, masks=True):
+    """
+    计算每帧的碰撞数据并写出 xxx.hitbox.json（和 masks 为 True 时的 xxx.hitbox.bin）
+
+    参数:
+        frames: [(帧名, RGBA 帧), ...]，帧名与 Phaser 中的帧名一致（雪碧图为 "0"、"1"...）
+        output_path: 雪碧图或图集 JSON 的路径，碰撞数据文件与其同名（见 hitbox_paths）
+        image_name: 记录在 JSON 中的图片/图集文件名
+        frame_size: 帧尺寸 (宽, 高)；bbox 和 hull 都以裁剪前的完整帧为坐标系，
+                    与 Arcade Body 的 setSize/setOffset 使用的未缩放帧坐标相同
+    返回 (JSON 路径, 掩码文件路径或 None, 有实体像素的帧数)
+    """
+    json_path, bin_path = hitbox_paths(output_path)
+    result = {
+        "image": image_name,
+        "frameWidth": frame_size[0],
+        "frameHeight": frame_size[1],
+        "threshold": threshold,
+        "frames": {},
+    }
+    if masks:
+        # 每帧掩码为 bin 文件中 [offset, offset + rowBytes * bbox.h) 的字节
+        result["mask"] = {"file": bin_path.name, "format": "1bit-msb-rows"}
+
+    blob = bytearray()
+    solid = 0
+    for name, frame in frames:
+        info, packed = frame_hitbox(frame, threshold, hull_points)
+        if masks and info["bbox"] is not None:
+            info["mask"] = {"offset": len(blob), "rowBytes": (info["bbox"]["w"] + 7) // 8}
+            blob += packed
+        solid += info["bbox"] is not None
+        result["frames"][name] = info
+
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, separators=(",", ":"))
+    if masks:
+        bin_path.write_bytes(bytes(blob))
+    elif bin_path.exists():
+        bin_path.unlink()
+    return json_path, bin_path if masks else None, solid
+
+
+def print_hitbox_summary(json_path, bin_path, n_frames, solid):
+    """打印 write_hitboxes 的结果（跟在各工具的输出报告后面）"""
+    line = f"  碰撞数据: {Path(json_path).name}（{solid}/{n_frames} 帧有实体像素）"
+    if bin_path is not None:
+        line += f"，掩码 {Path(bin_path).name} {Path(bin_path).stat().st_size:,} bytes"
+    print(line)
+
+
+def sheet_frames(sheet_path, frame_w, frame_h):
+    """按网格切分雪碧图，返回 [(帧名, RGBA 帧), ...]，按行优先编号（与 Phaser spritesheet 的帧序号相同）"""
+    try:
+        with Image.open(sheet_path) as img:
+            sheet = img.convert("RGBA")
+    except OSError as e:
+        raise ToolError(f"无法打开图片: {sheet_path} ({e})")
+    cols, rows = sheet.width // frame_w, sheet.height // frame_h
+    if cols == 0 or rows == 0:
+        raise ToolError(f"帧尺寸 {frame_w}x{frame_h} 大于图片尺寸 {sheet.width}x{sheet.height}")
+    return [(str(row * cols + col),
+             sheet.crop((col * frame_w, row * frame_h, (col + 1) * frame_w, (row + 1) * frame_h)))
+            for row in range(rows) for col in range(cols)]
+
+
+def atlas_frames(json_path):
+    """读取图集，把每帧还原成裁剪前的完整帧，返回 ([(帧名, RGBA 帧), ...], 帧尺寸)"""
+    from asset_variants import _atlas_frames
+
+    frames = [(name, frame) for _, names, anim_frames in _atlas_frames(json_path)
+              for name, frame in zip(names, anim_frames)]
+    if not frames:
+        raise ToolError(f"图集中没有帧: {json_path}")
+    return frames, frames[0][1].size
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(sys.argv[1:])
+
+    args = []
+    threshold = DEFAULT_THRESHOLD
+    hull_points = DEFAULT_HULL_POINTS
+    masks = True
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ("--threshold", "--hull-points"):
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            if arg == "--threshold":
+                threshold = int(sys.argv[i + 1])
+            else:
+                hull_points = int(sys.argv[i + 1])
+            i += 2
+        elif arg == "--no-hull":
+            hull_points = 0
+            i += 1
+        elif arg == "--no-mask":
+            masks = False
+            i += 1
+        else:
+            args.append(arg)
+            i += 1
+
+    if not args or (not args[0].endswith(".json") and len(args) < 2):
+        print("用法: python hitboxes.py <雪碧图.png> <帧宽>x<帧高> [选项]")
+        print("      python hitboxes.py <图集.json> [选项]")
+        print("\n为每帧计算 alpha 边界框、简化凸包和 1 位碰撞掩码，写到同名 .hitbox.json / .hitbox.bin")
+        print("\n选项:")
+        print(f"  --threshold <n>    alpha 不小于 n 的像素算作实体（默认 {DEFAULT_THRESHOLD}）")
+        print(f"  --hull-points <n>  凸包最多顶点数（默认 {DEFAULT_HULL_POINTS}）")
+        print("  --no-hull          不计算凸包")
+        print("  --no-mask          不输出掩码文件")
+        print("\n示例:")
+        print("  python tools/hitboxes.py assets/avatar_walk_sprite.png 198x341")
+        print("  python tools/hitboxes.py assets/avatar_walk_atlas.json")
+        sys.exit(1)
+
+    target = Path(args[0])
+    try:
+        if target.suffix == ".json":
+            frames, frame_size = atlas_frames(target)
+        else:
+            m = re.fullmatch(r"(\d+)x(\d+)", args[1])
+            if not m:
+                raise ToolError(f"无法解析帧尺寸: {args[1]}（格式为 <宽>x<高>）")
+            frame_size = (int(m[1]), int(m[2]))
+            frames = sheet_frames(target, *frame_size)
+        json_path, bin_path, solid = write_hitboxes(frames, target, target.name, frame_size,
+                                                    threshold, hull_points, masks)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+
+    print(f"✓ 碰撞数据已保存到: {json_path.resolve()}")
+    print_hitbox_summary(json_path, bin_path, len(frames), solid)
@@ -0,0 +1,599 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import resource
+import socket
+import struct
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from tool_errors import ToolError
+
+
+# 与 server/game_server.js 保持一致
+MAX_PLAYERS = 4
+TICK_RATE = 20
+COUNTDOWN_SECONDS = 3
+GAME_WIDTH = 960
+# 客户端每 50ms 上报一次状态（js/man_down_multiplayer.js 的 updateInterval）
+UPDATE_INTERVAL = 0.05
+# 每个玩家平均每秒踩到几次易碎平台（只触发易碎平台：毒平台会扣血，玩家死光后房间停止广播）
+TRIGGER_RATE = 0.5
+
+DEFAULT_CLIENTS = 200
+DEFAULT_DURATION = 20.0
+# 同时进行的握手数
+DEFAULT_CONNECT_CONCURRENCY = 100
+# 稳定阶段从收到 game_start 之后多久开始统计（跳过开局的大消息和平台补发）
+WARMUP = 1.0
+# 等待开局的超时（秒，另加持续时间）
+START_TIMEOUT = 60.0
+# 负载生成器事件循环延迟的 p99 超过这个值（毫秒）时提示结果可能偏大
+LAG_WARNING_MS = 5.0
+# 直方图精度：0.1 毫秒一格
+BIN = 10
+
+SERVER_SCRIPT = Path(__file__).resolve().parent.parent / "server" / "game_server.js"
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+PLAYERS_STATE_PREFIX = b'{"type":"players_state","serverTime":'
+
+
+# ========== 最小的 WebSocket 客户端（RFC 6455，只支持文本消息） ==========
+
+async def ws_connect(host, port, path="/"):
+    """建立 WebSocket 连接，返回 (reader, writer, 握手字节数)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    request = (f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+               f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode()
+    writer.write(request)
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    if " 101 " not in lines[0] + " ":
+        writer.close()
+        raise ConnectionError(f"握手失败: {lines[0]}")
+    accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+    if not any(line.lower() == f"sec-websocket-accept: {accept}".lower() for line in lines):
+        writer.close()
+        raise ConnectionError("握手失败: Sec-WebSocket-Accept 不匹配")
+    return reader, writer, len(request) + len(head)
+
+
+def ws_frame(payload, opcode=0x1):
+    """客户端发出的帧（必须加掩码）"""
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, 0x80 | n)
+    elif n < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, n)
+    mask = os.urandom(4)
+    key = int.from_bytes((mask * (n // 4 + 1))[:n], "big")
+    masked = (int.from_bytes(payload, "big") ^ key).to_bytes(n, "big") if n else b""
+    return header + mask + masked
+
+
+async def ws_read(reader):
+    """读取一条完整消息，返回 (opcode, 内容, 线上字节数)；控制帧单独返回"""
+    parts = []
+    first_opcode = None
+    wire = 0
+    while True:
+        b1, b2 = await reader.readexactly(2)
+        n = b2 & 0x7F
+        wire += 2
+        if n == 126:
+            n = struct.unpack("!H", await reader.readexactly(2))[0]
+            wire += 2
+        elif n == 127:
+            n = struct.unpack("!Q", await reader.readexactly(8))[0]
+            wire += 8
+        mask = None
+        if b2 & 0x80:
+            mask = await reader.readexactly(4)
+            wire += 4
+        payload = await reader.readexactly(n)
+        wire += n
+        if mask:
+            key = int.from_bytes((mask * (n // 4 + 1))[:n], "big")
+            payload = (int.from_bytes(payload, "big") ^ key).to_bytes(n, "big")
+        opcode = b1 & 0x0F
+        if opcode >= 0x8:
+            return opcode, payload, wire
+        if first_opcode is None:
+            first_opcode = opcode
+        parts.append(payload)
+        if b1 & 0x80:
+            return first_opcode, b"".join(parts), wire
+
+
+# ========== 统计 ==========
+
+def new_stats():
+    """一个工作进程的统计；直方图以 0.1 毫秒为一格，可以跨进程直接相加"""
+    return {
+        "clients": 0, "connected": 0, "failed": 0, "errors": Counter(), "started": 0,
+        "ramp_start": None, "ramp_end": None,
+        "connect_ms": Counter(),
+        "sent": Counter(), "sent_bytes": Counter(), "recv": Counter(), "recv_bytes": Counter(),
+        "client_seconds": 0.0,
+        "latency_ms": Counter(), "arrival_jitter_ms": Counter(), "server_jitter_ms": Counter(),
+        "loop_lag_ms": Counter(),
+    }
+
+
+def merge_stats(total, stats):
+    for key, value in stats.items():
+        if key == "ramp_start":
+            total[key] = value if total[key] is None else min(total[key], value or total[key])
+        elif key == "ramp_end":
+            total[key] = value if total[key] is None else max(total[key], value or total[key])
+        else:
+            total[key] += value
+    return total
+
+
+def percentile(hist, p):
+    """直方图 {格: 次数} 的第 p 百分位（毫秒）"""
+    count = sum(hist.values())
+    if not count:
+        return None
+    rank = max(1, math.ceil(count * p / 100))
+    seen = 0
+    for key in sorted(hist):
+        seen += hist[key]
+        if seen >= rank:
+            return key / BIN
+    return max(hist) / BIN
+
+
+def _record(hist, ms):
+    hist[max(0, int(ms * BIN))] += 1
+
+
+# ========== 模拟客户端 ==========
+
+class Room:
+    """一组一起开局的客户端：第一个创建房间，其余按房间号加入"""
+
+    def __init__(self, leader, size):
+        self.leader = leader
+        self.size = size
+        self.id = None
+        self.created = asyncio.Event()
+
+
+async def send_json(writer, message, stats, counting):
+    data = json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode()
+    frame = ws_frame(data)
+    writer.write(frame)
+    if counting:
+        stats["sent"][message["type"]] += 1
+        stats["sent_bytes"][message["type"]] += len(frame)
+
+
+async def play(writer, state, stats, deadline):
+    """游戏阶段：每 50ms 上报一次位置（随机游走），偶尔踩易碎平台"""
+    rng = random.Random()
+    x = GAME_WIDTH / 2 + rng.uniform(-100, 100)
+    y = 180.0
+    vx = 0.0
+    level = 1
+    next_send = time.monotonic() + rng.uniform(0, UPDATE_INTERVAL)
+    while True:
+        now = time.monotonic()
+        if now >= deadline or state["finished"]:
+            return
+        await asyncio.sleep(max(0.0, next_send - now))
+        next_send += UPDATE_INTERVAL
+        vx = max(-660.0, min(660.0, vx + rng.uniform(-200, 200)))
+        x = max(0.0, min(float(GAME_WIDTH), x + vx * UPDATE_INTERVAL))
+        y = 180.0 + 40.0 * math.sin(now)
+        if rng.random() < 0.02:
+            level += 1
+        counting = state["window_start"] is not None and time.monotonic() >= state["window_start"]
+        await send_json(writer, {"type": "player_update", "data": {
+            "x": round(x, 2), "y": round(y, 2), "velocityX": round(vx, 2), "velocityY": 0,
+            "lives": 5, "level": level}}, stats, counting)
+        if state["fragile"] and rng.random() < TRIGGER_RATE * UPDATE_INTERVAL:
+            platform_id = state["fragile"].pop(rng.randrange(len(state["fragile"])))
+            await send_json(writer, {"type": "platform_trigger", "platformId": platform_id}, stats, counting)
+
+
+async def run_client(n, room, host, port, duration, connect_gate, stats):
+    """一个模拟玩家：连接 → 建房/加入 → 人齐后准备 → 倒计时 → 游戏 duration 秒 → 断开"""
+    state = {"window_start": None, "finished": False, "fragile": [], "ready": False,
+             "last_arrival": None, "last_server_time": None}
+    writer = None
+    player = None
+    try:
+        async with connect_gate:
+            start = time.time()
+            stats["ramp_start"] = start if stats["ramp_start"] is None else min(stats["ramp_start"], start)
+            reader, writer, _ = await ws_connect(host, port)
+            opcode, data, _ = await ws_read(reader)
+            message = json.loads(data)
+            if message.get("type") != "connected":
+                raise ConnectionError(f"第一条消息不是 connected: {message.get('type')}")
+            end = time.time()
+            _record(stats["connect_ms"], (end - start) * 1000)
+            stats["connected"] += 1
+            stats["ramp_end"] = max(stats["ramp_end"] or end, end)
+
+        name = f"bot{n}"
+        if n == room.leader:
+            await send_json(writer, {"type": "create_room", "playerName": name}, stats, False)
+        else:
+            await room.created.wait()
+            if not room.id:
+                raise ConnectionError("房主建房失败")
+            await send_json(writer, {"type": "join_room", "roomId": room.id, "playerName": name}, stats, False)
+
+        deadline = None
+        while True:
+            opcode, data, wire = await ws_read(reader)
+            if opcode == 0x8:
+                break
+            if opcode == 0x9:
+                writer.write(ws_frame(data, 0xA))
+                continue
+            if opcode != 0x1:
+                continue
+            now = time.time()
+            counting = state["window_start"] is not None and time.monotonic() >= state["window_start"]
+
+            # players_state 每 tick 都有，只从开头取出 serverTime，不解析整条 JSON
+            if data.startswith(PLAYERS_STATE_PREFIX):
+                kind = "players_state"
+                if counting:
+                    server_time = int(data[len(PLAYERS_STATE_PREFIX):data.index(b",", len(PLAYERS_STATE_PREFIX))])
+                    _record(stats["latency_ms"], now * 1000 - server_time)
+                    if state["last_arrival"] is not None:
+                        _record(stats["arrival_jitter_ms"], abs((now - state["last_arrival"]) * 1000 - 1000 / TICK_RATE))
+                        _record(stats["server_jitter_ms"], abs(server_time - state["last_server_time"] - 1000 / TICK_RATE))
+                    state["last_arrival"] = now
+                    state["last_server_time"] = server_time
+            else:
+                message = json.loads(data)
+                kind = message.get("type")
+                if kind == "joined_room":
+                    if not room.created.is_set():
+                        room.id = message["roomId"]
+                        room.created.set()
+                elif kind == "game_state":
+                    if message["state"] == "waiting" and len(message["players"]) == room.size and not state["ready"]:
+                        state["ready"] = True
+                        await send_json(writer, {"type": "player_ready", "ready": True}, stats, False)
+                    elif message["state"] == "finished":
+                        state["finished"] = True
+                        break
+                elif kind in ("game_start", "new_platforms"):
+                    state["fragile"] += [p["id"] for p in message["platforms"] if p["type"] == "fragile"]
+                    if kind == "game_start":
+                        stats["started"] += 1
+                        state["window_start"] = time.monotonic() + WARMUP
+                        deadline = time.monotonic() + WARMUP + duration
+                        player = asyncio.ensure_future(play(writer, state, stats, deadline))
+                elif kind == "error":
+                    raise ConnectionError(f"服务器错误: {message.get('message')}")
+            if counting:
+                stats["recv"][kind] += 1
+                stats["recv_bytes"][kind] += wire
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        if state["window_start"] is not None:
+            stats["client_seconds"] += max(0.0, min(time.monotonic(), deadline) - state["window_start"])
+        writer.write(ws_frame(struct.pack("!H", 1000), 0x8))
+    except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+        stats["failed"] += 1
+        stats["errors"][f"{type(e).__name__}: {e}"[:120]] += 1
+        if not room.created.is_set():
+            # 建房失败时不让同房间的其他客户端一直等下去
+            room.id = ""
+            room.created.set()
+    finally:
+        if player is not None:
+            player.cancel()
+        if writer is not None:
+            writer.close()
+
+
+async def monitor_loop_lag(stats, stop):
+    """记录事件循环的调度延迟：负载生成器自身忙不过来时，测到的延迟会偏大"""
+    interval = 0.01
+    while not stop.is_set():
+        start = time.monotonic()
+        await asyncio.sleep(interval)
+        _record(stats["loop_lag_ms"], (time.monotonic() - start - interval) * 1000)
+
+
+async def run_clients(first, count, host, port, duration, connect_concurrency):
+    stats = new_stats()
+    stats["clients"] = count
+    gate = asyncio.Semaphore(connect_concurrency)
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(monitor_loop_lag(stats, stop))
+    tasks = []
+    # first 总是 MAX_PLAYERS 的整数倍，房间不会跨进程
+    for start in range(first, first + count, MAX_PLAYERS):
+        room = Room(start, min(MAX_PLAYERS, first + count - start))
+        for n in range(start, start + room.size):
+            tasks.append(run_client(n, room, host, port, duration, gate, stats))
+    try:
+        await asyncio.wait_for(asyncio.gather(*tasks), START_TIMEOUT + WARMUP + duration + COUNTDOWN_SECONDS)
+    except asyncio.TimeoutError:
+        stats["errors"]["超时：部分房间没有开局或没有按时结束"] += 1
+    stop.set()
+    await lag
+    return stats
+
+
+def raise_fd_limit():
+    """每个连接占一个文件描述符，把软限制提到硬限制"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and (hard == resource.RLIM_INFINITY or soft < hard):
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def worker_main(first, count, host, port, duration, connect_concurrency):
+    """工作进程：用一个事件循环跑 count 个客户端"""
+    raise_fd_limit()
+    return asyncio.run(run_clients(first, count, host, port, duration, connect_concurrency))
+
+
+# ========== 服务器进程 ==========
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    """在本地启动 node server/game_server.js，等待端口可连接"""
+    try:
+        proc = subprocess.Popen(["node", str(SERVER_SCRIPT)], cwd=SERVER_SCRIPT.parent,
+                                env=dict(os.environ, PORT=str(port)),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise ToolError("找不到 node，请先安装 Node.js（>=18），或用 --url 指定已启动的服务器")
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            error = proc.stderr.read().decode(errors="replace").strip().splitlines()
+            raise ToolError(f"服务器启动失败: {error[-1] if error else proc.returncode}"
+                            "（是否已在 server/ 下运行 npm install？）")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise ToolError("服务器 10 秒内没有开始监听")
+
+
+def server_usage(pid):
+    """读取 /proc 中服务器进程的累计 CPU 时间（秒）和峰值内存（字节）；非 Linux 返回 None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            hwm = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return (int(fields[11]) + int(fields[12])) / ticks, hwm
+
+
+# ========== 主流程与报告 ==========
+
+def load_test(clients=DEFAULT_CLIENTS, duration=DEFAULT_DURATION, workers=1, url=None,
+              connect_concurrency=DEFAULT_CONNECT_CONCURRENCY):
+    """
+    模拟 clients 个玩家按 MAX_PLAYERS 人一间分组，走完 建房/加入 → 准备 → 倒计时 → 游戏 的流程，
+    游戏阶段每 50ms 上报一次位置，持续 duration 秒
+
+    url 为空时在本地启动 server/game_server.js（随机端口），结束后关闭。
+    客户端按房间分给 workers 个工作进程，每个进程一个 asyncio 事件循环。
+    返回报告 dict（见 summarize）
+    """
+    if clients < 1 or duration <= 0 or workers < 1:
+        raise ToolError("clients、duration、workers 必须大于 0")
+    raise_fd_limit()
+
+    proc = None
+    if url:
+        if not url.startswith("ws://"):
+            raise ToolError(f"只支持 ws:// 地址: {url}")
+        host, _, port = url[len("ws://"):].rstrip("/").partition(":")
+        port = int(port or 80)
+    else:
+        host, port = "127.0.0.1", _free_port()
+        proc = start_server(port)
+
+    # 按整房间分给各工作进程
+    rooms = math.ceil(clients / MAX_PLAYERS)
+    workers = min(workers, rooms)
+    shares = []
+    first = 0
+    for w in range(workers):
+        count = min(clients - first, (rooms * (w + 1) // workers - rooms * w // workers) * MAX_PLAYERS)
+        shares.append((first, count))
+        first += count
+
+    print(f"服务器: ws://{host}:{port}" + (f"（node {SERVER_SCRIPT.name}，pid {proc.pid}）" if proc else ""))
+    print(f"客户端: {clients}（{rooms} 个房间，每间最多 {MAX_PLAYERS} 人），工作进程 {workers} 个，"
+          f"游戏阶段 {duration:g}s")
+
+    total = new_stats()
+    try:
+        usage_start = server_usage(proc.pid) if proc else None
+        wall_start = time.monotonic()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(worker_main, first, count, host, port, duration,
+                                   max(1, connect_concurrency // workers)) for first, count in shares]
+            for future in futures:
+                merge_stats(total, future.result())
+        wall = time.monotonic() - wall_start
+        usage_end = server_usage(proc.pid) if proc else None
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+    report = summarize(total, duration)
+    report["wall"] = wall
+    if usage_start and usage_end:
+        report["server"] = {"cpu_seconds": usage_end[0] - usage_start[0],
+                            "cpu_percent": (usage_end[0] - usage_start[0]) / wall * 100,
+                            "peak_rss": usage_end[1]}
+    return report
+
+
+def summarize(stats, duration):
+    """把合并后的统计整理成报告 dict（速率为稳定阶段的值）"""
+    client_seconds = stats["client_seconds"] or 1.0
+    ramp = (stats["ramp_end"] - stats["ramp_start"]) if stats["ramp_start"] and stats["ramp_end"] else 0.0
+
+    def hist(h):
+        return {"p50": percentile(h, 50), "p90": percentile(h, 90), "p99": percentile(h, 99),
+                "max": (max(h) / BIN) if h else None, "samples": sum(h.values())}
+
+    def rates(counts, sizes):
+        return {kind: {"messages": counts[kind] / client_seconds, "bytes": sizes[kind] / client_seconds}
+                for kind in sorted(counts, key=lambda k: -sizes[k])}
+
+    return {
+        "clients": stats["clients"],
+        "duration": duration,
+        "connections": {"ok": stats["connected"], "failed": stats["failed"], "seconds": ramp,
+                        "per_second": stats["connected"] / ramp if ramp else None,
+                        "handshake_ms": hist(stats["connect_ms"])},
+        "rooms_started": stats["started"],
+        "client_seconds": stats["client_seconds"],
+        "recv": rates(stats["recv"], stats["recv_bytes"]),
+        "sent": rates(stats["sent"], stats["sent_bytes"]),
+        "latency_ms": hist(stats["latency_ms"]),
+        "arrival_jitter_ms": hist(stats["arrival_jitter_ms"]),
+        "server_jitter_ms": hist(stats["server_jitter_ms"]),
+        "loop_lag_ms": hist(stats["loop_lag_ms"]),
+        "errors": dict(stats["errors"].most_common(10)),
+    }
+
+
+def _ms(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_report(report):
+    conn = report["connections"]
+    hs = conn["handshake_ms"]
+    print("\n连接:")
+    print(f"  成功 {conn['ok']}，失败 {conn['failed']}，用时 {conn['seconds']:.2f}s"
+          + (f"，{conn['per_second']:.0f} 连接/s" if conn["per_second"] else ""))
+    print(f"  握手到收到 connected: p50 {_ms(hs['p50'])}ms  p99 {_ms(hs['p99'])}ms  max {_ms(hs['max'])}ms")
+    print(f"  开局玩家: {report['rooms_started']}")
+
+    active = report["client_seconds"] / report["duration"] if report["duration"] else 0
+    print(f"\n每个客户端每秒（稳定阶段，共 {report['client_seconds']:.0f} 客户端·秒，平均在线 {active:.0f}）:")
+    print(f"  {'message':24}{'msg/s':>10}{'bytes/s':>12}")
+    for direction, label in (("recv", "收"), ("sent", "发")):
+        rows = report[direction]
+        for kind, r in rows.items():
+            print(f"  {label} {kind:22}{r['messages']:>10.2f}{r['bytes']:>12,.0f}")
+        msgs = sum(r["messages"] for r in rows.values())
+        nbytes = sum(r["bytes"] for r in rows.values())
+        print(f"  {label} {'合计':20}{msgs:>10.2f}{nbytes:>12,.0f}"
+              f"    全部客户端 {msgs * active:,.0f} 条/s，{nbytes * active / 1024 / 1024:.2f} MB/s")
+
+    print("\n延迟和抖动（毫秒）:")
+    print(f"  {'':34}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}")
+    for key, label in (("latency_ms", "广播延迟 serverTime→收到"),
+                       ("arrival_jitter_ms", "到达间隔抖动 |间隔-50ms|"),
+                       ("server_jitter_ms", "服务器 tick 抖动 |间隔-50ms|"),
+                       ("loop_lag_ms", "负载生成器事件循环延迟")):
+        h = report[key]
+        # 中文按两格宽补齐
+        pad = 34 - sum(2 if ord(c) > 0x2E7F else 1 for c in label)
+        print(f"  {label}{' ' * pad}{_ms(h['p50']):>8}{_ms(h['p90']):>8}{_ms(h['p99']):>8}{_ms(h['max']):>8}")
+
+    server = report.get("server")
+    if server:
+        print(f"\n服务器进程: CPU {server['cpu_seconds']:.2f}s（{server['cpu_percent']:.0f}% 单核），"
+              f"峰值内存 {server['peak_rss'] / 1024 / 1024:.1f} MB")
+    if report["loop_lag_ms"]["p99"] is not None and report["loop_lag_ms"]["p99"] > LAG_WARNING_MS:
+        print(f"\n⚠️  负载生成器事件循环延迟 p99 超过 {LAG_WARNING_MS:g}ms，测到的延迟和抖动包含客户端自身的排队，"
+              "请增加 --workers 或减少 --clients")
+    if report["errors"]:
+        print("\n错误:")
+        for error, count in report["errors"].items():
+            print(f"  {count} × {error}")
+
+
+if __name__ == "__main__":
+    clients = DEFAULT_CLIENTS
+    duration = DEFAULT_DURATION
+    workers = 1
+    url = None
+    connect_concurrency = DEFAULT_CONNECT_CONCURRENCY
+    json_path = None
+
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ["--help", "-h"]:
+            print("用法: python load_test.py [选项]")
+            print("\n模拟多名玩家连接 server/game_server.js，按房间走完 建房/加入 → 准备 → 倒计时 → 游戏 的流程，")
+            print("报告连接吞吐、消息速率、每客户端每秒字节数、广播延迟和 tick 抖动")
+            print("\n选项:")
+            print(f"  --clients, -c <n>            模拟玩家数（默认 {DEFAULT_CLIENTS}，每 {MAX_PLAYERS} 人一个房间）")
+            print(f"  --duration, -d <秒>          游戏阶段持续时间（默认 {DEFAULT_DURATION:g}）")
+            print("  --workers, -j <n>            客户端工作进程数（默认 1；上千客户端时按 CPU 核数设置）")
+            print(f"  --connect-concurrency <n>    同时进行的握手数（默认 {DEFAULT_CONNECT_CONCURRENCY}）")
+            print("  --url <ws://主机:端口>       连接已启动的服务器（默认在本地随机端口启动 server/game_server.js）")
+            print("  --json <路径>                把报告写成 JSON")
+            print("\n示例:")
+            print("  python tools/load_test.py --clients 2000 --workers 4 --duration 30")
+            sys.exit(0)
+        if i + 1 >= len(sys.argv):
+            print(f"错误：无法识别的参数或缺少值: {arg}")
+            sys.exit(1)
+        value = sys.argv[i + 1]
+        if arg in ["--clients", "-c"]:
+            clients = int(value)
+        elif arg in ["--duration", "-d"]:
+            duration = float(value)
+        elif arg in ["--workers", "-j"]:
+            workers = int(value)
+        elif arg == "--connect-concurrency":
+            connect_concurrency = int(value)
+        elif arg == "--url":
+            url = value
+        elif arg == "--json":
+            json_path = value
+        else:
+            print(f"错误：无法识别的参数: {arg}")
+            sys.exit(1)
+        i += 2
+
+    try:
+        report = load_test(clients, duration, workers, url, connect_concurrency)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+
+    print_report(report)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ 报告已保存到: {Path(json_path).resolve()}")
+    sys.exit(1 if report["connections"]["failed"] else 0)
@@ -0,0 +1,191 @@
+from PIL import Image
+import numpy as np
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from tool_errors import ToolError
+from build_cache import cached_tool, parse_cache_flags
+from trim_gif import get_bounding_box
+from profiling import parse_profile_flags
+
+
+# 字形之间保留的透明像素，避免线性过滤时采样到相邻字形
+GLYPH_PADDING = 1
+# 图集页面最大宽度，超过后换行
+MAX_PAGE_WIDTH = 1024
+
+
+def font_xml_path(output):
+    """字体图集对应的描述文件：xxx.png -> xxx.xml"""
+    return Path(output).with_suffix(".xml")
+
+
+def _row_extents(alpha, xoffset):
+    """每行最左、最右（不含）不透明像素的 x 坐标（已加上 xoffset），空行为 NaN"""
+    opaque = alpha > 0
+    has = opaque.any(axis=1)
+    left = np.where(has, opaque.argmax(axis=1), np.nan) + xoffset
+    right = np.where(has, alpha.shape[1] - opaque[:, ::-1].argmax(axis=1), np.nan) + xoffset
+    return left, right
+
+
+def auto_kerning(glyphs, line_height, gap):
+    """
+    按字形轮廓计算字偶距：两个字形相邻排版时，逐行求左字形右边缘到右字形左边缘的最小距离，
+    与期望间隙 gap 的差值即为调整量（负数收紧，正数放宽）。两字形没有共同的非空行时不调整。
+    返回 [(左字符, 右字符, 调整量), ...]，只包含非 0 项
+    """
+    extents = {}
+    for g in glyphs:
+        # 按整行高度展开，字形顶端对齐到 yoffset
+        alpha = np.zeros((line_height, g["image"].width), dtype=np.uint8)
+        alpha[g["yoffset"]:g["yoffset"] + g["image"].height] = np.asarray(g["image"])[..., 3]
+        extents[g["char"]] = _row_extents(alpha, g["xoffset"])
+
+    pairs = []
+    for a in glyphs:
+        _, right = extents[a["char"]]
+        for b in glyphs:
+            left, _ = extents[b["char"]]
+            gaps = left + a["xadvance"] - right
+            if np.isnan(gaps).all():
+                continue
+            amount = int(round(gap - np.nanmin(gaps)))
+            if amount:
+                pairs.append((a["char"], b["char"], amount))
+    return pairs
+
+
+@cached_tool("make_bitmap_font", version=1, inputs=("inputs",),
+             outputs=("output", lambda a: font_xml_path(a["output"])))
+def make_bitmap_font(output, chars, *inputs, advance=None, spacing=0, kerning=None):
+    """
+    把一组字形图片打包成一张图集，并写出 AngelCode BMFont XML 描述（Phaser scene.load.bitmapFont 可直接加载）
+
+    参数:
+        output: 输出图集 PNG 路径，描述文件为同名 .xml
+        chars: 字符串，与 inputs 一一对应的字符
+        inputs: 字形图片路径
+        advance: 固定字宽（等宽数字，字形在字宽内水平居中）；None 表示每个字形的宽度加 spacing
+        spacing: 非等宽时字形之间的额外间距
+        kerning: 按轮廓自动计算字偶距时期望的最小间隙（见 auto_kerning）；None 表示不输出字偶距
+
+    字形裁掉透明边后装入图集，裁掉的部分记在 xoffset/yoffset 中，排版结果与原图相同。
+    返回包含输出路径、字形数、图集尺寸和字偶距数量的 dict
+    """
+    if len(chars) != len(inputs):
+        raise ToolError(f"字符数 ({len(chars)}) 与图片数 ({len(inputs)}) 不一致")
+    if len(set(chars)) != len(chars):
+        raise ToolError(f"字符重复: {chars}")
+
+    glyphs = []
+    for char, path in zip(chars, inputs):
+        try:
+            with Image.open(path) as img:
+                source = img.convert("RGBA")
+        except OSError as e:
+            raise ToolError(f"无法打开图片: {path} ({e})")
+        bbox = get_bounding_box(source) or (0, 0, 1, 1)  # 全透明字形（如空格）保留 1 像素
+        xadvance = advance if advance is not None else source.width + spacing
+        glyphs.append({
+            "char": char,
+            "image": source.crop(bbox),
+            "xoffset": bbox[0] + (xadvance - source.width) // 2 if advance is not None else bbox[0],
+            "yoffset": bbox[1],
+            "xadvance": xadvance,
+            "source_height": source.height,
+        })
+    line_height = max(g["source_height"] for g in glyphs)
+
+    # 按高度从高到低逐行摆放（shelf 装箱），字形数量少，不需要 MaxRects
+    x = y = shelf_h = page_w = 0
+    for g in sorted(glyphs, key=lambda g: g["image"].height, reverse=True):
+        w, h = g["image"].size
+        if x and x + w > MAX_PAGE_WIDTH:
+            x, y = 0, y + shelf_h + GLYPH_PADDING
+            shelf_h = 0
+        g["x"], g["y"] = x, y
+        x += w + GLYPH_PADDING
+        shelf_h = max(shelf_h, h)
+        page_w = max(page_w, x - GLYPH_PADDING)
+    page_h = y + shelf_h
+
+    page = Image.new("RGBA", (page_w, page_h), (0, 0, 0, 0))
+    for g in glyphs:
+        page.paste(g["image"], (g["x"], g["y"]))
+    out_path = Path(output)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    page.save(out_path, format="PNG")
+
+    pairs = auto_kerning(glyphs, line_height, kerning) if kerning is not None else []
+
+    font = ET.Element("font")
+    ET.SubElement(font, "info", face=out_path.stem, size=str(line_height), bold="0", italic="0", charset="",
+                  unicode="1", stretchH="100", smooth="1", aa="1", padding="0,0,0,0",
+                  spacing=f"{GLYPH_PADDING},{GLYPH_PADDING}")
+    ET.SubElement(font, "common", lineHeight=str(line_height), base=str(line_height),
+                  scaleW=str(page_w), scaleH=str(page_h), pages="1", packed="0")
+    pages = ET.SubElement(font, "pages")
+    ET.SubElement(pages, "page", id="0", file=out_path.name)
+    chars_el = ET.SubElement(font, "chars", count=str(len(glyphs)))
+    for g in glyphs:
+        w, h = g["image"].size
+        ET.SubElement(chars_el, "char", id=str(ord(g["char"])), x=str(g["x"]), y=str(g["y"]),
+                      width=str(w), height=str(h), xoffset=str(g["xoffset"]), yoffset=str(g["yoffset"]),
+                      xadvance=str(g["xadvance"]), page="0", chnl="15")
+    kernings = ET.SubElement(font, "kernings", count=str(len(pairs)))
+    for first, second, amount in pairs:
+        ET.SubElement(kernings, "kerning", first=str(ord(first)), second=str(ord(second)), amount=str(amount))
+
+    xml_path = font_xml_path(out_path)
+    ET.indent(font)
+    ET.ElementTree(font).write(xml_path, encoding="utf-8", xml_declaration=True)
+
+    print(f"✓ 字体图集已保存到: {out_path.resolve()}")
+    print(f"  描述文件: {xml_path}")
+    print(f"  字形: {len(glyphs)} 个（{chars}），行高 {line_height}，图集 {page_w}x{page_h}")
+    print(f"  字宽: {'等宽 ' + str(advance) if advance is not None else '按字形宽度 + ' + str(spacing)}"
+          f"，字偶距 {len(pairs)} 对")
+    print(f"  加载方式: scene.load.bitmapFont(key, '{out_path.name}', '{xml_path.name}')")
+    return {"output": str(out_path), "glyphs": len(glyphs), "width": page_w, "height": page_h,
+            "line_height": line_height, "kernings": len(pairs)}
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(parse_cache_flags(sys.argv[1:]))
+
+    args = []
+    options = {}
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ("--advance", "--spacing", "--kerning"):
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            options[arg[2:]] = int(sys.argv[i + 1])
+            i += 2
+        else:
+            args.append(arg)
+            i += 1
+
+    if len(args) < 3:
+        print("用法: python make_bitmap_font.py <输出.png> <字符> <字形图片> [...] [选项]")
+        print("\n把每个字符对应的图片打包成一张图集，并写出同名 .xml（AngelCode BMFont 格式）")
+        print("\n选项:")
+        print("  --advance <n>   固定字宽，字形在字宽内居中（适合计分板数字）")
+        print("  --spacing <n>   非等宽时字形之间的额外间距（默认 0）")
+        print("  --kerning <n>   按字形轮廓自动生成字偶距，使相邻字形的最小间隙为 n 像素")
+        print("  --no-cache      忽略构建缓存，强制重新生成")
+        print("  --profile       剖析各阶段耗时和内存（另有 --profile-json <路径>、--profile-pstats <路径>）")
+        print("\n示例:")
+        print("  python tools/make_bitmap_font.py assets/number_font.png 0123456789 "
+              "assets/number{0,1,2,3,4,5,6,7,8,9}.png --advance 25")
+        sys.exit(1)
+
+    try:
+        make_bitmap_font(args[0], args[1], *args[2:], **options)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
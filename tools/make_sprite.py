@@ -2,16 +2,34 @@ from PIL import Image
 import sys
 from pathlib import Path
 
+from tool_errors import ToolError
+from build_cache import cached_tool, parse_cache_flags
+from profiling import parse_profile_flags, stage
+
+
+@cached_tool("make_sprite", version=1, inputs=("inputs",), outputs=("output",))
 def make_sprite(output, *inputs):
     if len(inputs) != 3:
-        raise ValueError("必须传入 3 张图片文件路径")
+        raise ToolError("必须传入 3 张图片文件路径")
 
     # 打开三张图片
-    imgs = [Image.open(p).convert("RGBA") for p in inputs]
+    imgs = []
+    try:
+        for p in inputs:
+            img = Image.open(p)
+            with stage("decode", pixels=img.width * img.height, nbytes=Path(p).stat().st_size):
+                img.load()
+            with stage("convert", pixels=img.width * img.height):
+                imgs.append(img.convert("RGBA"))
+    except Exception as e:
+        raise ToolError(f"无法打开图片: {e}") from e
 
     # 以第一张为基准尺寸，其他图片统一缩放到相同大小（可按需要去掉这一步）
     base_w, base_h = imgs[0].size
-    resized = [imgs[0]] + [im.resize((base_w, base_h), Image.LANCZOS) for im in imgs[1:]]
+    resized = [imgs[0]]
+    for im in imgs[1:]:
+        with stage("resize", pixels=im.width * im.height):
+            resized.append(im.resize((base_w, base_h), Image.LANCZOS))
 
     # 创建目标雪碧图：横向 3 帧
     sheet_w = base_w * 3
@@ -19,22 +37,33 @@ def make_sprite(output, *inputs):
     sheet = Image.new("RGBA", (sheet_w, sheet_h), (0, 0, 0, 0))
 
     # 依次粘贴
-    for i, im in enumerate(resized):
-        sheet.paste(im, (i * base_w, 0))
+    with stage("paste", pixels=sheet_w * sheet_h):
+        for i, im in enumerate(resized):
+            sheet.paste(im, (i * base_w, 0))
 
     # 保存
     out_path = Path(output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    sheet.save(out_path, format="PNG")
+    with stage("encode", pixels=sheet_w * sheet_h) as s:
+        sheet.save(out_path, format="PNG")
+        s.add(nbytes=out_path.stat().st_size)
     print(f"sprite saved to: {out_path.resolve()}")
     print(f"single frame size: {base_w}x{base_h}, total size: {sheet_w}x{sheet_h}")
+    return {"output": str(out_path), "frame_width": base_w, "frame_height": base_h,
+            "width": sheet_w, "height": sheet_h}
 
 if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(parse_cache_flags(sys.argv[1:]))
+
     # 用法：python make_sprite.py 输出.png 图1.png 图2.png 图3.png
     if len(sys.argv) != 5:
-        print("用法: python make_sprite.py 输出.png 图1.png 图2.png 图3.png")
+        print("用法: python make_sprite.py 输出.png 图1.png 图2.png 图3.png [--no-cache] [--profile]")
         sys.exit(1)
 
     output = sys.argv[1]
     img1, img2, img3 = sys.argv[2], sys.argv[3], sys.argv[4]
-    make_sprite(output, img1, img2, img3)
\ No newline at end of file
+    try:
+        make_sprite(output, img1, img2, img3)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
\ No newline at end of file
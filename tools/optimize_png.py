@@ -0,0 +1,318 @@
+import io
+import os
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, features
+
+from tool_errors import ToolError
+import profiling
+from profiling import parse_profile_flags, stage
+
+
+# 依次尝试的 (zlib 压缩级别, 压缩策略)；Pillow 对非索引色图片逐行自适应选择过滤方式
+ZLIB_SETTINGS = [
+    (9, zlib.Z_DEFAULT_STRATEGY),
+    (9, zlib.Z_FILTERED),
+    (9, zlib.Z_RLE),
+    (9, zlib.Z_HUFFMAN_ONLY),
+    (6, zlib.Z_DEFAULT_STRATEGY),
+]
+# 无损 WebP 编码参数：lossless 模式下 quality 表示压缩力度，method 6/quality 100 只再小约 1%，却慢 10 倍以上；
+# exact 保留完全透明像素的 RGB，解码结果与 PNG 逐像素一致
+WEBP_OPTIONS = {"lossless": True, "quality": 80, "method": 4, "exact": True}
+# 这些目录下是生成的产物（带哈希的发布文件），内容变了文件名就对不上，不做处理
+SKIP_DIRS = ("dist",)
+
+
+def reduced_images(img):
+    """
+    在不改变任何像素（RGBA 完全一致）的前提下可选的存储方式，返回 [(说明, 图像, 额外保存参数), ...]
+
+    - 所有像素都不透明时去掉 alpha 通道
+    - R=G=B 时存为灰度（L / LA）
+    - 不超过 256 种 RGBA 颜色时存为索引色，半透明颜色写入 tRNS（按 alpha 排序，不透明的颜色排在最后，tRNS 可以截短）
+    """
+    rgba = np.asarray(img.convert("RGBA"))
+    alpha = rgba[..., 3]
+    opaque = bool((alpha == 255).all())
+    gray = bool(((rgba[..., 0] == rgba[..., 1]) & (rgba[..., 1] == rgba[..., 2])).all())
+
+    if gray:
+        candidates = [("L", Image.fromarray(rgba[..., 0], "L"), {})] if opaque else \
+            [("LA", Image.fromarray(rgba[..., [0, 3]], "LA"), {})]
+    elif opaque:
+        candidates = [("RGB", Image.fromarray(rgba[..., :3], "RGB"), {})]
+    else:
+        candidates = [("RGBA", Image.fromarray(rgba, "RGBA"), {})]
+
+    codes = rgba.reshape(-1, 4).copy().view(np.uint32).ravel()
+    colors, inverse = np.unique(codes, return_inverse=True)
+    if len(colors) <= 256:
+        entries = colors.view(np.uint8).reshape(-1, 4)
+        order = np.argsort(entries[:, 3], kind="stable")
+        remap = np.empty(len(order), dtype=np.uint8)
+        remap[order] = np.arange(len(order))
+        entries = entries[order]
+        paletted = Image.fromarray(remap[inverse].reshape(alpha.shape), "P")
+        paletted.putpalette(entries[:, :3].tobytes())
+        extra = {}
+        translucent = int((entries[:, 3] < 255).sum())
+        if translucent:
+            extra["transparency"] = entries[:translucent, 3].tobytes()
+        candidates.append((f"P{len(colors)}", paletted, extra))
+    return candidates, rgba
+
+
+def encode_png(img, level, strategy, **extra):
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=level, compress_type=strategy, **extra)
+    return buf.getvalue()
+
+
+def _decoded(data):
+    with Image.open(io.BytesIO(data)) as img:
+        return np.asarray(img.convert("RGBA"))
+
+
+def near_lossless(rgba, bits):
+    """把可见像素的 RGB 舍入到 2**bits 的倍数（每通道误差不超过 2**(bits-1)），alpha 不变"""
+    if bits <= 0:
+        return rgba
+    step = 1 << bits
+    rgb = rgba[..., :3].astype(np.int16)
+    rounded = np.clip((rgb + step // 2) // step * step, 0, 255).astype(np.uint8)
+    out = rgba.copy()
+    visible = rgba[..., 3] > 0
+    out[visible, :3] = rounded[visible]
+    return out
+
+
+def optimize_file(path, webp=False, near_lossless_bits=0, dry_run=False):
+    """
+    无损重新编码单个 PNG，保留最小的结果
+
+    对每种可选的存储方式（见 reduced_images）尝试 ZLIB_SETTINGS 中的每种压缩参数，
+    解码校验像素完全一致后，比原文件小才覆盖原文件。webp 为 True 时另外写出同名 .webp
+    （无损；near_lossless_bits > 0 时先对 RGB 做近无损舍入），仅在比 PNG 小时保留。
+    返回结果 dict：原大小、新大小、选中的编码、WebP 大小
+    """
+    path = Path(path)
+    original = path.read_bytes()
+    try:
+        with Image.open(io.BytesIO(original)) as img:
+            if img.format != "PNG":
+                raise ToolError(f"不是 PNG 文件: {path}")
+            if img.mode not in ("1", "L", "LA", "P", "PA", "RGB", "RGBA"):
+                raise ToolError(f"不支持的模式 {img.mode}: {path}")
+            with stage("decode", pixels=img.width * img.height, nbytes=len(original)):
+                img.load()
+            icc = img.info.get("icc_profile")
+    except OSError as e:
+        raise ToolError(f"无法打开图片: {path} ({e})")
+
+    candidates, rgba = reduced_images(img)
+    if icc:
+        for _, _, extra in candidates:
+            extra["icc_profile"] = icc
+
+    results = []
+    for label, candidate, extra in candidates:
+        for level, strategy in ZLIB_SETTINGS:
+            with stage("encode", pixels=candidate.width * candidate.height) as s:
+                data = encode_png(candidate, level, strategy, **extra)
+                s.add(nbytes=len(data))
+            results.append((len(data), f"{label} z{level}/s{strategy}", data))
+    results.sort(key=lambda r: r[0])
+
+    best_size, best_label, best = len(original), "原文件", None
+    for size, label, data in results:
+        if size >= best_size:
+            break
+        with stage("verify", pixels=img.width * img.height, nbytes=size):
+            same = np.array_equal(_decoded(data), rgba)
+        if same:
+            best_size, best_label, best = size, label, data
+            break
+
+    if best is not None and not dry_run:
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(best)
+        os.replace(tmp, path)
+
+    result = {
+        "path": str(path),
+        "before": len(original),
+        "after": best_size,
+        "encoding": best_label,
+        "webp": None,
+    }
+
+    if webp:
+        source = near_lossless(rgba, near_lossless_bits)
+        buf = io.BytesIO()
+        extra = {"icc_profile": icc} if icc else {}
+        with stage("webp", pixels=img.width * img.height) as s:
+            Image.fromarray(source, "RGBA").save(buf, format="WEBP", **WEBP_OPTIONS, **extra)
+            s.add(nbytes=buf.tell())
+        with stage("verify", pixels=img.width * img.height, nbytes=buf.tell()):
+            same = np.array_equal(_decoded(buf.getvalue()), source)
+        if not same:
+            raise ToolError(f"WebP 解码结果与原图不一致: {path}")
+        webp_path = path.with_suffix(".webp")
+        if buf.tell() < best_size:
+            if not dry_run:
+                webp_path.write_bytes(buf.getvalue())
+            result["webp"] = buf.tell()
+        elif webp_path.exists() and not dry_run:
+            # 旧的 WebP 已经不比 PNG 小，删掉以免加载到过期内容
+            webp_path.unlink()
+    return result
+
+
+def find_pngs(target):
+    """目标为文件时返回它本身；为目录时递归列出所有 PNG（跳过 SKIP_DIRS），按路径排序"""
+    target = Path(target)
+    if target.is_file():
+        return [target]
+    if not target.is_dir():
+        raise ToolError(f"文件或目录不存在: {target}")
+    return sorted(p for p in target.rglob("*")
+                  if p.is_file() and p.suffix.lower() == ".png"
+                  and not any(part in SKIP_DIRS for part in p.relative_to(target).parts))
+
+
+def _optimize_one(path, webp, near_lossless_bits, dry_run, profile=False):
+    """
+    工作进程入口：任何异常都在这里捕获，一个坏文件不会影响同一进程池里的其他文件
+
+    返回 (是否成功, 结果 dict 或错误信息, --profile 的阶段记录)
+    """
+    if profile:
+        profiling.enable()
+    try:
+        with profiling.track(path):
+            return True, optimize_file(path, webp, near_lossless_bits, dry_run), profiling.take_records()
+    except ToolError as e:
+        return False, str(e), profiling.take_records()
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}", profiling.take_records()
+
+
+def optimize_pngs(targets, jobs=None, webp=False, near_lossless_bits=0, dry_run=False, max_bytes=None):
+    """
+    多进程无损优化多个文件/目录下的 PNG，打印每个文件和总计节省的字节数
+
+    max_bytes 为单文件大小目标：优化后（有 WebP 时取两者较小者）仍超过目标的文件会列出来。
+    返回 (结果列表, 失败列表, 超过目标的结果列表)
+    """
+    if webp and not features.check("webp"):
+        raise ToolError("当前 Pillow 不支持 WebP 编码")
+    if not 0 <= near_lossless_bits <= 4:
+        raise ToolError("--near-lossless 取值范围为 0-4")
+
+    paths = []
+    for target in targets:
+        paths.extend(find_pngs(target))
+    jobs = jobs or os.cpu_count() or 1
+
+    print(f"共 {len(paths)} 个 PNG，并行进程数: {jobs}" + ("（试运行，不写文件）" if dry_run else ""))
+    results, failures = [], []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(_optimize_one, str(p), webp, near_lossless_bits, dry_run, profiling.enabled()): p
+                   for p in paths}
+        for future in as_completed(futures):
+            ok, result, records = future.result()
+            profiling.merge_records(records)
+            if not ok:
+                failures.append((futures[future], result))
+                print(f"  ✗ {futures[future]}: {result}")
+                continue
+            results.append(result)
+            saved = result["before"] - result["after"]
+            line = f"  {result['path']}: {result['before']:,} -> {result['after']:,} bytes"
+            line += f"（-{saved / result['before']:.1%}，{result['encoding']}）" if saved else "（已是最小）"
+            if result["webp"] is not None:
+                line += f"，WebP {result['webp']:,} bytes"
+            print(line)
+
+    results.sort(key=lambda r: r["path"])
+    before = sum(r["before"] for r in results)
+    after = sum(r["after"] for r in results)
+    print("")
+    print(f"PNG 总计: {before:,} -> {after:,} bytes，节省 {before - after:,} bytes"
+          f"（{(before - after) / before if before else 0:.1%}）")
+    if webp:
+        written = [r for r in results if r["webp"] is not None]
+        webp_saved = sum(r["after"] - r["webp"] for r in written)
+        print(f"WebP: {len(written)} 个文件比 PNG 小，再节省 {webp_saved:,} bytes")
+
+    over = []
+    if max_bytes is not None:
+        over = [r for r in results if min(r["after"], r["webp"] or r["after"]) > max_bytes]
+        for r in over:
+            print(f"  超过目标 {max_bytes:,} bytes: {r['path']} ({r['after']:,} bytes)")
+    return results, failures, over
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(sys.argv[1:])
+
+    args = []
+    jobs = None
+    webp = False
+    near_lossless_bits = 0
+    dry_run = False
+    max_bytes = None
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ("--jobs", "-j", "--near-lossless", "--max-bytes"):
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            value = int(sys.argv[i + 1])
+            if arg == "--near-lossless":
+                near_lossless_bits = value
+                webp = True
+            elif arg == "--max-bytes":
+                max_bytes = value
+            else:
+                jobs = value
+            i += 2
+        elif arg == "--webp":
+            webp = True
+            i += 1
+        elif arg == "--dry-run":
+            dry_run = True
+            i += 1
+        else:
+            args.append(arg)
+            i += 1
+
+    if not args:
+        print("用法: python optimize_png.py <文件或目录> [...] [--jobs <进程数>] [--webp] [--near-lossless <位数>]")
+        print("                              [--max-bytes <字节数>] [--dry-run]")
+        print("\n无损重新编码 PNG（去掉多余的 alpha、转灰度/索引色、尝试多种 zlib 参数），更小时覆盖原文件")
+        print("\n参数:")
+        print("  --jobs, -j <进程数>: 并行进程数（默认等于 CPU 核数）")
+        print("  --webp: 同时写出无损 WebP（同名 .webp），仅在比 PNG 小时保留")
+        print("  --near-lossless <位数>: WebP 先把 RGB 舍入到 2^位数 的倍数（1-4，隐含 --webp），PNG 仍为无损")
+        print("  --max-bytes <字节数>: 单文件大小目标，优化后仍超过的文件会列出，并以非 0 状态码退出")
+        print("  --dry-run: 只报告能节省多少，不写文件")
+        print("\n示例:")
+        print("  python tools/optimize_png.py assets")
+        print("  python tools/optimize_png.py assets --webp --max-bytes 1048576")
+        sys.exit(1)
+
+    try:
+        results, failures, over = optimize_pngs(args, jobs, webp, near_lossless_bits, dry_run, max_bytes)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+
+    if failures or over:
+        sys.exit(1)
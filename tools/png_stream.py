@@ -0,0 +1,248 @@
+import io
+import numpy as np
+import struct
+import zlib
+from pathlib import Path
+
+from PIL import Image
+
+from profiling import stage
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG 颜色类型与每像素字节数
+_COLOR_TYPES = {"L": (0, 1), "RGB": (2, 3), "RGBA": (6, 4), "P": (3, 1)}
+
+
+def _chunk(tag, data):
+    """组装一个 PNG chunk：长度 + 类型 + 数据 + CRC"""
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def filter_rows(rows, prev_row, bpp):
+    """
+    对若干行像素做 PNG 行过滤（逐行在 None/Sub/Up/Average/Paeth 中自适应选择）
+
+    参数:
+        rows: (行数, 每行字节数) 的 uint8 数组
+        prev_row: 上一行（第一行之前为全 0）
+        bpp: 每像素字节数
+    返回带过滤类型字节的 (行数, 1 + 每行字节数) uint8 数组。
+    选择规则与 libpng 相同：取过滤后按有符号字节求绝对值之和最小的方式。
+    """
+    x = rows.astype(np.int16)
+    up = np.vstack([prev_row[None, :], rows[:-1]]).astype(np.int16)
+    left = np.zeros_like(x)
+    left[:, bpp:] = x[:, :-bpp]
+    up_left = np.zeros_like(x)
+    up_left[:, bpp:] = up[:, :-bpp]
+
+    # Paeth 预测
+    p = left + up - up_left
+    pa = np.abs(p - left)
+    pb = np.abs(p - up)
+    pc = np.abs(p - up_left)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+
+    # 逐个计算候选过滤结果，按有符号字节绝对值之和保留每行最优的一种（不同时保存全部候选）
+    out = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+    best_cost = None
+    for filter_type, pred in enumerate((0, left, up, (left + up) >> 1, paeth)):
+        filtered = (x - pred).astype(np.uint8)
+        cost = np.abs(filtered.view(np.int8).astype(np.int16)).sum(axis=1)
+        if best_cost is None:
+            better = np.ones(rows.shape[0], dtype=bool)
+            best_cost = cost
+        else:
+            better = cost < best_cost
+            best_cost = np.minimum(cost, best_cost)
+        out[better, 0] = filter_type
+        out[better, 1:] = filtered[better]
+    return out
+
+
+class PngStreamWriter:
+    """
+    逐行流式写 PNG（8 位 L/RGB/RGBA/P，不交错）
+
+    调用 write_rows() 按从上到下的顺序分批写入像素行，写完所有行后 close()。
+    整张图片不会同时存在于内存中，适合拼接特别高的雪碧图。
+    P 模式需要 palette（RGB 字节），可选 transparency（各调色板项的 alpha 字节，写入 tRNS）；
+    索引色按 PNG 规范的建议不做行过滤
+    """
+
+    # 每次过滤/压缩的最大行数，限制临时数组的大小
+    BATCH_ROWS = 16
+
+    def __init__(self, path, width, height, mode="RGBA", level=6, palette=None, transparency=None):
+        if mode not in _COLOR_TYPES:
+            raise ValueError(f"不支持的模式: {mode}")
+        if mode == "P" and not palette:
+            raise ValueError("P 模式需要调色板")
+        color_type, self.bpp = _COLOR_TYPES[mode]
+        self.mode = mode
+        self.path = Path(path)
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._prev_row = np.zeros(width * self.bpp, dtype=np.uint8)
+        self._compressor = zlib.compressobj(level)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "wb")
+        self._file.write(PNG_SIGNATURE)
+        ihdr = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+        self._file.write(_chunk(b"IHDR", ihdr))
+        if mode == "P":
+            self._file.write(_chunk(b"PLTE", bytes(palette)))
+            if transparency:
+                self._file.write(_chunk(b"tRNS", bytes(transparency)))
+
+    def write_rows(self, pixels):
+        """写入若干行像素，pixels 为 (行数, 宽, 通道数) 或 (行数, 宽*通道数) 的 uint8 数组"""
+        rows = np.ascontiguousarray(pixels, dtype=np.uint8).reshape(-1, self.width * self.bpp)
+        if self.rows_written + rows.shape[0] > self.height:
+            raise ValueError("写入的行数超过了图片高度")
+
+        with stage("encode", pixels=rows.shape[0] * self.width) as s:
+            for start in range(0, rows.shape[0], self.BATCH_ROWS):
+                batch = rows[start:start + self.BATCH_ROWS]
+                if self.mode == "P":
+                    filtered = np.hstack([np.zeros((batch.shape[0], 1), dtype=np.uint8), batch])
+                else:
+                    filtered = filter_rows(batch, self._prev_row, self.bpp)
+                self._prev_row = batch[-1].copy()
+                data = self._compressor.compress(filtered.tobytes())
+                s.add(nbytes=len(data))
+                self._write_idat(data)
+        self.rows_written += rows.shape[0]
+
+    def _write_idat(self, data):
+        if data:
+            self._file.write(_chunk(b"IDAT", data))
+
+    def close(self):
+        if self._file is None:
+            return
+        if self.rows_written != self.height:
+            self._file.close()
+            self._file = None
+            raise ValueError(f"只写入了 {self.rows_written}/{self.height} 行")
+        self._write_idat(self._compressor.flush())
+        self._file.write(_chunk(b"IEND", b""))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class PngStreamReader:
+    """
+    逐行带流式读 PNG（8 位、不交错），每次只解压、解码一个行带
+
+    IDAT 数据用 zlib 流式解压成带过滤字节的原始行；每个行带连同上一行的解码结果
+    （作为过滤类型 0 的首行，供 Up/Average/Paeth 预测）重新封装成一张小 PNG 交给 Pillow 解码，
+    反过滤仍在 C 代码里完成。PLTE/tRNS 等 IDAT 之前的辅助 chunk 原样带上。
+    不满足条件（16 位、1/2/4 位、交错）时构造函数抛出 ValueError，调用方应退回整图解码
+    """
+
+    # 颜色类型 -> (Pillow 模式, 每像素字节数)
+    _MODES = {0: ("L", 1), 2: ("RGB", 3), 3: ("P", 1), 4: ("LA", 2), 6: ("RGBA", 4)}
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            if self._file.read(8) != PNG_SIGNATURE:
+                raise ValueError("不是 PNG 文件")
+            self._chunks = []
+            while True:
+                length, tag = struct.unpack(">I4s", self._file.read(8))
+                data = self._file.read(length)
+                self._file.read(4)  # CRC
+                if tag == b"IHDR":
+                    self._ihdr = data
+                    width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", data)
+                    if depth != 8 or interlace or color_type not in self._MODES:
+                        raise ValueError("只支持 8 位、不交错的 PNG")
+                elif tag == b"IDAT":
+                    self._pending = data
+                    break
+                elif tag == b"IEND":
+                    raise ValueError("PNG 中没有图像数据")
+                else:
+                    self._chunks.append(_chunk(tag, data))
+        except struct.error:
+            self._file.close()
+            raise ValueError("PNG 文件不完整")
+        except ValueError:
+            self._file.close()
+            raise
+        self.width, self.height = width, height
+        self.mode, self.bpp = self._MODES[color_type]
+        self.stride = width * self.bpp
+
+    def _raw_chunks(self):
+        """依次返回 IDAT 数据（可能分成多个 chunk）"""
+        data, self._pending = self._pending, None
+        while data is not None:
+            yield data
+            length, tag = struct.unpack(">I4s", self._file.read(8))
+            data = self._file.read(length) if tag == b"IDAT" else None
+            self._file.read(4)
+
+    def _decode(self, prev_row, filtered):
+        """把 (可选的) 已解码上一行 + 若干带过滤字节的行封装成小 PNG 并解码，返回 Pillow 图像"""
+        rows = len(filtered) // (self.stride + 1)
+        if prev_row is not None:
+            filtered = b"\x00" + prev_row + filtered
+            rows += 1
+        ihdr = struct.pack(">II", self.width, rows) + self._ihdr[8:]
+        png = (PNG_SIGNATURE + _chunk(b"IHDR", ihdr) + b"".join(self._chunks)
+               + _chunk(b"IDAT", zlib.compress(filtered, 1)) + _chunk(b"IEND", b""))
+        img = Image.open(io.BytesIO(png))
+        img.load()
+        if prev_row is not None:
+            img = img.crop((0, 1, self.width, rows))
+        return img
+
+    def bands(self, band_rows):
+        """逐个返回 (起始行, 行带 RGBA 数组 (行数, 宽, 4))，每个行带最多 band_rows 行"""
+        band_bytes = band_rows * (self.stride + 1)
+        decompressor = zlib.decompressobj()
+        buffer = bytearray()
+        prev_row = None
+        top = 0
+        try:
+            for data in self._raw_chunks():
+                buffer += decompressor.decompress(data)
+                while len(buffer) >= band_bytes or (top < self.height and
+                                                     len(buffer) >= (self.height - top) * (self.stride + 1)):
+                    rows = min(band_rows, self.height - top)
+                    take = rows * (self.stride + 1)
+                    with stage("decode", pixels=rows * self.width):
+                        img = self._decode(prev_row, bytes(buffer[:take]))
+                    del buffer[:take]
+                    prev_row = img.crop((0, rows - 1, self.width, rows)).tobytes()
+                    with stage("convert", pixels=rows * self.width):
+                        band = np.array(img.convert("RGBA"))
+                    yield top, band
+                    top += rows
+                    if top >= self.height:
+                        return
+            if top < self.height:
+                raise ValueError(f"PNG 数据不完整：只解码了 {top}/{self.height} 行")
+        finally:
+            self.close()
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,290 @@
+import atexit
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import resource
+import sys
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+
+# 命令行 --profile / --profile-json / --profile-pstats 控制的全局设置
+_settings = {
+    "enabled": False,
+    "jsonl": None,
+    "pstats": None,
+}
+# 当前处理的文件（批量工具用 track 切换）、开始时间、是否有阶段正在被 cProfile 采样
+_state = {"file": None, "start": None, "cpu_start": None, "profiling": False}
+# (文件, 阶段) -> 统计 dict
+_stats = {}
+# 阶段 -> cProfile.Profile
+_profiles = {}
+_lock = threading.Lock()
+
+# --profile-pstats 时打印的函数条数
+PSTATS_TOP = 15
+
+
+def peak_rss_bytes(children=False):
+    """当前进程（children 为 True 时为已结束子进程中最大的一个）的峰值常驻内存（字节）"""
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def enabled():
+    return _settings["enabled"]
+
+
+def enable(jsonl=None, pstats_path=None):
+    """开启记录（批量工具的工作进程里调用，不注册退出时的报告）"""
+    _settings.update(enabled=True, jsonl=jsonl, pstats=pstats_path)
+    if _state["start"] is None:
+        _state["start"] = time.perf_counter()
+        _state["cpu_start"] = time.process_time()
+
+
+def _record(file, name, calls, wall, cpu, pixels, nbytes, peak, growth):
+    with _lock:
+        s = _stats.setdefault((file, name), {"calls": 0, "wall": 0.0, "cpu": 0.0, "pixels": 0, "bytes": 0,
+                                             "peak_rss": 0, "rss_growth": 0})
+        s["calls"] += calls
+        s["wall"] += wall
+        s["cpu"] += cpu
+        s["pixels"] += pixels
+        s["bytes"] += nbytes
+        s["peak_rss"] = max(s["peak_rss"], peak)
+        s["rss_growth"] = max(s["rss_growth"], growth)
+
+
+class Stage:
+    """
+    一次阶段计时：墙钟时间、当前线程的 CPU 时间、处理的像素数和字节数，以及结束时的进程峰值内存
+    和阶段内峰值内存的增长。像素数/字节数可在创建时给出，也可在阶段内用 add 累加
+    """
+    __slots__ = ("name", "pixels", "bytes", "_wall", "_cpu", "_rss", "_profile")
+
+    def __init__(self, name, pixels=0, nbytes=0):
+        self.name = name
+        self.pixels = pixels
+        self.bytes = nbytes
+        self._profile = None
+
+    def add(self, pixels=0, nbytes=0):
+        self.pixels += pixels
+        self.bytes += nbytes
+
+    def __enter__(self):
+        # cProfile 同一时间只能有一个在运行：只采样主线程里最外层的阶段
+        if _settings["pstats"] and not _state["profiling"] and threading.current_thread() is threading.main_thread():
+            _state["profiling"] = True
+            self._profile = _profiles.setdefault(self.name, cProfile.Profile())
+            self._profile.enable()
+        self._rss = peak_rss_bytes()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        if self._profile is not None:
+            self._profile.disable()
+            _state["profiling"] = False
+        peak = peak_rss_bytes()
+        _record(_state["file"], self.name, 1, wall, cpu, self.pixels, self.bytes, peak, peak - self._rss)
+        return False
+
+
+class _NullStage:
+    """未开启 --profile 时的空阶段，开销只有一次函数调用"""
+
+    def add(self, pixels=0, nbytes=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, pixels=0, nbytes=0):
+    """
+    阶段计时的上下文管理器：with stage("encode") as s: ...; s.add(nbytes=...)
+
+    同名阶段的多次调用（如逐帧解码）累加在一起。阶段之间不要嵌套，否则外层阶段的时间包含内层；
+    线程池里的阶段按各线程分别计时后相加，可能超过总耗时
+    """
+    if not _settings["enabled"]:
+        return _NULL_STAGE
+    return Stage(name, pixels, nbytes)
+
+
+@contextlib.contextmanager
+def track(path):
+    """批量处理时把其间记录的阶段归到 path 这个文件下（未调用时只输出合计）"""
+    previous = _state["file"]
+    _state["file"] = str(path)
+    try:
+        yield
+    finally:
+        _state["file"] = previous
+
+
+def take_records():
+    """取出并清空已记录的阶段（工作进程把它随结果返回给主进程，见 merge_records）"""
+    with _lock:
+        records = [dict(s, file=file, stage=name) for (file, name), s in _stats.items()]
+        _stats.clear()
+    return records
+
+
+def merge_records(records):
+    """合并工作进程返回的阶段记录"""
+    for r in records:
+        _record(r["file"], r["stage"], r["calls"], r["wall"], r["cpu"], r["pixels"], r["bytes"],
+                r["peak_rss"], r["rss_growth"])
+
+
+def summary():
+    """
+    汇总已记录的阶段，返回 (每个文件的记录列表, 按阶段合计的记录列表, 整次运行的合计 dict)
+
+    整次运行的 CPU 时间和峰值内存包含已结束的子进程（批量工具的工作进程）
+    """
+    with _lock:
+        records = [dict(s, file=file, stage=name) for (file, name), s in _stats.items()]
+    per_file = sorted((r for r in records if r["file"] is not None), key=lambda r: (r["file"], -r["wall"]))
+
+    totals = {}
+    for r in records:
+        t = totals.setdefault(r["stage"], {"stage": r["stage"], "calls": 0, "wall": 0.0, "cpu": 0.0,
+                                           "pixels": 0, "bytes": 0, "peak_rss": 0, "rss_growth": 0})
+        for key in ("calls", "wall", "cpu", "pixels", "bytes"):
+            t[key] += r[key]
+        t["peak_rss"] = max(t["peak_rss"], r["peak_rss"])
+        t["rss_growth"] = max(t["rss_growth"], r["rss_growth"])
+    aggregate = sorted(totals.values(), key=lambda t: -t["wall"])
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    run = {
+        "wall": time.perf_counter() - _state["start"],
+        "cpu": time.process_time() - _state["cpu_start"] + children.ru_utime + children.ru_stime,
+        "peak_rss": max(peak_rss_bytes(), peak_rss_bytes(children=True)),
+        "files": len({r["file"] for r in per_file}),
+    }
+    return per_file, aggregate, run
+
+
+def _cell(text, width, left=False):
+    """按显示宽度补齐（中文占两格）"""
+    pad = width - sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+    return text + " " * pad if left else " " * pad + text
+
+
+def _rate(r):
+    return f"{r['pixels'] / 1e6 / r['wall']:8.1f}" if r["pixels"] and r["wall"] else f"{'-':>8}"
+
+
+def print_report(per_file, aggregate, run):
+    mb = 1024 * 1024
+    print("\n性能剖析（--profile）:")
+    if run["files"] > 1:
+        print("  每个文件:")
+        by_file = {}
+        for r in per_file:
+            by_file.setdefault(r["file"], []).append(r)
+        for file, records in by_file.items():
+            hottest = records[0]
+            print(f"    {Path(file).name:40} {sum(r['wall'] for r in records):8.3f}s  "
+                  f"最慢阶段 {hottest['stage']} {hottest['wall']:.3f}s")
+        print("  合计:")
+    print("    " + _cell("阶段", 16, left=True) + "".join(_cell(h, w) for h, w in (
+        ("次数", 6), ("耗时(s)", 10), ("CPU(s)", 9), ("占比", 8), ("Mpx", 9), ("MB", 9), ("Mpx/s", 8),
+        ("峰值内存(MB)", 14))))
+    for r in aggregate:
+        share = r["wall"] / run["wall"] if run["wall"] else 0
+        print(f"    {r['stage']:16}{r['calls']:>6}{r['wall']:>10.3f}{r['cpu']:>9.3f}{share:>8.1%}"
+              f"{r['pixels'] / 1e6:>9.1f}{r['bytes'] / mb:>9.1f}{_rate(r)}"
+              f"{r['peak_rss'] / mb:>10.1f} (+{r['rss_growth'] / mb:.1f})")
+    print(f"    {_cell('总计', 22, left=True)}{run['wall']:>10.3f}{run['cpu']:>9.3f}"
+          f"    峰值内存 {run['peak_rss'] / mb:.1f} MB")
+
+
+def write_jsonl(path, per_file, aggregate, run):
+    """每行一条 JSON：type 为 file（单个文件的阶段）、stage（阶段合计）或 run（整次运行）"""
+    argv = [Path(sys.argv[0]).name] + sys.argv[1:]
+    with open(path, "a", encoding="utf-8") as f:
+        for r in per_file:
+            f.write(json.dumps(dict(r, type="file", argv=argv), ensure_ascii=False) + "\n")
+        for r in aggregate:
+            f.write(json.dumps(dict(r, type="stage", argv=argv), ensure_ascii=False) + "\n")
+        f.write(json.dumps(dict(run, type="run", argv=argv), ensure_ascii=False) + "\n")
+
+
+def dump_hottest(path, aggregate):
+    """把耗时最多且被 cProfile 采样过的阶段写成 pstats 文件，并打印其中累计耗时最多的函数"""
+    for r in aggregate:
+        profile = _profiles.get(r["stage"])
+        if profile is None:
+            continue
+        profile.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(PSTATS_TOP)
+        print(f"\n最慢阶段 {r['stage']} 的 cProfile 结果已保存到: {Path(path).resolve()}"
+              "（采样会拖慢该阶段，上面的耗时偏大）")
+        print(out.getvalue().rstrip())
+        return
+
+
+def report():
+    """打印报告并写出 --profile-json / --profile-pstats 文件（parse_profile_flags 注册为退出时执行）"""
+    if not _settings["enabled"]:
+        return
+    per_file, aggregate, run = summary()
+    print_report(per_file, aggregate, run)
+    if _settings["jsonl"]:
+        write_jsonl(_settings["jsonl"], per_file, aggregate, run)
+        print(f"\n✓ 剖析数据已追加到: {Path(_settings['jsonl']).resolve()}")
+    if _settings["pstats"]:
+        dump_hottest(_settings["pstats"], aggregate)
+
+
+def parse_profile_flags(argv):
+    """
+    从命令行参数中取出剖析相关选项并开启记录，返回剩余参数
+
+    支持 --profile（退出时打印各阶段耗时）、--profile-json <路径>（追加 JSON Lines）和
+    --profile-pstats <路径>（对最慢的阶段保存 cProfile 结果）；后两者隐含 --profile
+    """
+    rest = []
+    profile = False
+    jsonl = None
+    pstats_path = None
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "--profile":
+            profile = True
+        elif arg in ("--profile-json", "--profile-pstats") and i + 1 < len(argv):
+            if arg == "--profile-json":
+                jsonl = argv[i + 1]
+            else:
+                pstats_path = argv[i + 1]
+            i += 1
+        else:
+            rest.append(arg)
+        i += 1
+    if profile or jsonl or pstats_path:
+        enable(jsonl, pstats_path)
+        atexit.register(report)
+    return rest
@@ -2,8 +2,51 @@ from PIL import Image
 import sys
 from pathlib import Path
 
+from tool_errors import ToolError
+from build_cache import cached_tool, parse_cache_flags
+import gif_index
+from gif_writer import map_frames, print_delta_stats, quantize_frame, save_gif
+from profiling import parse_profile_flags, stage
 
-def resize_gif(input_path, output_path=None, width=None, height=None, scale=None):
+
+def compute_target_size(orig_w, orig_h, width=None, height=None, scale=None):
+    """
+    按等比缩放规则计算目标尺寸，返回 (缩放因子, 新宽, 新高)
+
+    width/height 同时指定时取更小的缩放因子（防止变形），scale 优先级最低。
+    参数无效时抛出 ValueError。
+    """
+    if width and height:
+        # 两个都指定，选择更小的缩放因子（防止变形）
+        scale_w = width / orig_w
+        scale_h = height / orig_h
+        scale_factor = min(scale_w, scale_h)
+    elif width:
+        scale_factor = width / orig_w
+    elif height:
+        scale_factor = height / orig_h
+    elif scale:
+        scale_factor = scale
+    else:
+        raise ValueError("必须指定 width、height 或 scale 中的至少一个")
+
+    # 确保缩放因子有效
+    if scale_factor <= 0:
+        raise ValueError("缩放因子必须大于 0")
+
+    new_w = int(orig_w * scale_factor)
+    new_h = int(orig_h * scale_factor)
+
+    # 至少 1 像素
+    new_w = max(1, new_w)
+    new_h = max(1, new_h)
+
+    return scale_factor, new_w, new_h
+
+
+@cached_tool("resize_gif", version=2, inputs=("input_path",), outputs=("output_path",), ignore=("jobs",))
+def resize_gif(input_path, output_path=None, width=None, height=None, scale=None,
+               jobs=None, reducing_gap=None, delta=False):
     """
     按比例缩放 GIF，保持原始宽高比
     
@@ -14,6 +57,15 @@ def resize_gif(input_path, output_path=None, width=None, height=None, scale=None
         height: 目标高度（像素）。如果指定此项，宽度会自动计算
         scale: 缩放因子（0-1）。例如 0.5 表示缩小到 50%
                优先级低于 width/height
+        jobs: 缩放和量化的并行线程数（None 表示 CPU 核数，在进程池的工作进程里为 1；1 表示串行）；解码始终按顺序进行
+        reducing_gap: 大倍数缩小的快速路径（见 Pillow Image.resize），例如 2.0 表示先用
+                      reduce() 按整数倍盒式缩小到目标尺寸的 2 倍以内，再做 LANCZOS；
+                      None 表示直接 LANCZOS（结果与旧版本一致）
+        delta: 是否以差分矩形方式写出（只编码每帧变化的区域，见 gif_writer.write_delta_gif）；
+               默认每帧全尺寸写出（在本仓库的 GIF 上差分只小 0.1%–0.2%）
+
+    返回包含输出路径、尺寸和文件大小的 dict；尺寸无变化时返回 None，
+    出错时抛出 ToolError
     """
     input_path = Path(input_path)
     
@@ -22,53 +74,25 @@ def resize_gif(input_path, output_path=None, width=None, height=None, scale=None
     else:
         output_path = Path(output_path)
     
-    # 打开 GIF
-    try:
-        gif = Image.open(input_path)
-    except Exception as e:
-        print(f"错误：无法打开 GIF 文件: {e}")
-        sys.exit(1)
+    # 从帧索引读取尺寸、帧数和每帧时长（不解码）
+    info = gif_index.gif_info(input_path)
+    n_frames = info["n_frames"]
+    durations = info["durations"]
     
-    # 检查是否为动画 GIF
-    is_animated = hasattr(gif, 'is_animated') and gif.is_animated
-    n_frames = gif.n_frames if is_animated else 1
-    
-    orig_w, orig_h = gif.size
+    orig_w, orig_h = info["size"]
     aspect_ratio = orig_w / orig_h
     
     print(f"输入文件: {input_path}")
     print(f"原始尺寸: {orig_w}x{orig_h}")
-    print(f"帧数: {n_frames}")
+    print(f"帧数: {n_frames}，总时长: {sum(durations) / 1000:.2f}s")
     print(f"宽高比: {aspect_ratio:.2f}")
     
     # 计算目标尺寸
-    if width and height:
-        # 两个都指定，选择更小的缩放因子（防止变形）
-        scale_w = width / orig_w
-        scale_h = height / orig_h
-        scale_factor = min(scale_w, scale_h)
-    elif width:
-        scale_factor = width / orig_w
-    elif height:
-        scale_factor = height / orig_h
-    elif scale:
-        scale_factor = scale
-    else:
-        print("错误：必须指定 width、height 或 scale 中的至少一个")
-        sys.exit(1)
-    
-    # 确保缩放因子有效
-    if scale_factor <= 0:
-        print("错误：缩放因子必须大于 0")
-        sys.exit(1)
-    
-    new_w = int(orig_w * scale_factor)
-    new_h = int(orig_h * scale_factor)
-    
-    # 至少 1 像素
-    new_w = max(1, new_w)
-    new_h = max(1, new_h)
-    
+    try:
+        scale_factor, new_w, new_h = compute_target_size(orig_w, orig_h, width, height, scale)
+    except ValueError as e:
+        raise ToolError(str(e)) from e
+
     print(f"缩放因子: {scale_factor:.2%}")
     print(f"新尺寸: {new_w}x{new_h}")
     
@@ -78,38 +102,19 @@ def resize_gif(input_path, output_path=None, width=None, height=None, scale=None
         return
     
     # 缩放所有帧
-    resized_frames = []
-    durations = []
-    
-    for i in range(n_frames):
-        gif.seek(i)
-        frame = gif.convert("RGBA")
-        
+    # GIF 的帧处置要求按顺序解码；缩放和保存前的量化逐帧独立，交给线程池并行
+    def resize_frame(frame):
         # 使用高质量的 LANCZOS 缩放
-        resized = frame.resize((new_w, new_h), Image.LANCZOS)
-        resized_frames.append(resized)
-        
-        # 获取帧持续时间
-        duration = gif.info.get('duration', 100)
-        durations.append(duration)
-    
+        with stage("resize", pixels=frame.width * frame.height):
+            resized = frame.resize((new_w, new_h), Image.LANCZOS, reducing_gap=reducing_gap)
+        return quantize_frame(resized)
+
+    decoded = (frame for frame, _ in gif_index.iter_frames(input_path))
+    resized_frames = map_frames(resize_frame, decoded, jobs)
+
     # 保存缩放后的 GIF
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    if len(resized_frames) == 1:
-        # 单帧图像
-        resized_frames[0].save(output_path, format="GIF")
-    else:
-        # 动画 GIF
-        resized_frames[0].save(
-            output_path,
-            format="GIF",
-            save_all=True,
-            append_images=resized_frames[1:],
-            duration=durations,
-            loop=gif.info.get('loop', 0),
-            disposal=2  # 清除前一帧
-        )
+    stats = save_gif(resized_frames, output_path, durations, info["loop"] or 0, delta=delta)
     
     # 计算文件大小变化
     orig_size = input_path.stat().st_size
@@ -124,9 +129,23 @@ def resize_gif(input_path, output_path=None, width=None, height=None, scale=None
         print(f"  节省空间: {saved:,} bytes ({saved_percent:.1f}%)")
     else:
         print(f"  增加大小: {abs(saved):,} bytes ({abs(saved_percent):.1f}%)")
+    print_delta_stats(stats, n_frames)
+
+    return {
+        "output": str(output_path),
+        "scale_factor": scale_factor,
+        "width": new_w,
+        "height": new_h,
+        "frames": n_frames,
+        "orig_size": orig_size,
+        "new_size": new_size,
+        "delta": stats,
+    }
 
 
 if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(parse_cache_flags(sys.argv[1:]))
+
     if len(sys.argv) < 2:
         print("用法: python resize_gif.py <输入GIF文件> [输出GIF文件] [--width <宽> | --height <高> | --scale <缩放因子>]")
         print("\n参数:")
@@ -135,11 +154,17 @@ if __name__ == "__main__":
         print("  --width <宽>: 目标宽度（像素），高度自动计算")
         print("  --height <高>: 目标高度（像素），宽度自动计算")
         print("  --scale <缩放因子>: 缩放因子，如 0.5 表示缩小到 50%")
+        print("  --jobs, -j <线程数>: 缩放和量化的并行线程数（默认等于 CPU 核数，1 表示串行）")
+        print("  --reducing-gap <n>: 大倍数缩小的快速路径，先按整数倍盒式缩小再 LANCZOS（如 2.0，略损画质）")
+        print("  --delta: 只写出每帧变化的矩形区域（默认每帧全尺寸写出；文件通常只小 0.1%–0.2%）")
+        print("  --no-cache: 忽略构建缓存，强制重新生成")
+        print("  --profile: 剖析各阶段耗时和内存（另有 --profile-json <路径>、--profile-pstats <路径>）")
         print("\n示例:")
         print("  python resize_gif.py input.gif --scale 0.5")
         print("  python resize_gif.py input.gif output.gif --width 100")
         print("  python resize_gif.py input.gif output.gif --height 200")
         print("  python resize_gif.py input.gif output.gif --scale 2")
+        print("  python resize_gif.py input.gif output.gif --scale 0.25 --reducing-gap 2 --jobs 8")
         sys.exit(1)
     
     input_path = sys.argv[1]
@@ -147,6 +172,9 @@ if __name__ == "__main__":
     width = None
     height = None
     scale = None
+    jobs = None
+    reducing_gap = None
+    delta = False
     
     # 解析参数
     i = 2
@@ -174,10 +202,34 @@ if __name__ == "__main__":
             else:
                 print(f"错误：{arg} 需要一个值")
                 sys.exit(1)
+        elif arg in ['--jobs', '-j']:
+            if i + 1 < len(sys.argv):
+                jobs = int(sys.argv[i + 1])
+                i += 2
+            else:
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+        elif arg == '--reducing-gap':
+            if i + 1 < len(sys.argv):
+                reducing_gap = float(sys.argv[i + 1])
+                i += 2
+            else:
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+        elif arg == '--delta':
+            delta = True
+            i += 1
+        elif arg == '--no-delta':
+            delta = False
+            i += 1
         else:
             # 假设是输出文件路径
             if output_path is None:
                 output_path = arg
             i += 1
     
-    resize_gif(input_path, output_path, width, height, scale)
+    try:
+        resize_gif(input_path, output_path, width, height, scale, jobs, reducing_gap, delta)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
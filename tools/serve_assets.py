@@ -0,0 +1,410 @@
+import asyncio
+import email.utils
+import gzip
+import mimetypes
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from tool_errors import ToolError
+from build_cache import cache_dir, file_hash
+from build_manifest import HASH_LENGTH
+from load_test import raise_fd_limit
+
+
+DEFAULT_PORT = 8080
+ROOT = Path(__file__).resolve().parent.parent
+
+# 预压缩的文件类型（图片、音频本身已压缩，gzip 没有收益）
+COMPRESSIBLE = {".html", ".js", ".mjs", ".css", ".json", ".svg", ".xml", ".fnt", ".txt", ".map", ".md"}
+# 小于这个字节数的文件不压缩（省下的字节抵不上多一个响应头）
+GZIP_MIN_BYTES = 1024
+# 压缩后至少要小这么多才使用 gzip 版本
+GZIP_MIN_SAVING = 0.1
+GZIP_LEVEL = 9
+
+# build_manifest.py --hash 的输出目录和文件名（walk.<哈希>.png），内容不变名字就不变
+IMMUTABLE_DIRS = ("assets/dist/",)
+_HASHED_NAME_RE = re.compile(rf"\.[0-9a-f]{{{HASH_LENGTH}}}\.\w+$")
+# 与 vercel.json 相同：带哈希的资源长期缓存，其余每次用 ETag 重新验证
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# 空闲连接保持时间（秒）和请求头上限
+KEEPALIVE_TIMEOUT = 15
+MAX_HEADER_BYTES = 16 * 1024
+SKIP_DIRS = (".git", ".asset_cache", "node_modules", "__pycache__")
+# 请求行或请求头无法解析时的回复，之后关闭连接
+BAD_REQUEST = b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+CONTENT_TYPES = {
+    ".js": "text/javascript; charset=utf-8",
+    ".mjs": "text/javascript; charset=utf-8",
+    ".json": "application/json; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".fnt": "application/xml; charset=utf-8",
+    ".webp": "image/webp",
+}
+REASONS = {200: "OK", 206: "Partial Content", 304: "Not Modified", 400: "Bad Request", 403: "Forbidden",
+           404: "Not Found", 405: "Method Not Allowed", 416: "Range Not Satisfiable"}
+
+# 相对路径 -> 文件信息（见 build_entry），文件的修改时间或大小变化时重新计算
+_entries = {}
+_counts = Counter()
+
+
+def gzip_dir():
+    return cache_dir() / "gzip"
+
+
+def build_entry(path):
+    """
+    计算文件的 ETag（内容 sha256）和 gzip 版本
+
+    gzip 固定 mtime=0，同样的内容总是得到同样的字节，所以 gzip 版本也有稳定的强 ETag；
+    压缩结果按内容哈希保存在 .asset_cache/gzip/，重启后不用重新压缩
+    """
+    st = path.stat()
+    digest = file_hash(path)
+    entry = {
+        "sig": (st.st_mtime_ns, st.st_size),
+        "size": st.st_size,
+        "etag": f'"{digest[:32]}"',
+        "last_modified": email.utils.formatdate(st.st_mtime, usegmt=True),
+        "gzip": None,
+    }
+    if path.suffix.lower() in COMPRESSIBLE and st.st_size >= GZIP_MIN_BYTES:
+        cached = gzip_dir() / f"{digest}.gz"
+        if cached.exists():
+            data = cached.read_bytes()
+        else:
+            data = gzip.compress(path.read_bytes(), GZIP_LEVEL, mtime=0)
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cached.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, cached)
+        if len(data) <= st.st_size * (1 - GZIP_MIN_SAVING):
+            entry["gzip"] = data
+            entry["gzip_etag"] = f'"{digest[:32]}-gz"'
+    return entry
+
+
+def get_entry(path, rel):
+    """返回文件信息，修改时间和大小都没变时直接用缓存"""
+    st = path.stat()
+    entry = _entries.get(rel)
+    if entry is None or entry["sig"] != (st.st_mtime_ns, st.st_size):
+        entry = _entries[rel] = build_entry(path)
+    return entry
+
+
+def precompress(root, jobs=None):
+    """启动时为所有可压缩文件计算 ETag 和 gzip 版本，返回 (文件数, 原始字节数, gzip 字节数)"""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+        for name in filenames:
+            path = Path(dirpath) / name
+            if path.suffix.lower() in COMPRESSIBLE and not name.startswith("."):
+                paths.append(path)
+
+    def one(path):
+        return get_entry(path, path.relative_to(root).as_posix())
+
+    # zlib 压缩时释放 GIL，线程池即可并行
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        entries = list(pool.map(one, paths))
+    compressed = [e for e in entries if e["gzip"] is not None]
+    return len(compressed), sum(e["size"] for e in compressed), sum(len(e["gzip"]) for e in compressed)
+
+
+def cache_control(rel):
+    if rel.startswith(IMMUTABLE_DIRS) or _HASHED_NAME_RE.search(rel):
+        return IMMUTABLE
+    return REVALIDATE
+
+
+def content_type(path):
+    suffix = path.suffix.lower()
+    if suffix in CONTENT_TYPES:
+        return CONTENT_TYPES[suffix]
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+def etag_matches(header, etags):
+    """If-None-Match（弱比较：忽略 W/ 前缀）"""
+    if header.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return any(etag in tags for etag in etags)
+
+
+def accepts_gzip(header):
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            q = params.strip()
+            if not q.startswith("q="):
+                return True
+            try:
+                return float(q[2:]) != 0
+            except ValueError:
+                # q 值格式不对时按未指定处理（q=1）
+                return True
+    return False
+
+
+def parse_range(header, size):
+    """
+    解析单个 bytes 范围，返回 (起, 止)（含止）；无法满足时返回 "unsatisfiable"；
+    格式不对或多段范围返回 None（按规范忽略，回复完整内容）
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first == "":
+            # 后缀范围：最后 N 个字节
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def resolve(root, target):
+    """URL 路径 -> (文件路径, 相对路径)；越出根目录或访问隐藏文件时返回 None"""
+    parts = [p for p in unquote(urlsplit(target).path).split("/") if p]
+    if any(p.startswith(".") or "\\" in p for p in parts):
+        return None
+    path = root.joinpath(*parts)
+    if path.is_dir():
+        path = path / "index.html"
+    return path, path.relative_to(root).as_posix()
+
+
+async def respond(root, method, target, headers, writer):
+    """处理一个请求，返回 (状态码, 发送的正文字节数)"""
+    loop = asyncio.get_running_loop()
+
+    def send_head(status, fields):
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}", f"Date: {email.utils.formatdate(usegmt=True)}"]
+        lines += [f"{k}: {v}" for k, v in fields.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    def send_error(status, extra=None):
+        body = f"{status} {REASONS[status]}\n".encode()
+        send_head(status, dict({"Content-Type": "text/plain; charset=utf-8", "Content-Length": len(body)},
+                               **(extra or {})))
+        if method != "HEAD":
+            writer.write(body)
+        return status, 0
+
+    if method not in ("GET", "HEAD"):
+        return send_error(405, {"Allow": "GET, HEAD"})
+    resolved = resolve(root, target)
+    if resolved is None:
+        return send_error(403)
+    path, rel = resolved
+    try:
+        # 哈希和压缩在线程里做，不阻塞其它连接
+        entry = await loop.run_in_executor(None, get_entry, path, rel)
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return send_error(404)
+
+    fields = {"Content-Type": content_type(path), "Cache-Control": cache_control(rel),
+              "Last-Modified": entry["last_modified"], "Accept-Ranges": "bytes"}
+    if entry["gzip"] is not None:
+        fields["Vary"] = "Accept-Encoding"
+    use_gzip = entry["gzip"] is not None and accepts_gzip(headers.get("accept-encoding", ""))
+    etag = entry["gzip_etag"] if use_gzip else entry["etag"]
+    fields["ETag"] = etag
+
+    if "if-none-match" in headers:
+        if etag_matches(headers["if-none-match"], (etag,)):
+            del fields["Content-Type"]
+            send_head(304, fields)
+            return 304, 0
+
+    size = entry["size"]
+    byte_range = None
+    if "range" in headers and not ("if-range" in headers and headers["if-range"].strip() != entry["etag"]):
+        byte_range = parse_range(headers["range"], size)
+        if byte_range == "unsatisfiable":
+            return send_error(416, {"Content-Range": f"bytes */{size}"})
+    if byte_range is not None:
+        # 范围请求总是针对原始内容（不压缩），ETag 也用原始内容的
+        start, end = byte_range
+        fields["ETag"] = entry["etag"]
+        fields["Content-Range"] = f"bytes {start}-{end}/{size}"
+        fields["Content-Length"] = end - start + 1
+        send_head(206, fields)
+        status = 206
+    elif use_gzip:
+        fields["Content-Encoding"] = "gzip"
+        fields["Content-Length"] = len(entry["gzip"])
+        send_head(200, fields)
+        if method != "HEAD":
+            writer.write(entry["gzip"])
+        return 200, 0 if method == "HEAD" else len(entry["gzip"])
+    else:
+        start, end = 0, size - 1
+        fields["Content-Length"] = size
+        send_head(200, fields)
+        status = 200
+
+    count = end - start + 1
+    if method == "HEAD" or count <= 0:
+        return status, 0
+    await writer.drain()
+    with open(path, "rb") as f:
+        # 大文件用 sendfile 直接从页缓存发送，不经过 Python
+        await loop.sendfile(writer.transport, f, start, count)
+    return status, count
+
+
+async def handle_connection(root, reader, writer, quiet):
+    """一个 HTTP/1.1 连接：循环处理请求直到对方关闭、超时或不要求保持连接"""
+    peer = writer.get_extra_info("peername")
+    peer = peer[0] if peer else "-"
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                return
+            except asyncio.LimitOverrunError:
+                writer.write(BAD_REQUEST)
+                return
+            lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = lines[0].split(" ")
+            except ValueError:
+                writer.write(BAD_REQUEST)
+                return
+            headers = {}
+            for line in lines[1:]:
+                name, sep, value = line.partition(":")
+                if sep:
+                    headers[name.strip().lower()] = value.strip()
+            length = headers.get("content-length", "0")
+            if not length.isdigit():
+                writer.write(BAD_REQUEST)
+                return
+            if length != "0":
+                await reader.readexactly(int(length))
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+            start = time.perf_counter()
+            status, nbytes = await respond(root, method, target, headers, writer)
+            await writer.drain()
+            _counts[status] += 1
+            _counts["bytes"] += nbytes
+            if not quiet:
+                print(f'{peer} "{method} {target}" {status} {nbytes} {(time.perf_counter() - start) * 1000:.1f}ms')
+            if not keep_alive:
+                return
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(root=ROOT, host="127.0.0.1", port=DEFAULT_PORT, quiet=False, precompute=True):
+    root = Path(root).resolve()
+    if not root.is_dir():
+        raise ToolError(f"目录不存在: {root}")
+    raise_fd_limit()
+
+    if precompute:
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        count, raw, packed = await loop.run_in_executor(None, precompress, root)
+        saving = 1 - packed / raw if raw else 0
+        print(f"预压缩 {count} 个文件: {raw:,} -> {packed:,} 字节（节省 {saving:.1%}，"
+              f"{time.perf_counter() - start:.2f}s）")
+
+    try:
+        server = await asyncio.start_server(lambda r, w: handle_connection(root, r, w, quiet), host, port,
+                                            limit=MAX_HEADER_BYTES, backlog=1024)
+    except OSError as e:
+        raise ToolError(f"无法监听 {host}:{port} ({e})")
+    print(f"目录: {root}")
+    print(f"地址: http://{host}:{port}/")
+    print(f"带哈希的资源（{', '.join(IMMUTABLE_DIRS)} 及 name.<哈希>.ext）: {IMMUTABLE}；其余: {REVALIDATE}")
+    print("按 Ctrl+C 停止")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    root = ROOT
+    host = "127.0.0.1"
+    port = DEFAULT_PORT
+    quiet = False
+    precompute = True
+
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ["--help", "-h"]:
+            print("用法: python serve_assets.py [目录] [选项]")
+            print("\n开发/预发布用静态服务器：强 ETag + If-None-Match、预压缩的 gzip、字节范围请求，")
+            print("带哈希的资源使用 immutable 长期缓存，其余每次重新验证（与 vercel.json 一致）")
+            print("\n选项:")
+            print(f"  --port, -p <端口>    监听端口（默认 {DEFAULT_PORT}）")
+            print("  --host <地址>        监听地址（默认 127.0.0.1，局域网访问用 0.0.0.0）")
+            print("  --quiet, -q          不打印每个请求")
+            print("  --no-precompress     启动时不预先压缩，首次请求时再计算")
+            print("\n示例:")
+            print("  python tools/serve_assets.py")
+            print("  python tools/serve_assets.py . --host 0.0.0.0 --port 8000 --quiet")
+            sys.exit(0)
+        if arg in ["--quiet", "-q"]:
+            quiet = True
+            i += 1
+        elif arg == "--no-precompress":
+            precompute = False
+            i += 1
+        elif arg in ["--port", "-p", "--host"]:
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            if arg == "--host":
+                host = sys.argv[i + 1]
+            else:
+                port = int(sys.argv[i + 1])
+            i += 2
+        elif arg.startswith("-"):
+            print(f"错误：无法识别的参数: {arg}")
+            sys.exit(1)
+        else:
+            root = Path(arg)
+            i += 1
+
+    try:
+        asyncio.run(serve(root, host, port, quiet, precompute))
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print(f"\n已停止：{sum(v for k, v in _counts.items() if k != 'bytes')} 个请求，"
+              f"304 {_counts[304]} 个，正文 {_counts['bytes']:,} 字节")
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+from PIL import Image
+
+from atlas_packer import MaxRectsBin, pack_atlas
+from tool_errors import ToolError
+
+
+def _overlaps(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+def test_maxrects_places_without_overlap():
+    packer = MaxRectsBin(64, 64)
+    sizes = [(32, 32), (32, 16), (16, 16), (16, 16), (32, 16), (16, 32), (8, 8)]
+    for w, h in sizes:
+        assert packer.insert(w, h) is not None
+    rects = packer.used_rects
+    for i, a in enumerate(rects):
+        x, y, w, h = a
+        assert 0 <= x and 0 <= y and x + w <= 64 and y + h <= 64
+        assert not any(_overlaps(a, b) for b in rects[i + 1:])
+
+
+def test_maxrects_fills_exactly_and_rejects_overflow():
+    packer = MaxRectsBin(32, 32)
+    for _ in range(4):
+        assert packer.insert(16, 16) is not None
+    assert packer.used_extent() == (32, 32)
+    assert packer.insert(1, 1) is None
+
+
+def test_maxrects_rejects_oversize():
+    packer = MaxRectsBin(100, 100)
+    assert packer.insert(101, 10) is None
+    assert packer.insert(10, 101) is None
+    assert packer.used_extent() == (0, 0)
+
+
+def _frame(w, h, color=(255, 0, 0, 255)):
+    return Image.new("RGBA", (w, h), color)
+
+
+def test_pack_atlas_wide_frames(tmp_path):
+    # 起始页面边长按面积开方会小于帧宽，必须至少放得下最大的帧
+    result = pack_atlas([("bar", [_frame(200, 20), _frame(200, 20)])], tmp_path / "bar.json")
+    assert result["frames"] == 2
+    assert len(result["pages"]) == 1
+    with open(result["output"], encoding="utf-8") as f:
+        frames = json.load(f)["frames"]
+    a, b = frames["0"]["frame"], frames["1"]["frame"]
+    assert (a["w"], a["h"]) == (b["w"], b["h"]) == (200, 20)
+    assert not _overlaps((a["x"], a["y"], a["w"], a["h"]), (b["x"], b["y"], b["w"], b["h"]))
+
+
+def test_pack_atlas_oversize_frame(tmp_path):
+    with pytest.raises(ToolError):
+        pack_atlas([("big", [_frame(300, 10)])], tmp_path / "big.json", max_size=256)
+    # --pot 时上限是不超过 max_size 的 2 的幂
+    with pytest.raises(ToolError):
+        pack_atlas([("big", [_frame(300, 10)])], tmp_path / "big.json", max_size=500, pot=True)
+    assert not (tmp_path / "big.png").exists()
+
+
+def test_pack_atlas_frame_exactly_max_size(tmp_path):
+    result = pack_atlas([("full", [_frame(64, 64)])], tmp_path / "full.json", max_size=64)
+    assert len(result["pages"]) == 1
+    assert Image.open(result["pages"][0]).size == (64, 64)
+
+
+def test_pack_atlas_splits_pages(tmp_path):
+    frames = [_frame(60, 60) for _ in range(5)]
+    result = pack_atlas([("tiles", frames)], tmp_path / "tiles.json", max_size=128)
+    assert result["frames"] == 5
+    assert len(result["pages"]) == 2
+    for page in result["pages"]:
+        w, h = Image.open(page).size
+        assert w <= 128 and h <= 128
+
+
+def test_pack_atlas_pot_stays_within_max_size(tmp_path):
+    frames = [_frame(100, 100) for _ in range(12)]
+    result = pack_atlas([("tiles", frames)], tmp_path / "tiles.json", max_size=300, pot=True)
+    for page in result["pages"]:
+        w, h = Image.open(page).size
+        assert w <= 256 and h <= 256
+        assert w & (w - 1) == 0 and h & (h - 1) == 0
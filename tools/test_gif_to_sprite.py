@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from gif_to_sprite import compute_layout, select_keyframes
+
+
+@pytest.mark.parametrize("frame_count, frames_per_row, expected", [
+    (1, None, (1, 1)),
+    (2, None, (2, 1)),
+    (10, None, (4, 3)),
+    (16, None, (4, 4)),
+    (17, None, (5, 4)),
+    (7, 3, (3, 3)),
+    (6, 3, (3, 2)),
+    (5, 10, (10, 1)),
+])
+def test_compute_layout(frame_count, frames_per_row, expected):
+    assert compute_layout(frame_count, frames_per_row) == expected
+
+
+@pytest.mark.parametrize("frame_count", range(1, 60))
+def test_compute_layout_fits_all_frames(frame_count):
+    per_row, rows = compute_layout(frame_count)
+    assert per_row * rows >= frame_count
+    # 不多出整行空格子
+    assert per_row * (rows - 1) < frame_count
+
+
+def _check_picks(picks, count, n):
+    assert len(picks) == count
+    assert picks[0] == 0
+    assert all(a < b for a, b in zip(picks, picks[1:]))
+    assert picks[-1] < n
+
+
+def test_select_keyframes_uniform_motion_is_evenly_spaced():
+    # 9 帧循环动画，9 段运动量相同（含末帧回到首帧）
+    assert select_keyframes(np.ones(9), 3) == [0, 3, 6]
+    # 非循环：首尾两帧都保留
+    assert select_keyframes(np.ones(8), 3, loop=False) == [0, 4, 8]
+
+
+def test_select_keyframes_dense_where_motion_is_fast():
+    motion = np.array([0, 0, 0, 10, 10, 10, 0, 0, 0, 0], dtype=np.float64)
+    picks = select_keyframes(motion, 4)
+    _check_picks(picks, 4, 10)
+    # 除第 0 帧外都落在动作快的第 3-6 帧附近
+    assert all(3 <= i <= 6 for i in picks[1:])
+
+    picks = select_keyframes(motion, 4, loop=False)
+    _check_picks(picks, 4, 11)
+    assert picks[-1] == 10
+
+
+def test_select_keyframes_static_animation():
+    # 完全静止时按时间等间隔取帧
+    assert select_keyframes(np.zeros(6), 3) == [0, 2, 4]
+
+
+@pytest.mark.parametrize("loop", [True, False])
+def test_select_keyframes_count_edge_cases(loop):
+    motion = np.random.default_rng(0).random(12)
+    n = 12 if loop else 13
+    assert select_keyframes(motion, n, loop) == list(range(n))
+    assert select_keyframes(motion, n + 5, loop) == list(range(n))
+    assert select_keyframes(motion, 1, loop) == [0]
+    assert select_keyframes(motion, 0, loop) == [0]
+    for count in range(2, n):
+        _check_picks(select_keyframes(motion, count, loop), count, n)
+
+
+def test_select_keyframes_burst_keeps_strictly_increasing():
+    # 所有运动集中在一段：弧长上的目标点都落在同一帧附近，仍要选出不同的帧
+    motion = np.zeros(20)
+    motion[10] = 1000.0
+    for count in range(2, 20):
+        _check_picks(select_keyframes(motion, count), count, 20)
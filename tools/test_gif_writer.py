@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from gif_writer import TRANSPARENT, _DeltaUnsupported, _display_codes, _plan_frames, save_gif, write_delta_gif
+
+# 256 种互不相同的颜色
+PALETTE = [c for i in range(256) for c in (i, 255 - i, (i * 7) % 256)]
+
+
+def _p_frame(indices, transparency=None):
+    im = Image.fromarray(np.asarray(indices, dtype=np.uint8), "P")
+    im.putpalette(PALETTE)
+    if transparency is not None:
+        im.info["transparency"] = transparency
+    return im
+
+
+def _composite(plan, shape):
+    """按 GIF 的规则依次绘制计划中的各帧，返回每帧显示的颜色码"""
+    canvas = np.full(shape, TRANSPARENT, dtype=np.int32)
+    shown = []
+    for item in plan:
+        x0, y0, x1, y1 = item["rect"]
+        block = item["codes"][y0:y1, x0:x1]
+        region = canvas[y0:y1, x0:x1]
+        region[block != TRANSPARENT] = block[block != TRANSPARENT]
+        shown.append(canvas.copy())
+        if item["disposal"] == 2:
+            canvas[y0:y1, x0:x1] = TRANSPARENT
+        else:
+            assert item["disposal"] == 1
+    return shown
+
+
+def _decoded_codes(path):
+    """用 Pillow 解码写出的 GIF，返回每帧显示的颜色码"""
+    result = []
+    with Image.open(path) as im:
+        for i in range(im.n_frames):
+            im.seek(i)
+            rgba = np.asarray(im.convert("RGBA")).astype(np.int32)
+            codes = (rgba[..., 0] << 16) | (rgba[..., 1] << 8) | rgba[..., 2]
+            codes[rgba[..., 3] == 0] = TRANSPARENT
+            result.append(codes)
+    return result
+
+
+def _moving_sprite_frames(n=6, size=24, colors=40, transparency=0):
+    """透明背景上移动、并逐帧变色的方块（会出现需要恢复透明的像素）"""
+    rng = np.random.default_rng(1)
+    frames = []
+    for k in range(n):
+        a = np.zeros((size, size), dtype=np.uint8)
+        a[4 + k:12 + k, 2 + 2 * k:10 + 2 * k] = rng.integers(1, colors, (8, 8))
+        frames.append(_p_frame(a, transparency))
+    return frames
+
+
+def _many_color_frames():
+    """所有帧合计超过 255 色（走逐帧局部调色板），每帧只改一小块"""
+    rng = np.random.default_rng(2)
+    base = rng.permutation(np.arange(32 * 32) % 256).reshape(32, 32)
+    frames = []
+    for k in range(5):
+        a = base.copy()
+        a[k * 5:k * 5 + 6, 3:20] = rng.integers(0, 256, (6, 17))
+        frames.append(_p_frame(a))
+    return frames
+
+
+@pytest.mark.parametrize("make_frames", [_moving_sprite_frames, _many_color_frames])
+def test_plan_frames_composites_to_input(make_frames):
+    frames = make_frames()
+    codes = [_display_codes(f) for f in frames]
+    plan = _plan_frames(codes, [100] * len(frames))
+    assert len(plan) == len(frames)
+    for shown, expected in zip(_composite(plan, codes[0].shape), codes):
+        np.testing.assert_array_equal(shown, expected)
+
+
+def test_plan_frames_merges_identical_frames():
+    frames = _moving_sprite_frames(3)
+    frames.insert(1, frames[0].copy())
+    codes = [_display_codes(f) for f in frames]
+    plan = _plan_frames(codes, [100, 50, 100, 100])
+    assert [item["duration"] for item in plan] == [150, 100, 100]
+
+
+@pytest.mark.parametrize("make_frames, global_palette", [
+    (_moving_sprite_frames, True),
+    (_many_color_frames, False),
+])
+def test_write_delta_gif_round_trip(tmp_path, make_frames, global_palette):
+    frames = make_frames()
+    path = tmp_path / "out.gif"
+    stats = write_delta_gif(frames, path, [100] * len(frames))
+    assert stats["global_palette"] is global_palette
+    assert stats["pixels_encoded"] < stats["pixels_full"]
+    decoded = _decoded_codes(path)
+    assert len(decoded) == len(frames)
+    for got, frame in zip(decoded, frames):
+        np.testing.assert_array_equal(got, _display_codes(frame))
+
+
+def _full_block_frames():
+    """第 2 帧的变化矩形里有 256 种不透明色，同时还有未变化的像素（需要第 257 个透明色）"""
+    a = np.zeros((32, 32), dtype=np.uint8)
+    a.flat[1::2] = 1
+    b = a.copy()
+    b.flat[0:512:2] = np.arange(256)
+    b.flat[1] = 0
+    return [_p_frame(a), _p_frame(b)]
+
+
+def test_write_delta_gif_rejects_block_with_256_colors_and_unchanged_pixels(tmp_path):
+    with pytest.raises(_DeltaUnsupported):
+        write_delta_gif(_full_block_frames(), tmp_path / "out.gif", [100, 100])
+
+
+def test_save_gif_falls_back_to_full_frames(tmp_path):
+    frames = _full_block_frames()
+    path = tmp_path / "out.gif"
+    assert save_gif(frames, path, [100, 100], delta=True) is None
+    for got, frame in zip(_decoded_codes(path), frames):
+        np.testing.assert_array_equal(got, _display_codes(frame))
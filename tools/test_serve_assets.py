@@ -0,0 +1,65 @@
+import pytest
+
+from serve_assets import accepts_gzip, etag_matches, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 999)),
+    ("bytes=990-2000", (990, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=999-999", (999, 999)),
+    (" Bytes = 5-9", (5, 9)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-1200", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    assert parse_range(header, 1000) == "unsatisfiable"
+
+
+@pytest.mark.parametrize("header", [
+    "items=0-9",        # 不支持的单位
+    "bytes=0-9,20-29",  # 多段范围
+    "bytes=9",          # 缺少 -
+    "bytes=9-5",        # 起点大于终点
+    "bytes=a-b",
+    "bytes=-",
+])
+def test_parse_range_ignored(header):
+    assert parse_range(header, 1000) is None
+
+
+def test_parse_range_empty_file():
+    assert parse_range("bytes=0-", 0) == "unsatisfiable"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ('"x",W/"gz"', True),
+    ("*", True),
+    (" * ", True),
+    ('"abcd"', False),
+    ('abc', False),
+    ("", False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, ['"abc"', '"gz"']) is expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("br, gzip;q=0.5", True),
+    ("gzip;q=0", False),
+    ("gzip;q=abc", True),
+    ("*", True),
+    ("identity", False),
+    ("", False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
@@ -0,0 +1,229 @@
+from PIL import Image
+import numpy as np
+import hashlib
+import json
+import math
+import sys
+from pathlib import Path
+
+from tool_errors import ToolError
+from build_cache import cached_tool, parse_cache_flags
+from profiling import parse_profile_flags
+
+
+DEFAULT_TILE_SIZE = 32
+# 每个图块四周向外复制的边缘像素数：背景会被缩放到屏幕大小，线性过滤时图块边缘不会采样到相邻图块
+DEFAULT_EXTRUDE = 1
+
+
+def tileset_path(output):
+    """地图 JSON 对应的图块集图片：xxx.json -> xxx.png"""
+    return Path(output).with_suffix(".png")
+
+
+def slice_tiles(rgba, tile_size):
+    """
+    把 (高, 宽, 4) 图像切成 tile_size 见方的图块，返回 (图块数组 (n, t, t, 4), 列数, 行数)
+
+    宽高不是图块尺寸的整数倍时，右侧和底部的图块用透明像素补齐
+    """
+    height, width = rgba.shape[:2]
+    cols, rows = math.ceil(width / tile_size), math.ceil(height / tile_size)
+    padded = np.zeros((rows * tile_size, cols * tile_size, 4), dtype=np.uint8)
+    padded[:height, :width] = rgba
+    tiles = padded.reshape(rows, tile_size, cols, tile_size, 4).swapaxes(1, 2).reshape(-1, tile_size, tile_size, 4)
+    return tiles, cols, rows
+
+
+def dedupe_tiles(tiles, tolerance=0):
+    """
+    合并重复图块，返回 (保留的图块下标列表, 每个图块对应的保留图块序号数组)
+
+    先按内容哈希合并完全相同的图块；tolerance > 0 时，与某个已保留图块逐像素平均色差（0-255）
+    不超过 tolerance 的图块也合并到它（有损，先出现的图块作为代表）
+    """
+    keep = []
+    mapping = np.empty(len(tiles), dtype=np.int32)
+    by_hash = {}
+    flat = tiles.reshape(len(tiles), -1)
+    kept = np.empty((0, flat.shape[1]), dtype=np.int16)
+    for i, tile in enumerate(flat):
+        key = hashlib.sha1(tile.tobytes()).digest()
+        index = by_hash.get(key)
+        if index is None and tolerance > 0 and len(kept):
+            diffs = np.abs(kept - tile.astype(np.int16)).mean(axis=1)
+            best = int(diffs.argmin())
+            if diffs[best] <= tolerance:
+                index = best
+        if index is None:
+            index = len(keep)
+            keep.append(i)
+            if tolerance > 0:
+                kept = np.vstack([kept, tile.astype(np.int16)])
+        by_hash.setdefault(key, index)
+        mapping[i] = index
+    return keep, mapping
+
+
+def build_tileset(tiles, extrude=DEFAULT_EXTRUDE):
+    """
+    把图块排成接近正方形的图块集图片，每个图块向外复制 extrude 像素边缘
+
+    对应 Tiled/Phaser 的 margin = extrude、spacing = 2 * extrude。返回 (图片, 列数)
+    """
+    count, tile_size = len(tiles), tiles.shape[1]
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    cell = tile_size + 2 * extrude
+    sheet = np.zeros((rows * cell, columns * cell, 4), dtype=np.uint8)
+    for i, tile in enumerate(tiles):
+        y, x = (i // columns) * cell, (i % columns) * cell
+        sheet[y:y + cell, x:x + cell] = np.pad(tile, ((extrude, extrude), (extrude, extrude), (0, 0)), mode="edge")
+    return Image.fromarray(sheet, "RGBA"), columns
+
+
+@cached_tool("tile_background", version=1, inputs=("image_path",),
+             outputs=("output_path", lambda a: tileset_path(a["output_path"])))
+def tile_background(image_path, output_path, tile_size=DEFAULT_TILE_SIZE, extrude=DEFAULT_EXTRUDE, tolerance=0):
+    """
+    把背景图切成图块并去重，输出图块集 PNG 和 Tiled JSON 地图（Phaser scene.load.tilemapTiledJSON 可直接加载）
+
+    参数:
+        image_path: 背景图片路径
+        output_path: 输出地图 JSON 路径，图块集图片与之同名 .png
+        tile_size: 图块边长（像素）
+        extrude: 图块边缘外扩像素数（见 build_tileset）
+        tolerance: 近似重复图块的平均色差阈值（见 dedupe_tiles），0 表示只合并完全相同的图块
+
+    地图只有一个名为 background 的图层；原图尺寸记在地图属性 imageWidth/imageHeight 中，
+    补齐的透明像素不应显示。返回包含图块数、文件大小和纹理字节数对比的 dict
+    """
+    if tile_size <= 0:
+        raise ToolError("图块尺寸必须为正数")
+    image_path = Path(image_path)
+    try:
+        with Image.open(image_path) as img:
+            rgba = np.asarray(img.convert("RGBA"))
+    except OSError as e:
+        raise ToolError(f"无法打开图片: {image_path} ({e})")
+    height, width = rgba.shape[:2]
+
+    tiles, cols, rows = slice_tiles(rgba, tile_size)
+    keep, mapping = dedupe_tiles(tiles, tolerance)
+    tileset, columns = build_tileset(tiles[keep], extrude)
+
+    out_path = Path(output_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    png_path = tileset_path(out_path)
+    tileset.save(png_path, format="PNG")
+
+    tilemap = {
+        "type": "map",
+        "version": "1.10",
+        "orientation": "orthogonal",
+        "renderorder": "right-down",
+        "infinite": False,
+        "width": cols,
+        "height": rows,
+        "tilewidth": tile_size,
+        "tileheight": tile_size,
+        "nextlayerid": 2,
+        "nextobjectid": 1,
+        "properties": [
+            {"name": "imageWidth", "type": "int", "value": width},
+            {"name": "imageHeight", "type": "int", "value": height},
+            {"name": "source", "type": "string", "value": image_path.name},
+        ],
+        "layers": [{
+            "id": 1,
+            "name": "background",
+            "type": "tilelayer",
+            "x": 0,
+            "y": 0,
+            "width": cols,
+            "height": rows,
+            "opacity": 1,
+            "visible": True,
+            # Tiled 的图块编号（gid）从 firstgid = 1 开始，0 表示空
+            "data": (mapping + 1).tolist(),
+        }],
+        "tilesets": [{
+            "firstgid": 1,
+            "name": png_path.stem,
+            "image": png_path.name,
+            "imagewidth": tileset.width,
+            "imageheight": tileset.height,
+            "tilewidth": tile_size,
+            "tileheight": tile_size,
+            "tilecount": len(keep),
+            "columns": columns,
+            "margin": extrude,
+            "spacing": 2 * extrude,
+        }],
+    }
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(tilemap, f, ensure_ascii=False, separators=(",", ":"))
+
+    before = image_path.stat().st_size
+    after = png_path.stat().st_size + out_path.stat().st_size
+    texture_before = width * height * 4
+    texture_after = tileset.width * tileset.height * 4
+
+    print(f"✓ 图块集已保存到: {png_path.resolve()}")
+    print(f"  地图: {out_path}（{cols}x{rows} 个 {tile_size}x{tile_size} 图块）")
+    print(f"  图块: {len(tiles)} -> {len(keep)} 个不同的图块"
+          + (f"（近似合并，平均色差 <= {tolerance}）" if tolerance else ""))
+    print(f"  文件大小: {before:,} -> {after:,} bytes（图块集 + 地图）")
+    print(f"  纹理内存: {texture_before:,} -> {texture_after:,} bytes")
+    if after >= before or texture_after >= texture_before:
+        print("  ⚠ 重复图块太少，切分后没有变小，建议继续使用整张背景图")
+
+    return {
+        "output": str(out_path),
+        "tileset": str(png_path),
+        "tiles": len(tiles),
+        "unique_tiles": len(keep),
+        "bytes_before": before,
+        "bytes_after": after,
+        "texture_bytes_before": texture_before,
+        "texture_bytes_after": texture_after,
+    }
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(parse_cache_flags(sys.argv[1:]))
+
+    args = []
+    options = {}
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ("--tile", "--extrude", "--tolerance"):
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            name = "tile_size" if arg == "--tile" else arg[2:]
+            options[name] = float(sys.argv[i + 1]) if arg == "--tolerance" else int(sys.argv[i + 1])
+            i += 2
+        else:
+            args.append(arg)
+            i += 1
+
+    if len(args) < 2:
+        print("用法: python tile_background.py <背景图> <输出地图.json> [--tile <n>] [--extrude <n>] [--tolerance <n>]")
+        print("\n把背景切成图块并去除重复图块，输出图块集（同名 .png）和 Tiled JSON 地图")
+        print("\n选项:")
+        print(f"  --tile <n>        图块边长（默认 {DEFAULT_TILE_SIZE}）")
+        print(f"  --extrude <n>     图块边缘外扩像素，防止缩放时出现接缝（默认 {DEFAULT_EXTRUDE}）")
+        print("  --tolerance <n>   平均色差不超过 n 的图块视为重复（有损，默认 0 只合并完全相同的图块）")
+        print("  --no-cache        忽略构建缓存，强制重新生成")
+        print("  --profile         剖析各阶段耗时和内存（另有 --profile-json <路径>、--profile-pstats <路径>）")
+        print("\n示例:")
+        print("  python tools/tile_background.py assets/bg_sea.png assets/bg_sea_tiles.json")
+        sys.exit(1)
+
+    try:
+        tile_background(args[0], args[1], **options)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
@@ -0,0 +1,8 @@
+class ToolError(Exception):
+    """
+    工具脚本的处理错误（文件无法打开、参数超出范围等）
+
+    库函数遇到错误时抛出 ToolError 而不是直接退出进程，
+    由命令行入口统一打印 "错误：..." 并以非 0 状态码退出，
+    批量处理时单个文件出错也不会影响其他文件。
+    """
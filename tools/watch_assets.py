@@ -0,0 +1,344 @@
+import contextlib
+import fnmatch
+import importlib
+import io
+import json
+import os
+import shutil
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from tool_errors import ToolError
+import build_cache
+from build_cache import parse_cache_flags
+import profiling
+from profiling import parse_profile_flags
+
+
+# 两次扫描之间的间隔（秒）
+DEFAULT_INTERVAL = 0.25
+# 文件最后一次变化后等待这么久没有新变化才重建（编辑器保存时可能分几次写入）
+DEFAULT_DEBOUNCE = 0.3
+# 扫描时跳过的目录
+SKIP_DIRS = (".git", ".asset_cache", "node_modules", "__pycache__")
+
+# 规则中可用的工具：名称 -> (模块, 函数)，函数签名均为 (输入路径, 输出路径, **参数)
+WATCH_TOOLS = {
+    "trim_gif": ("trim_gif", "trim_gif"),
+    "resize_gif": ("resize_gif", "resize_gif"),
+    "gif_to_sprite": ("gif_to_sprite", "gif_to_sprite"),
+    "black_to_transparent": ("black_to_transparent", "black_to_transparent"),
+    "remove_black_background_glow": ("black_to_transparent", "remove_black_background_glow"),
+    "tile_background": ("tile_background", "tile_background"),
+}
+# 无需处理时（已是最小尺寸/目标尺寸）返回 None 且不写输出的工具：把输入原样复制为输出，
+# 下一步才有输入，输出也不会因为缺失而一直被判定为过期
+PASSTHROUGH_TOOLS = ("trim_gif", "resize_gif")
+
+
+def load_rules(rules_path):
+    """
+    读取规则文件，返回 (根目录, 规则列表)
+
+    规则文件格式:
+        {"rules": [{"match": "art/*.gif",
+                    "steps": [{"tool": "trim_gif", "output": "build/{stem}.gif", "args": {"padding": 2}},
+                              {"tool": "gif_to_sprite", "output": "assets/{stem}_sprite.png",
+                               "args": {"max_frames": 40}}]}]}
+
+    match 为相对根目录（规则文件所在目录）的 fnmatch 模式；每一步的输入是上一步的输出（第一步为源文件），
+    output 中可用 {stem}（源文件名去扩展名）、{name}（源文件名）和 {dir}（源文件所在的相对目录）
+    """
+    rules_path = Path(rules_path)
+    try:
+        with open(rules_path, encoding="utf-8") as f:
+            config = json.load(f)
+    except OSError as e:
+        raise ToolError(f"无法读取规则文件: {rules_path} ({e})")
+    except json.JSONDecodeError as e:
+        raise ToolError(f"规则文件不是有效的 JSON: {rules_path} ({e})")
+
+    rules = config.get("rules") if isinstance(config, dict) else None
+    if not rules:
+        raise ToolError(f"规则文件中没有 rules: {rules_path}")
+    for n, rule in enumerate(rules, 1):
+        if not rule.get("match") or not rule.get("steps"):
+            raise ToolError(f"第 {n} 条规则缺少 match 或 steps")
+        for step in rule["steps"]:
+            if step.get("tool") not in WATCH_TOOLS:
+                raise ToolError(f"第 {n} 条规则使用了未知的工具 {step.get('tool')}，"
+                                f"可用: {', '.join(WATCH_TOOLS)}")
+            if not step.get("output"):
+                raise ToolError(f"第 {n} 条规则的 {step['tool']} 步骤缺少 output")
+            step.setdefault("args", {})
+    return rules_path.resolve().parent, rules
+
+
+def _watch_dirs(root, rules):
+    """各规则模式中第一个通配符之前的目录，只扫描这些目录"""
+    dirs = set()
+    for rule in rules:
+        prefix = []
+        for part in rule["match"].split("/")[:-1]:
+            if any(c in part for c in "*?["):
+                break
+            prefix.append(part)
+        dirs.add(root.joinpath(*prefix))
+    # 去掉被其他目录包含的目录
+    return sorted(d for d in dirs if not any(o != d and o in d.parents for o in dirs))
+
+
+def scan(root, rules):
+    """列出匹配任一规则的源文件，返回 {相对路径: (修改时间 ns, 大小)}"""
+    found = {}
+    for top in _watch_dirs(root, rules):
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                rel = Path(path).relative_to(root).as_posix()
+                if not any(fnmatch.fnmatch(rel, rule["match"]) for rule in rules):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # 扫描途中被删除
+                found[rel] = (st.st_mtime_ns, st.st_size)
+    return found
+
+
+def plan_steps(root, rel, rules):
+    """源文件匹配的所有规则展开成 [(工具名, 输入路径, 输出路径, 参数), ...]"""
+    source = Path(rel)
+    fields = {"stem": source.stem, "name": source.name, "dir": source.parent.as_posix()}
+    steps = []
+    for rule in rules:
+        if not fnmatch.fnmatch(rel, rule["match"]):
+            continue
+        current = root / rel
+        for step in rule["steps"]:
+            output = root / step["output"].format(**fields)
+            steps.append((step["tool"], str(current), str(output), step["args"]))
+            current = output
+    return steps
+
+
+def is_stale(root, rel, rules):
+    """任一步骤的输出不存在或比源文件旧时需要构建（PASSTHROUGH_TOOLS 无需处理时也会写出输入的副本）"""
+    source_mtime = (root / rel).stat().st_mtime_ns
+    for _, _, output, _ in plan_steps(root, rel, rules):
+        output = Path(output)
+        if not output.exists() or output.stat().st_mtime_ns < source_mtime:
+            return True
+    return False
+
+
+def _init_worker(modules, cache_settings, profile):
+    """
+    工作进程预热：提前导入工具模块（Pillow、NumPy 等），之后的构建不再付出导入开销；
+    同时应用主进程的缓存设置（--no-cache、--cache-dir）和 --profile
+    """
+    # Ctrl+C 由主进程处理，工作进程不打印各自的 KeyboardInterrupt
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    build_cache.apply_settings(cache_settings)
+    if profile:
+        profiling.enable()
+    for module in modules:
+        importlib.import_module(module)
+
+
+def run_steps(steps):
+    """
+    在工作进程中依次执行一个源文件的各个步骤
+
+    工具自身的输出被丢弃；工具带构建缓存，输入和参数都没变的步骤直接从缓存恢复。
+    返回 (是否成功, 错误信息或 None, 耗时秒数, 已写出的输出路径列表, --profile 的阶段记录)
+    """
+    start = time.perf_counter()
+    written = []
+    try:
+        with profiling.track(steps[0][1]):
+            for tool, input_path, output_path, args in steps:
+                module, name = WATCH_TOOLS[tool]
+                func = getattr(importlib.import_module(module), name)
+                Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = func(input_path, output_path, **args)
+                if result is None and tool in PASSTHROUGH_TOOLS:
+                    shutil.copyfile(input_path, output_path)
+                written.append(output_path)
+        return True, None, time.perf_counter() - start, written, profiling.take_records()
+    except ToolError as e:
+        return False, f"{tool}: {e}", time.perf_counter() - start, written, profiling.take_records()
+    except Exception as e:
+        return (False, f"{tool}: {type(e).__name__}: {e}", time.perf_counter() - start, written,
+                profiling.take_records())
+
+
+def _start_pool(jobs, modules):
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                               initargs=(modules, build_cache.current_settings(), profiling.enabled()))
+    # 提交和进程数一样多的空任务，让所有工作进程现在就启动并完成预热
+    for future in [pool.submit(os.getpid) for _ in range(jobs)]:
+        future.result()
+    return pool
+
+
+def watch(rules_path, jobs=None, interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE, initial=True, once=False):
+    """
+    监视规则匹配的源文件，变化后把受影响的源文件交给常驻的工作进程重建
+
+    - 每 interval 秒扫描一次修改时间和大小（轮询，不依赖 inotify 等平台接口）；
+      源文件最后一次变化后 debounce 秒内没有新变化才重建
+    - 工作进程在启动时预热（导入 Pillow 和各工具模块），之后每次重建不需要重新启动 Python
+    - 同一个源文件不会同时构建两次；构建期间又有变化时，结束后再构建一次
+    - 规则输出的文件也匹配某条规则时，不会因为自己写出的内容再次触发
+    initial 为 True 时，启动时先构建输出缺失或比源文件旧的源文件；once 为 True 时构建完这些就退出。
+    返回失败的构建次数
+    """
+    root, rules = load_rules(rules_path)
+    jobs = jobs or os.cpu_count() or 1
+    modules = sorted({WATCH_TOOLS[step["tool"]][0] for rule in rules for step in rule["steps"]})
+    # fork 出的工作进程直接继承主进程已导入的模块
+    for module in modules:
+        importlib.import_module(module)
+    pool = _start_pool(jobs, modules)
+
+    snapshot = scan(root, rules)
+    pending = {}     # 相对路径 -> 最后一次变化的时间
+    running = {}     # future -> 相对路径
+    written = {}     # 构建写出的文件 -> 写出后的 (修改时间, 大小)
+    failures = 0
+    if initial:
+        for rel in sorted(snapshot):
+            if is_stale(root, rel, rules):
+                pending[rel] = 0.0
+
+    print(f"根目录: {root}")
+    print(f"规则: {len(rules)} 条，匹配源文件 {len(snapshot)} 个，工作进程 {jobs} 个（已预热）")
+    if not once:
+        print("监视中，按 Ctrl+C 停止")
+
+    try:
+        while True:
+            now = time.monotonic()
+            for rel, last in sorted(pending.items()):
+                if now - last < debounce or rel in running.values():
+                    continue
+                del pending[rel]
+                if not (root / rel).exists():
+                    continue
+                steps = plan_steps(root, rel, rules)
+                running[pool.submit(run_steps, steps)] = rel
+
+            for future in [f for f in running if f.done()]:
+                rel = running.pop(future)
+                stamp = time.strftime("%H:%M:%S")
+                restarted = False
+                try:
+                    ok, error, elapsed, outputs, records = future.result()
+                except BrokenProcessPool:
+                    ok, error, elapsed, outputs, records = False, "工作进程异常退出，已重启进程池", 0.0, [], []
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = _start_pool(jobs, modules)
+                    # 其余进行中的构建随旧进程池一起失败，放回待构建队列
+                    for other in list(running):
+                        pending[running.pop(other)] = 0.0
+                    restarted = True
+                profiling.merge_records(records)
+                for output in outputs:
+                    try:
+                        st = os.stat(output)
+                        written[Path(output).relative_to(root).as_posix()] = (st.st_mtime_ns, st.st_size)
+                    except (OSError, ValueError):
+                        pass
+                if ok:
+                    names = ", ".join(Path(o).name for o in outputs)
+                    print(f"[{stamp}] ✓ {rel} -> {names} ({elapsed:.2f}s)")
+                else:
+                    failures += 1
+                    print(f"[{stamp}] ✗ {rel}: {error}")
+                if restarted:
+                    # 本轮列表中的其余 future 已经移出 running
+                    break
+
+            if once and not pending and not running:
+                return failures
+
+            time.sleep(interval)
+            if once:
+                continue
+            current = scan(root, rules)
+            for rel, sig in current.items():
+                if snapshot.get(rel) != sig and written.get(rel) != sig:
+                    pending[rel] = time.monotonic()
+            snapshot = current
+    except KeyboardInterrupt:
+        print("\n已停止")
+        return failures
+    finally:
+        # 没有进行中的构建时等工作进程退出，否则解释器退出时 concurrent.futures 偶尔报 Bad file descriptor
+        pool.shutdown(wait=not running, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    sys.argv[1:] = parse_profile_flags(parse_cache_flags(sys.argv[1:]))
+
+    args = []
+    jobs = None
+    interval = DEFAULT_INTERVAL
+    debounce = DEFAULT_DEBOUNCE
+    initial = True
+    once = False
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if arg in ["--jobs", "-j", "--interval", "--debounce"]:
+            if i + 1 >= len(sys.argv):
+                print(f"错误：{arg} 需要一个值")
+                sys.exit(1)
+            if arg in ["--jobs", "-j"]:
+                jobs = int(sys.argv[i + 1])
+            elif arg == "--interval":
+                interval = float(sys.argv[i + 1])
+            else:
+                debounce = float(sys.argv[i + 1])
+            i += 2
+        elif arg == "--no-initial":
+            initial = False
+            i += 1
+        elif arg == "--once":
+            once = True
+            i += 1
+        else:
+            args.append(arg)
+            i += 1
+
+    if len(args) < 1:
+        print("用法: python watch_assets.py <规则文件.json> [选项]")
+        print("\n监视源文件，变化后用常驻的工作进程只重建受影响的输出")
+        print("\n选项:")
+        print("  --jobs, -j <n>     工作进程数（默认等于 CPU 核数）")
+        print(f"  --interval <秒>    扫描间隔（默认 {DEFAULT_INTERVAL}）")
+        print(f"  --debounce <秒>    文件停止变化多久后重建（默认 {DEFAULT_DEBOUNCE}）")
+        print("  --no-initial       启动时不构建输出缺失或过期的源文件")
+        print("  --once             只构建输出缺失或过期的源文件，然后退出")
+        print("  --no-cache         忽略构建缓存，强制重新生成")
+        print("  --profile          退出时按源文件打印各阶段耗时（工作进程中的记录汇总到主进程）")
+        print("\n规则文件示例:")
+        print('  {"rules": [{"match": "art/*.gif", "steps": [')
+        print('      {"tool": "trim_gif", "output": "build/{stem}.gif", "args": {"padding": 2}},')
+        print('      {"tool": "gif_to_sprite", "output": "assets/{stem}_sprite.png", "args": {"max_frames": 40}}]}]}')
+        print(f"\n可用工具: {', '.join(WATCH_TOOLS)}")
+        sys.exit(1)
+
+    try:
+        failures = watch(args[0], jobs, interval, debounce, initial, once)
+    except ToolError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+    sys.exit(1 if once and failures else 0)